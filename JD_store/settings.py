@@ -38,6 +38,10 @@ INSTALLED_APPS = [
     'products',
     'categories',
     'promo_codes',
+    'reservations',
+    'recommendations',
+    'sales',
+    'popularity',
     'shipping_addresses',
     'billing_profiles',
     'django.contrib.admin',
@@ -55,6 +59,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'carts.middleware.CartMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -73,6 +78,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'categories.context_processors.categories',
             ],
         },
     },
@@ -88,6 +94,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Segundos que una escritura espera el bloqueo antes de fallar con "database is locked".
+            'timeout': 20,
+        },
+        'TEST': {
+            # Base de pruebas en archivo: las pruebas con varios hilos necesitan compartir los datos.
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -130,6 +144,60 @@ EMAIL_HOST_USER = 'josephtest271@gmail.com'
 EMAIL_HOST_PASSWORD = config('USER_MAIL_PASSWORD')
 EMAIL_USE_TLS = True
 
+# Caché de listados y búsquedas del catálogo (ver `products.cache`).
+# CATALOG_CACHE_BACKEND elige el backend: 'locmem' (memoria del proceso) o 'file' (compartido entre procesos).
+# MAX_ENTRIES limita el tamaño: LocMemCache descarta las entradas usadas menos recientemente y
+# FileBasedCache descarta una parte de las entradas al azar.
+# Las páginas pueden quedar en la memoria de cada proceso porque se guardan bajo la versión del catálogo.
+# La versión, la fecha de su último cambio y los contadores, en cambio, van en un caché aparte, sin
+# vencimiento, que solo guarda esas pocas claves y por eso nunca llega a descartar entradas.
+# Ese caché TIENE que ser compartido por todos los procesos (workers web, admin, comandos): si cada uno
+# tuviera su propia versión, un cambio hecho en un proceso no invalidaría los listados de los demás.
+# Por eso CATALOG_META_CACHE_BACKEND es 'file' por defecto (sirve para los procesos de un mismo servidor);
+# con varios servidores hay que apuntar LOCATION a un directorio compartido o usar un backend compartido
+# (Memcached, Redis). 'locmem' solo sirve con un único proceso.
+CATALOG_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'catalog'),
+    },
+}
+
+CATALOG_META_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-meta',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CATALOG_META_CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache', 'catalog-meta')),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        **CATALOG_CACHE_BACKENDS[config('CATALOG_CACHE_BACKEND', default='locmem')],
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CATALOG_CACHE_MAX_ENTRIES', default=1000, cast=int),
+        },
+    },
+    'catalog-meta': {
+        **CATALOG_META_CACHE_BACKENDS[config('CATALOG_META_CACHE_BACKEND', default='file')],
+        'TIMEOUT': None,
+    },
+}
+
+CATALOG_CACHE = 'catalog'
+CATALOG_META_CACHE = 'catalog-meta'
+
 STRIPE_PUBLIC_KEY = 'pk_test_51O310VJti403RpGc1josz3GjGCvH72g7qTrZHPkhHAwskUzTreSJrqAtXk3D55ZJXIKvzHzTl8rczblweS07Zol600XA3TDFD3'
 STRIPE_PRIVATE_KEY = 'sk_test_51O310VJti403RpGcHze8sZo3AR75PMK1nqRnlPXHFSWHqdkzggZUIrviZFatwUpwuv1xmKIsp3rkOpXDT9NdQIhD00bk9QLlLy'
 
@@ -145,6 +213,33 @@ STATICFILES_DIRS = (
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR,'media')
 
+# Imágenes derivadas de los productos (ver `products.images`): se generan en un pool de hilos
+# para no bloquear la subida. Con PRODUCT_IMAGES_ASYNC = False se generan en la misma petición.
+PRODUCT_IMAGES_ASYNC = True
+PRODUCT_IMAGE_WORKERS = 2
+
+# Minutos que un carrito retiene el stock reservado (ver `reservations`). Las reservas vencidas
+# se devuelven al stock con el comando `release_stock_reservations`.
+STOCK_RESERVATION_MINUTES = 30
+
+# Segundos tras los cuales un cobro reservado que no terminó (la petición murió) se puede retomar
+# desde otro intento, con la misma llave de idempotencia (ver `charges`).
+CHARGE_RESERVATION_SECONDS = 600
+
+# Vecinos que se guardan por producto en las recomendaciones "comprados juntos" (ver `recommendations`).
+RECOMMENDATIONS_TOP_K = 10
+
+# Más vendidos (ver `sales`): días que se guardan los contadores diarios y segundos que se cachea cada ranking.
+SALES_WINDOW_DAYS = 30
+SALES_LEADERBOARD_TIMEOUT = 300
+
+# Visitas por producto (ver `popularity`): cada proceso las acumula en memoria y las guarda de a lotes
+# cada POPULARITY_FLUSH_THRESHOLD visitas o POPULARITY_FLUSH_INTERVAL segundos. Los lotes se suman a los
+# totales con el comando `compact_product_views`. Con POPULARITY_BUFFER = False se escribe cada visita.
+POPULARITY_BUFFER = True
+POPULARITY_FLUSH_THRESHOLD = 100
+POPULARITY_FLUSH_INTERVAL = 30
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
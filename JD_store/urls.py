@@ -6,12 +6,12 @@ El `urlpatterns` lista las rutas de URL a vistas. Para más información, consul
 """
 
 from django.contrib import admin  # Importa el módulo de administración de Django
-from django.urls import path, include  # Importa funciones para definir rutas
+from django.urls import path, re_path, include  # Importa funciones para definir rutas
 from django.conf.urls.static import static  # Permite servir archivos estáticos
 from django.conf import settings  # Configuraciones del proyecto
 
 from . import views  # Importa las vistas definidas en el módulo actual
-from products.views import ProductListView  # Importa la vista de lista de productos
+from products.views import ProductListView, media_blob  # Importa la vista de lista de productos y la de archivos
 
 urlpatterns = [
     # Ruta para la página principal que muestra la lista de productos
@@ -27,6 +27,7 @@ urlpatterns = [
     
     # Inclusión de URLs de aplicaciones específicas
     path('productos/', include('products.urls')),  # Rutas relacionadas con productos
+    path('categorias/', include('categories.urls')),  # Rutas para navegar por categorías
     path('carrito/', include('carts.urls')),  # Rutas relacionadas con el carrito de compras
     path('orden/', include('orders.urls')),  # Rutas relacionadas con órdenes
     path('direcciones/', include('shipping_addresses.urls')),  # Rutas para direcciones de envío
@@ -36,4 +37,8 @@ urlpatterns = [
 
 # Configuración para servir archivos multimedia en modo de desarrollo
 if settings.DEBUG:
+    # Archivos direccionados por contenido (imágenes y derivadas), con cabeceras de caché inmutable
+    urlpatterns += [
+        re_path(r'^media/(?P<path>products/(?:blobs|derivatives)/.+)$', media_blob),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
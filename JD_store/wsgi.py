@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import atexit
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'JD_store.settings')
 
 application = get_wsgi_application()
+
+# Guarda las visitas a productos que el proceso tiene pendientes al terminar (ver `popularity.buffer`).
+from popularity.buffer import buffer  # noqa: E402
+
+atexit.register(buffer.flush)
@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from .utils import get_cart
+from orders.utils import get_order
+
+
+# Middleware que expone `request.cart` y `request.order` de forma perezosa.
+# Cada uno se resuelve como máximo una vez por petición y solo si la vista o la plantilla lo usan;
+# `request.cart` nunca crea un carrito en la base de datos (para eso está `get_or_create_cart`).
+# `request.order` envuelve None cuando no hay una orden abierta, por lo que se evalúa como falso.
+class CartMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        request.order = SimpleLazyObject(lambda: get_order(request))
+
+        return self.get_response(request)
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:43
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicated_lines(apps, schema_editor):
+    # Une las lineas repetidas (cart, product) en la más antigua, sumando sus cantidades,
+    # para que la restricción única se pueda crear sobre datos existentes.
+    CartProducts = apps.get_model('carts', 'CartProducts')
+
+    duplicates = CartProducts.objects.values('cart_id', 'product_id').annotate(
+        lines=Count('id'), first_id=Min('id'), quantity=Sum('quantity')
+    ).filter(lines__gt=1)
+
+    for duplicate in duplicates:
+        CartProducts.objects.filter(pk=duplicate['first_id']).update(quantity=duplicate['quantity'])
+        CartProducts.objects.filter(
+            cart_id=duplicate['cart_id'], product_id=duplicate['product_id']
+        ).exclude(pk=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0002_cart_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicated_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartproducts',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -1,15 +1,23 @@
 import uuid
 import decimal
 
-from django.db import models
+from django.db import connection, models, transaction
+from django.utils import timezone  # Fecha de creación de las lineas insertadas con SQL directo.
+from django.db.models import F, Sum, Value, OuterRef, Subquery  # Expresiones para calcular los totales en la base de datos.
+from django.db.models.functions import Cast, Coalesce, Round
 
 from users.models import User  # Importa el modelo de usuario.
 from products.models import Product  # Importa el modelo de producto.
+from products.signals import on_products_changed  # Avisa qué productos del catálogo cambiaron.
+from promo_codes.models import PromoCode  # Importa el modelo de codigo promocional (descuento de la orden).
 
 from orders.common import OrderStatus  # Importa los estados posibles de una orden (completada, creada, etc.).
 
 from django.db.models.signals import post_save, pre_save, m2m_changed  # Importa las señales necesarias.
 
+# Precision con la que se guardan los montos (dos decimales).
+CENTS = decimal.Decimal('0.01')
+
 # Modelo que representa el carrito de compras.
 class Cart(models.Model):
     # ID único para cada carrito, generado con UUID.
@@ -38,33 +46,66 @@ class Cart(models.Model):
         return self.cart_id
     
     # Actualiza tanto el subtotal como el total del carrito.
+    # El subtotal se calcula con un solo agregado en la base de datos y los totales se
+    # persisten con un UPDATE por tabla (carrito y orden abierta), sin save() ni señales.
     def update_totals(self):
-        self.update_subtotal()
-        self.update_total()
-
-        # Si hay una orden vinculada al carrito, también actualiza el total de la orden.
-        if self.order:
-            self.order.update_total()
-
-    # Calcula el subtotal sumando los precios de los productos por su cantidad.
-    def update_subtotal(self):
-        self.subtotal = sum([
-            cp.quantity * cp.product.price  for cp in self.products_related()
-        ])
-        self.save()
-    
-    # Calcula el total añadiendo una comisión al subtotal.
-    def update_total(self):
-        self.total = self.subtotal + (self.subtotal * decimal.Decimal(Cart.FEE))
-        self.save()
+        self.subtotal, self.total = self.calculate_totals()
+
+        Cart.objects.filter(pk=self.pk).update(subtotal=self.subtotal, total=self.total)
+
+        # Si hay una orden abierta vinculada al carrito, también actualiza su total.
+        self.update_order_total()
+
+    # Calcula subtotal y total del carrito con un único agregado (cantidad * precio).
+    def calculate_totals(self):
+        subtotal = self.cartproducts_set.aggregate(
+            subtotal=Sum(F('quantity') * F('product__price'), output_field=models.DecimalField(max_digits=8, decimal_places=2))
+        )['subtotal'] or decimal.Decimal('0')
+
+        total = subtotal + (subtotal * decimal.Decimal(Cart.FEE))
+        return subtotal.quantize(CENTS), total.quantize(CENTS)
+
+    # Recalcula el total de la orden en estado `CREATED` con un UPDATE dirigido.
+    # Replica `Order.get_total()`: total del carrito + envio - descuento del codigo promocional.
+    def update_order_total(self):
+        amount = models.DecimalField(max_digits=8, decimal_places=2)
+        discount = PromoCode.objects.filter(pk=OuterRef('promo_code_id')).values('discount')[:1]
+
+        self.order_set.filter(status=OrderStatus.CREATED).update(
+            total=Value(self.total, output_field=amount) + F('shipping_total') - Coalesce(
+                Cast(Subquery(discount), output_field=amount), Value(decimal.Decimal('0'), output_field=amount)
+            )
+        )
 
     # Retorna los productos relacionados con el carrito.
     def products_related(self):
+        # Un carrito sin guardar (aún no se le agregó nada) no tiene productos.
+        if self.pk is None:
+            return CartProducts.objects.none()
+
+        # Si las lineas ya fueron precargadas (`Order.objects.for_checkout()`), las reutiliza.
+        if self.has_prefetched_products():
+            return self.cartproducts_set.all()
+
         return self.cartproducts_set.select_related('product')
     
     # Verifica si el carrito tiene productos.
     def has_products(self):
-        return self.products.exists()
+        if self.has_prefetched_products():
+            return len(self.cartproducts_set.all()) > 0
+
+        return self.pk is not None and self.products.exists()
+
+    # Cantidad de productos distintos en el carrito.
+    def products_count(self):
+        if self.has_prefetched_products():
+            return len(self.cartproducts_set.all())
+
+        return self.products.count() if self.pk else 0
+
+    # Indica si las lineas del carrito (con su producto) se precargaron con prefetch_related.
+    def has_prefetched_products(self):
+        return 'cartproducts_set' in getattr(self, '_prefetched_objects_cache', {})
 
     # Retorna la orden vinculada al carrito que esté en estado `CREATED`, si existe.
     @property
@@ -76,17 +117,93 @@ class Cart(models.Model):
 class CartProductManager(models.Manager):
     
     # Crea o actualiza la cantidad de un producto en el carrito.
+    # La linea se crea o se incrementa con un solo INSERT ... ON CONFLICT DO UPDATE
+    # (`quantity = quantity + n`), así que dos peticiones concurrentes no pierden una actualización y la
+    # restricción única (cart, product) garantiza una sola linea. La escritura va primero en la transacción:
+    # toma el bloqueo antes de leer el agregado de los totales. Como nada se recupera de un error dentro
+    # del bloque, no hace falta un SAVEPOINT.
     def create_or_update_quantity(self, cart, product, quantity=1):
-        object, created = self.get_or_create(cart=cart, product=product)
+        with transaction.atomic(savepoint=False):
+            object = self.upsert_quantity(cart, product, quantity)
+            cart.update_totals()
+
+        return object
 
-        # Si el producto ya estaba en el carrito, suma la cantidad nueva a la existente.
-        if not created:
-            quantity = object.quantity + quantity
+    # Suma `quantity` a la linea (o la crea) y la retorna con la cantidad resultante, sin volver a leerla
+    # (RETURNING). No dispara `post_save`: quien la llama recalcula los totales.
+    def upsert_quantity(self, cart, product, quantity=1):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} (cart_id, product_id, quantity, created_at) VALUES (%s, %s, %s, %s) '
+                'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity '
+                'RETURNING id, quantity'.format(self.model._meta.db_table),
+                [cart.pk, product.pk, quantity, connection.ops.adapt_datetimefield_value(timezone.now())]
+            )
+            id, quantity = cursor.fetchone()
 
-        # Actualiza la cantidad del producto en el carrito.
-        object.update_quantity(quantity)
+        object = self.model.from_db(self.db, ['id', 'cart_id', 'product_id', 'quantity'], [id, cart.pk, product.pk, quantity])
+        object.cart, object.product = cart, product
         return object
-    
+
+    # Crea o actualiza en bloque varias lineas del carrito a partir de pares (product_id, cantidad).
+    # Igual que `create_or_update_quantity`, escribe primero: un solo INSERT ... SELECT ... ON CONFLICT DO UPDATE
+    # crea o incrementa todas las lineas (sin la señal `post_save` por fila) y el JOIN con los productos
+    # descarta los ids que no existen. Si falta alguno se rechaza todo el lote; si no, los totales del
+    # carrito se recalculan una única vez al final.
+    def bulk_create_or_update_quantity(self, cart, items):
+        quantities = {}
+        for product_id, quantity in items:
+            product_id, quantity = int(product_id), int(quantity)
+            if quantity < 1:
+                raise ValueError('La cantidad debe ser mayor a cero')
+
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        if not quantities:
+            return []
+
+        # Con su propio SAVEPOINT: si falta algún producto se deshacen solo las lineas de este lote.
+        with transaction.atomic():
+            objects = self.bulk_upsert_quantities(cart, quantities)
+
+            missing = sorted(set(quantities) - {object.product_id for object in objects})
+            if missing:
+                raise Product.DoesNotExist('Productos no encontrados: {}'.format(missing))
+
+            cart.update_totals()
+
+        return objects
+
+    # Suma las cantidades de `{product_id: cantidad}` a las lineas del carrito (o las crea) con una sola
+    # sentencia y retorna las lineas resultantes (RETURNING). Los productos que no existen no se insertan.
+    def bulk_upsert_quantities(self, cart, quantities):
+        values = ', '.join(['(%s, %s)'] * len(quantities))
+        params = [value for item in quantities.items() for value in item]
+        params += [cart.pk, connection.ops.adapt_datetimefield_value(timezone.now())]
+
+        # `WHERE true` evita que SQLite lea el ON CONFLICT como parte del JOIN.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'WITH items (product_id, quantity) AS (VALUES {values}) '
+                'INSERT INTO {table} (cart_id, product_id, quantity, created_at) '
+                'SELECT %s, items.product_id, items.quantity, %s FROM items '
+                'JOIN {products} ON {products}.id = items.product_id WHERE true '
+                'ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity '
+                'RETURNING id, product_id, quantity'.format(
+                    values=values, table=self.model._meta.db_table, products=Product._meta.db_table
+                ),
+                params
+            )
+            rows = cursor.fetchall()
+
+        objects = []
+        for id, product_id, quantity in rows:
+            object = self.model.from_db(self.db, ['id', 'cart_id', 'product_id', 'quantity'], [id, cart.pk, product_id, quantity])
+            object.cart = cart
+            objects.append(object)
+
+        return objects
+
 
 # Modelo que representa los productos dentro de un carrito.
 class CartProducts(models.Model):
@@ -105,6 +222,12 @@ class CartProducts(models.Model):
     # Usa el manager personalizado definido previamente.
     objects = CartProductManager()
 
+    class Meta:
+        # Un producto aparece una sola vez por carrito; las cantidades se acumulan en la misma linea.
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     # Actualiza la cantidad de un producto en el carrito.
     def update_quantity(self, quantity=1):
         self.quantity = quantity
@@ -128,7 +251,31 @@ def post_save_update_totals(sender, instance, *args, **kwargs):
     instance.cart.update_totals()  # Actualiza los totales del carrito.
 
 
+# Recalcula con un solo UPDATE los totales de los carritos abiertos (sin una orden pagada, completada
+# o cancelada) que tienen alguno de los productos, por ejemplo después de un cambio masivo de precios.
+# Replica `Cart.calculate_totals()` en la base de datos. Retorna la cantidad de carritos actualizados.
+def update_totals_for_products(product_ids):
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    closed = [OrderStatus.PAYED, OrderStatus.COMPLETED, OrderStatus.CANCELED]
+
+    carts = Cart.objects.filter(cartproducts__product_id__in=product_ids).exclude(order__status__in=closed)
+    subtotal = Coalesce(
+        Subquery(
+            CartProducts.objects.filter(cart=OuterRef('pk')).values('cart').annotate(
+                subtotal=Sum(F('quantity') * F('product__price'), output_field=amount)
+            ).values('subtotal')
+        ),
+        Value(decimal.Decimal('0'), output_field=amount)
+    )
+
+    return Cart.objects.filter(pk__in=carts.values('pk')).update(
+        subtotal=Round(subtotal, 2),
+        total=Round(subtotal * Value(1 + decimal.Decimal(str(Cart.FEE)), output_field=amount), 2),
+    )
+
+
 # Conecta las señales a las funciones correspondientes.
 pre_save.connect(set_cart_id, sender=Cart)  # Asigna el ID único antes de guardar el carrito.
 post_save.connect(post_save_update_totals, sender=CartProducts)  # Actualiza totales después de añadir productos.
 m2m_changed.connect(update_Totals, sender=Cart.products.through)  # Actualiza totales cuando cambian los productos del carrito.
+on_products_changed(update_totals_for_products)  # Recalcula los carritos abiertos cuando cambian sus productos.
@@ -1,3 +1,359 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import json
+import threading
+
+from django.db import connection
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from products.models import Product
+from orders.models import Order
+from promo_codes.models import PromoCode
+
+from orders.utils import get_order, get_or_created_order
+
+from .models import Cart, CartProducts
+from .utils import get_cart, get_or_create_cart
+
+
+class CartTotalsTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.cart = Cart.objects.create(user=self.user)
+        self.cart.refresh_from_db()
+        self.bollo = Product.objects.create(title='bollo', description='bollo de maiz',
+                                            price=Decimal('2.50'), image='products/bollo.jpg')
+        self.arepa = Product.objects.create(title='arepa', description='arepa de huevo',
+                                            price=Decimal('1.00'), image='products/arepa.jpg')
+        self.order = Order.objects.create(cart=self.cart, user=self.user)
+
+    def test_calculate_totals(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 2)
+        CartProducts.objects.create_or_update_quantity(self.cart, self.arepa, 3)
+
+        self.assertEqual(self.cart.calculate_totals(), (Decimal('8.00'), Decimal('8.40')))
+
+    def test_add_persists_cart_and_order_totals(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 2)
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 1)
+
+        self.cart.refresh_from_db()
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.cart.subtotal, Decimal('7.50'))
+        self.assertEqual(self.cart.total, Decimal('7.88'))
+        self.assertEqual(self.order.total, Decimal('12.88'))
+
+    def test_remove_updates_totals(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 2)
+        CartProducts.objects.create_or_update_quantity(self.cart, self.arepa, 1)
+
+        self.cart.products.remove(self.bollo)
+
+        self.cart.refresh_from_db()
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.cart.subtotal, Decimal('1.00'))
+        self.assertEqual(self.order.total, Decimal('6.05'))
+
+    def test_price_change_updates_open_carts_and_orders(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 2)
+        CartProducts.objects.create_or_update_quantity(self.cart, self.arepa, 3)
+
+        paid_cart = Cart.objects.create(user=self.user)
+        CartProducts.objects.create_or_update_quantity(paid_cart, self.bollo, 1)
+        paid_order = Order.objects.create(cart=paid_cart, user=self.user)
+        paid_order.pay()
+        paid_cart.refresh_from_db()
+        paid_order.refresh_from_db()
+
+        self.bollo.price = Decimal('3.00')
+        self.bollo.save()
+
+        self.cart.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.cart.subtotal, self.cart.total), self.cart.calculate_totals())
+        self.assertEqual(self.cart.subtotal, Decimal('9.00'))
+        self.assertEqual(self.order.total, self.order.get_total())
+
+        self.assertEqual(Cart.objects.get(pk=paid_cart.pk).subtotal, paid_cart.subtotal)
+        self.assertEqual(Order.objects.get(pk=paid_order.pk).total, paid_order.total)
+
+    def test_add_new_product_query_count(self):
+        # INSERT ... ON CONFLICT (RETURNING la linea) + agregado + UPDATE carrito + UPDATE orden.
+        with self.assertNumQueries(4):
+            cart_product = CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 1)
+
+        self.assertEqual(cart_product, CartProducts.objects.get(cart=self.cart, product=self.bollo))
+        self.assertIsNotNone(cart_product.created_at)
+
+    def test_add_existing_product_query_count(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 1)
+
+        # Mismo INSERT ... ON CONFLICT, que ahora suma sobre la linea existente + agregado + UPDATE carrito
+        # + UPDATE orden.
+        with self.assertNumQueries(4):
+            cart_product = CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 1)
+
+        self.assertEqual(cart_product.quantity, 2)
+        self.assertEqual(cart_product, CartProducts.objects.get(cart=self.cart, product=self.bollo))
+
+    def test_remove_product_query_count(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.bollo, 1)
+
+        # DELETE + agregado + UPDATE carrito + UPDATE orden.
+        with self.assertNumQueries(4):
+            self.cart.products.remove(self.bollo)
+
+
+class CartBulkAddTestCase(TestCase):
+
+    def setUp(self):
+        self.cart = Cart.objects.create()
+        self.cart.refresh_from_db()
+        self.products = [
+            Product.objects.create(title='producto {}'.format(i), description='descripcion',
+                                   price=Decimal('1.50'), image='products/producto.jpg')
+            for i in range(20)
+        ]
+
+    def test_bulk_add_creates_and_updates_lines(self):
+        CartProducts.objects.create_or_update_quantity(self.cart, self.products[0], 1)
+
+        items = [(product.id, 2) for product in self.products]
+        CartProducts.objects.bulk_create_or_update_quantity(self.cart, items)
+
+        self.assertEqual(self.cart.cartproducts_set.count(), 20)
+        self.assertEqual(self.cart.cartproducts_set.get(product=self.products[0]).quantity, 3)
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.subtotal, Decimal('61.50'))
+
+    def test_bulk_add_query_count_is_constant(self):
+        items = [(product.id, 1) for product in self.products]
+
+        # SAVEPOINT + INSERT ... ON CONFLICT (RETURNING las lineas) + agregado + UPDATE carrito + UPDATE orden
+        # + RELEASE, sin importar cuantas lineas se agreguen.
+        with self.assertNumQueries(6):
+            CartProducts.objects.bulk_create_or_update_quantity(self.cart, items)
+
+    def test_bulk_add_rejects_unknown_products(self):
+        with self.assertRaises(Product.DoesNotExist):
+            CartProducts.objects.bulk_create_or_update_quantity(self.cart, [(self.products[0].id, 1), (999, 1)])
+
+        self.assertFalse(self.cart.cartproducts_set.exists())
+
+    def test_add_many_view(self):
+        payload = {'items': [{'product_id': product.id, 'quantity': 1} for product in self.products[:3]]}
+
+        response = self.client.post(reverse('carts:add_many'), json.dumps(payload),
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], 3)
+        self.assertEqual(response.json()['subtotal'], '4.50')
+
+    def test_add_many_view_invalid_payload(self):
+        response = self.client.post(reverse('carts:add_many'), 'no es json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('carts:add_many'), json.dumps({'items': [{'product_id': 999}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_many_view_invalid_types(self):
+        for items in ([{'product_id': None}], [{'product_id': self.products[0].id, 'quantity': [1]}], [1], 5):
+            response = self.client.post(reverse('carts:add_many'), json.dumps({'items': items}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(CartProducts.objects.exists())
+
+
+class CartResolverTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.product = Product.objects.create(title='bollo', description='bollo de maiz',
+                                              price=Decimal('2.50'), image='products/bollo.jpg')
+
+    def make_request(self, user=None, session=None):
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.session = session or SessionStore()
+        return request
+
+    def test_get_cart_does_not_create_cart(self):
+        request = self.make_request()
+
+        cart = get_cart(request)
+
+        self.assertIsNone(cart.pk)
+        self.assertFalse(cart.has_products())
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(request.session.modified)
+
+    def test_cart_is_resolved_once_per_request(self):
+        cart = Cart.objects.create()
+        session = SessionStore()
+        session['cart_id'] = cart.cart_id
+        session.save()
+        request = self.make_request(session=SessionStore(session.session_key))
+
+        with self.assertNumQueries(2):  # sesion + carrito
+            get_cart(request)
+            get_or_create_cart(request)
+            get_cart(request)
+
+        self.assertFalse(request.session.modified)
+
+    def test_get_or_create_cart_saves_session_once(self):
+        request = self.make_request()
+
+        cart = get_or_create_cart(request)
+
+        self.assertIsNotNone(cart.pk)
+        self.assertEqual(request.session['cart_id'], cart.cart_id)
+
+    def test_order_is_resolved_once_per_request(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.refresh_from_db()
+        order = Order.objects.create(cart=cart, user=self.user)
+        request = self.make_request(user=self.user)
+        request._cached_cart = cart
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_order(request), order)
+            self.assertEqual(get_or_created_order(cart, request), order)
+
+    def test_no_order_for_unsaved_cart(self):
+        request = self.make_request(user=self.user)
+
+        self.assertIsNone(get_or_created_order(get_cart(request), request))
+
+    def test_middleware_exposes_lazy_cart(self):
+        response = self.client.get(reverse('carts:cart'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.wsgi_request.cart.pk)
+        self.assertFalse(response.wsgi_request.order)
+        self.assertFalse(Cart.objects.exists())
+
+        self.client.post(reverse('carts:add'), {'product_id': self.product.id, 'quantity': 1})
+
+        self.assertEqual(Cart.objects.count(), 1)
+        self.assertEqual(self.client.session['cart_id'], Cart.objects.get().cart_id)
+
+    def test_views_use_the_request_cart_and_order(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.refresh_from_db()
+        CartProducts.objects.create_or_update_quantity(cart, self.product, 2)
+        order = Order.objects.create(cart=cart, user=self.user)
+        promo_code = PromoCode.objects.create(discount=1, valid_from=timezone.now() - timedelta(days=1),
+                                              valid_to=timezone.now() + timedelta(days=1))
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['cart_id'] = cart.cart_id
+        session.save()
+
+        response = self.client.get(reverse('carts:cart'))
+        self.assertIs(response.context['cart'], response.wsgi_request.cart)
+
+        response = self.client.get(reverse('promo_codes:validate'), {'code': promo_code.code})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(pk=order.pk).promo_code, promo_code)
+
+
+# Los productos se confirman de verdad: sus imágenes se procesan en la misma petición y no en el
+# pool de hilos, que seguiría usando la base de datos mientras se vacía entre pruebas.
+@override_settings(PRODUCT_IMAGES_ASYNC=False)
+class CartConcurrencyTestCase(TransactionTestCase):
+    THREADS = 8
+    ITERATIONS = 10
+
+    def setUp(self):
+        # WAL permite lecturas mientras otro hilo escribe; las escrituras se serializan.
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.cart = Cart.objects.create(user=self.user)
+        self.product = Product.objects.create(title='bollo', description='bollo de maiz',
+                                              price=Decimal('2.00'), image='products/bollo.jpg')
+        self.order = Order.objects.create(cart=Cart.objects.get(pk=self.cart.pk), user=self.user)
+
+    def test_concurrent_adds_do_not_lose_updates(self):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def add_to_cart():
+            try:
+                cart = Cart.objects.get(pk=self.cart.pk)
+                barrier.wait()
+
+                for _ in range(self.ITERATIONS):
+                    CartProducts.objects.create_or_update_quantity(cart, self.product, 1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add_to_cart) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        quantity = self.THREADS * self.ITERATIONS
+        self.assertEqual(CartProducts.objects.get(cart=self.cart, product=self.product).quantity, quantity)
+        self.assertEqual(CartProducts.objects.filter(cart=self.cart).count(), 1)
+
+        self.cart.refresh_from_db()
+        self.order.refresh_from_db()
+
+        self.assertEqual(self.cart.subtotal, Decimal('2.00') * quantity)
+        self.assertEqual(self.cart.total, Decimal('168.00'))
+        self.assertEqual(self.order.total, Decimal('173.00'))
+
+    def test_concurrent_bulk_adds_do_not_lose_updates(self):
+        arepa = Product.objects.create(title='arepa', description='arepa de huevo',
+                                       price=Decimal('1.00'), image='products/arepa.jpg')
+        items = [(self.product.pk, 1), (arepa.pk, 2)]
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def add_many_to_cart():
+            try:
+                cart = Cart.objects.get(pk=self.cart.pk)
+                barrier.wait()
+
+                for _ in range(self.ITERATIONS):
+                    CartProducts.objects.bulk_create_or_update_quantity(cart, items)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add_many_to_cart) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+        runs = self.THREADS * self.ITERATIONS
+        self.assertEqual(dict(CartProducts.objects.filter(cart=self.cart).values_list('product_id', 'quantity')),
+                         {self.product.pk: runs, arepa.pk: 2 * runs})
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.subtotal, Decimal('4.00') * runs)
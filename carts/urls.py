@@ -6,5 +6,6 @@ app_name = 'carts'
 urlpatterns = [
     path('',views.cart, name='cart'),
     path('agregar',views.add, name="add"),
+    path('agregar/varios', views.add_many, name='add_many'),
     path('eliminar', views.remove, name='remove')
     ]
\ No newline at end of file
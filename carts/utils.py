@@ -1,27 +1,41 @@
 from .models import Cart
 
+# Función para obtener el carrito de la petición sin crearlo en la base de datos.
+# El carrito se resuelve una sola vez por petición y queda guardado en `request._cached_cart`.
+def get_cart(request):
+    if not hasattr(request, '_cached_cart'):
+        # Si el usuario está autenticado, lo asigna a la variable user. Si no, asigna None.
+        user = request.user if request.user.is_authenticated else None
+
+        # Busca en la base de datos el carrito que coincida con el 'cart_id' de la sesión.
+        cart_id = request.session.get('cart_id')
+        cart = Cart.objects.filter(cart_id=cart_id).first() if cart_id else None
+
+        # Si no existe, usa un carrito sin guardar: solo se crea en la base de datos
+        # cuando se le agrega algo (ver `get_or_create_cart`).
+        if cart is None:
+            cart = Cart(user=user)
+
+        # Si el usuario está autenticado y el carrito aún no tiene usuario asignado, lo asigna.
+        elif user and cart.user_id is None:
+            cart.user = user
+            cart.save(update_fields=['user'])
+
+        request._cached_cart = cart
+
+    return request._cached_cart
+
 # Función para obtener o crear un carrito de compras.
 def get_or_create_cart(request):
-    # Si el usuario está autenticado, lo asigna a la variable user. Si no, asigna None.
-    user = request.user if request.user.is_authenticated else None
-    
-    # Obtiene el 'cart_id' de la sesión actual del usuario.
-    cart_id = request.session.get('cart_id')
-
-    # Busca en la base de datos el carrito que coincida con el 'cart_id'.
-    cart = Cart.objects.filter(cart_id=cart_id).first()
-    
-    # Si no existe ningún carrito con ese 'cart_id' y hay una petición, crea uno nuevo.
-    if cart is None and request:
-        cart = Cart.objects.create(user=user)
-
-    # Si el usuario está autenticado y el carrito aún no tiene usuario asignado, lo asigna.
-    if user and cart.user is None:
-        cart.user = user
+    cart = get_cart(request)
+
+    # Si el carrito aún no existe en la base de datos, lo crea.
+    if cart.pk is None:
         cart.save()
 
-    # Guarda el 'cart_id' del carrito actual en la sesión del usuario.
-    request.session['cart_id'] = cart.cart_id
+    # Guarda el 'cart_id' en la sesión solo si cambió (evita reescribir la sesión en cada petición).
+    if request.session.get('cart_id') != cart.cart_id:
+        request.session['cart_id'] = cart.cart_id
 
     # Retorna el carrito, ya sea existente o recién creado.
     return cart
@@ -30,3 +44,6 @@ def get_or_create_cart(request):
 def destroy_cart(request):
     # Elimina el 'cart_id' de la sesión, efectivamente "destruyendo" el carrito.
     request.session["cart_id"] = None
+
+    # Olvida el carrito resuelto para esta petición.
+    request.__dict__.pop('_cached_cart', None)
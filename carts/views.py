@@ -1,12 +1,19 @@
+import json
+
+from django.contrib import messages
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.http import require_POST
 
 from .models import CartProducts, Product  # Importa los modelos necesarios.
-from .utils import get_or_create_cart  # Función utilitaria para obtener o crear un carrito.
+from .utils import get_or_create_cart  # Crea el carrito cuando se le agrega algo (`request.cart` no lo crea).
+from reservations.models import OutOfStock, StockReservation  # Reservas del stock de los productos.
 
 # Vista para mostrar el contenido del carrito.
 def cart(request):
-    # Obtiene o crea un carrito asociado al usuario actual o a la sesión.
-    cart = get_or_create_cart(request)
+    # Carrito del usuario o la sesión, resuelto por `CartMiddleware` sin crearlo si no existe.
+    cart = request.cart
 
     # Renderiza la plantilla 'cart.html' con el carrito en el contexto.
     return render(request, 'carts/cart.html', {
@@ -21,8 +28,15 @@ def add(request):
     # Obtiene el producto a partir del ID proporcionado en el POST. Si no existe, retorna un error 404.
     product = get_object_or_404(Product, pk=request.POST.get('product_id'))
     
-    # Obtiene la cantidad especificada en el POST o 1 por defecto.
-    quantity = int(request.POST.get('quantity', 1))
+    # Obtiene la cantidad especificada en el POST o 1 por defecto; debe ser un entero mayor a cero.
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+
+    if quantity < 1:
+        messages.error(request, 'La cantidad debe ser mayor a cero')
+        return redirect('products:product', product.slug)
 
     '''
     Código comentado que utiliza una relación directa muchos a muchos para agregar el producto al carrito.
@@ -31,12 +45,19 @@ def add(request):
     })
     '''
 
-    # Utiliza el manager personalizado de `CartProducts` para crear o actualizar la cantidad del producto en el carrito.
-    cart_product = CartProducts.objects.create_or_update_quantity(
-        cart=cart,
-        product=product,
-        quantity=quantity
-    )
+    # Reserva las unidades (UPDATE condicional sobre el stock) y, en la misma transacción, utiliza el
+    # manager personalizado de `CartProducts` para crear o actualizar la cantidad del producto en el carrito.
+    try:
+        with transaction.atomic():
+            StockReservation.objects.reserve(cart, product, quantity)
+            cart_product = CartProducts.objects.create_or_update_quantity(
+                cart=cart,
+                product=product,
+                quantity=quantity
+            )
+    except OutOfStock:
+        messages.error(request, 'No hay suficientes unidades de {}'.format(product.title))
+        return redirect('products:product', product.slug)
 
     # Renderiza la plantilla 'add.html' con los detalles del producto añadido al carrito.
     return render(request, 'carts/add.html', {
@@ -47,14 +68,63 @@ def add(request):
 
 # Vista para eliminar un producto del carrito.
 def remove(request):
-    # Obtiene o crea un carrito para el usuario o la sesión.
-    cart = get_or_create_cart(request)
+    # Carrito del usuario o la sesión (`CartMiddleware`); si aún no existe no hay nada que eliminar.
+    cart = request.cart
+    if cart.pk is None:
+        return redirect('carts:cart')
     
     # Obtiene el producto a partir del ID proporcionado en el POST. Si no existe, retorna un error 404.
     product = get_object_or_404(Product, pk=request.POST.get('product_id'))
 
-    # Elimina el producto del carrito.
-    cart.products.remove(product)
+    # Elimina el producto del carrito y devuelve al stock las unidades reservadas.
+    with transaction.atomic():
+        cart.products.remove(product)
+        StockReservation.objects.release(cart, product)
 
     # Redirige a la vista del carrito para mostrar los productos restantes.
     return redirect('carts:cart')
+
+
+# Vista para añadir varios productos al carrito en una sola petición (cliente móvil, "volver a comprar").
+# Espera un cuerpo JSON: {"items": [{"product_id": 1, "quantity": 2}, ...]}
+@require_POST
+def add_many(request):
+    # Los ids y las cantidades se convierten a enteros al leer el cuerpo: un tipo inválido (null, una lista...)
+    # es una petición mal formada.
+    try:
+        items = [
+            (int(item['product_id']), int(item.get('quantity', 1))) for item in json.loads(request.body)['items']
+        ]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({
+            'status': False
+        }, status=400)
+
+    # Obtiene o crea un carrito para el usuario o la sesión.
+    cart = get_or_create_cart(request)
+
+    # Reserva el stock de todas las lineas, las inserta o actualiza y recalcula los totales una sola vez.
+    # Si algún producto no tiene unidades suficientes no se agrega ninguno.
+    try:
+        with transaction.atomic():
+            cart_products = CartProducts.objects.bulk_create_or_update_quantity(cart, items)
+            StockReservation.objects.reserve_many(cart, items)
+    except OutOfStock:
+        return JsonResponse({
+            'status': False
+        }, status=409)
+    except ValueError:
+        return JsonResponse({
+            'status': False
+        }, status=400)
+    except Product.DoesNotExist:
+        return JsonResponse({
+            'status': False
+        }, status=404)
+
+    return JsonResponse({
+        'status': True,
+        'items': len(cart_products),
+        'subtotal': cart.subtotal,
+        'total': cart.total
+    })
@@ -3,4 +3,9 @@ from django.contrib import admin
 # Register your models here.
 from .models import Category
 
-admin.site.register(Category)
\ No newline at end of file
+
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('title', 'product_count', 'created_at')
+    readonly_fields = ('product_count',)
+
+admin.site.register(Category, CategoryAdmin)
@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject  # El menú solo se lee si la plantilla lo usa
+
+from products import cache  # El menú se guarda en el caché del catálogo
+
+from .models import Category
+
+
+# Categorías con productos para el menú de navegación, con su conteo desnormalizado.
+# Se guardan con la versión del catálogo, así que en las páginas servidas desde el caché el menú
+# no consulta la base de datos; cualquier cambio en el catálogo lo vuelve a leer (una consulta).
+def menu():
+    return list(
+        Category.objects.filter(product_count__gt=0).order_by('title').values('id', 'title', 'product_count')
+    )
+
+def category_menu():
+    return cache.cached('catalog:category-menu', menu)
+
+def categories(request):
+    return {'category_menu': SimpleLazyObject(category_menu)}
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:22
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Calcula el conteo de productos de las categorías existentes.
+def count_products(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+
+    for category in Category.objects.annotate(total=Count('products')):
+        Category.objects.filter(pk=category.pk).update(product_count=category.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_category_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,59 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery  # Conteo de productos por conjunto
+from django.db.models.functions import Coalesce  # Categorías sin productos cuentan cero
+from django.db.models.signals import m2m_changed, pre_delete, post_delete  # Mantienen el conteo al día
 
 from products.models import Product
+
+
+class CategoryManager(models.Manager):
+
+    # Recalcula `product_count` de las categorías indicadas (o de todas) con un solo UPDATE.
+    # Lo usan las señales y las cargas masivas que insertan en la tabla intermedia con bulk_create.
+    def update_product_counts(self, ids=None):
+        Through = Category.products.through
+        counts = Through.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id').annotate(
+            total=Count('product_id')
+        ).values('total')
+
+        categories = self.all() if ids is None else self.filter(pk__in=ids)
+        return categories.update(product_count=Coalesce(Subquery(counts), 0))
+
 # Create your models here.
 class Category(models.Model):
     title = models.CharField(max_length=50)
     description = models.TextField()
     products = models.ManyToManyField(Product, blank=True)
+    product_count = models.PositiveIntegerField(default=0, editable=False)  # Cantidad de productos (desnormalizada)
     created_at = models.DateTimeField(auto_now_add = True)
 
+    objects = CategoryManager()
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+# Señales: el conteo de productos se recalcula cuando cambian los productos de una categoría
+# (desde la categoría o desde el producto) y cuando se borra un producto, porque el borrado en
+# cascada de la tabla intermedia no dispara m2m_changed.
+def products_changed(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_category_ids = list(instance.category_set.values_list('id', flat=True))
+
+    elif action == 'post_clear':
+        Category.objects.update_product_counts(getattr(instance, '_cleared_category_ids', []) if reverse else [instance.pk])
+
+    elif action in ('post_add', 'post_remove'):
+        Category.objects.update_product_counts(pk_set if reverse else [instance.pk])
+
+def product_deleting(sender, instance, *args, **kwargs):
+    instance._deleted_category_ids = list(instance.category_set.values_list('id', flat=True))
+
+def product_deleted(sender, instance, *args, **kwargs):
+    ids = getattr(instance, '_deleted_category_ids', [])
+    if ids:
+        Category.objects.update_product_counts(ids)
+
+m2m_changed.connect(products_changed, sender=Category.products.through)
+pre_delete.connect(product_deleting, sender=Product)
+post_delete.connect(product_deleted, sender=Product)
@@ -1,3 +1,101 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from products import cache
+from products.models import Product
+from .models import Category
+
+
+class CategoryProductCountTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+        self.fritos = Category.objects.create(title='Fritos', description='categoria')
+        self.panes = Category.objects.create(title='Panes', description='categoria')
+        self.products = [
+            Product.objects.create(title=title, description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+            for title in ('carimañola', 'arepa de huevo', 'bollo de maiz')
+        ]
+
+    def counts(self):
+        return dict(Category.objects.values_list('title', 'product_count'))
+
+    def test_counts_follow_membership_changes(self):
+        carimanola, arepa, bollo = self.products
+
+        self.fritos.products.add(carimanola, arepa)
+        bollo.category_set.add(self.panes, self.fritos)
+        self.assertEqual(self.counts(), {'Fritos': 3, 'Panes': 1})
+
+        self.fritos.products.remove(arepa)
+        self.assertEqual(self.counts(), {'Fritos': 2, 'Panes': 1})
+
+        bollo.category_set.clear()
+        self.assertEqual(self.counts(), {'Fritos': 1, 'Panes': 0})
+
+        self.fritos.products.add(bollo)
+        carimanola.delete()
+        self.assertEqual(self.counts(), {'Fritos': 1, 'Panes': 0})
+
+        self.fritos.products.clear()
+        self.assertEqual(self.counts(), {'Fritos': 0, 'Panes': 0})
+
+    def test_update_product_counts(self):
+        Category.products.through.objects.bulk_create([
+            Category.products.through(category_id=self.panes.pk, product_id=product.pk) for product in self.products
+        ])
+        self.assertEqual(self.counts()['Panes'], 0)
+
+        self.assertEqual(Category.objects.update_product_counts(), 2)
+        self.assertEqual(self.counts(), {'Fritos': 0, 'Panes': 3})
+
+
+class CategoryViewsTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+        self.fritos = Category.objects.create(title='Fritos', description='categoria')
+        self.panes = Category.objects.create(title='Panes', description='categoria')
+        Category.objects.create(title='Vacia', description='categoria')
+        for i in range(14):
+            product = Product.objects.create(title='bollo {}'.format(i), description='descripcion',
+                                             price=Decimal('2.00'), image='products/producto.jpg')
+            (self.fritos if i % 2 else self.panes).products.add(product)
+
+    def test_menu_is_cached_with_the_catalog(self):
+        response = self.client.get(reverse('categories:categories'))
+        menu = [(category['title'], category['product_count']) for category in response.context['category_menu']]
+        self.assertEqual(menu, [('Fritos', 7), ('Panes', 7)])
+
+        # Página y menú servidos desde el caché: sin consultas.
+        self.client.get(reverse('categories:category', args=[self.fritos.pk]))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('categories:category', args=[self.fritos.pk]))
+        self.assertContains(response, 'Fritos <span class="badge badge-light">7</span>', html=False)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.panes.products.clear()
+        response = self.client.get(reverse('index'))
+        self.assertNotContains(response, 'Panes <span')
+
+    def test_category_list_prefetches_products(self):
+        # Menú, categorías y los productos de todas ellas (prefetch), sin importar cuántas categorías hay.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('categories:categories'))
+
+        categories = response.context['category_list']
+        self.assertEqual([category.title for category in categories], ['Fritos', 'Panes'])
+        self.assertEqual([len(category.preview) for category in categories], [4, 4])
+
+    def test_category_products_are_paginated(self):
+        response = self.client.get(reverse('categories:category', args=[self.panes.pk]))
+        self.assertEqual(len(response.context['product_list']), 7)
+        self.assertEqual(response.context['page_obj'].count, 7)
+        self.assertEqual(response.context['category'], self.panes)
 
-# Create your tests here.
+        self.assertEqual(self.client.get(reverse('categories:category', args=[999])).status_code, 404)
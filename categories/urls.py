@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'categories'
+
+urlpatterns = [
+    path('', views.CategoryListView.as_view(), name='categories'),
+    path('<int:pk>', views.CategoryProductListView.as_view(), name='category'),
+]
@@ -1,3 +1,43 @@
-from django.shortcuts import render
+from django.db.models import Prefetch  # Para traer los productos de todas las categorías en una consulta
+from django.shortcuts import get_object_or_404  # 404 si la categoría no existe
 
-# Create your views here.
+from django.views.generic.list import ListView  # Vista genérica para listar objetos
+
+from products import cache  # Caché versionado del catálogo
+from products.models import Product, ProductCard  # Productos y tarjetas para los listados
+from products.pagination import CursorPaginator  # Paginación por cursor
+from products.views import CursorPageMixin  # Páginas por cursor guardadas en el caché del catálogo
+
+from .models import Category
+
+# Vista para listar las categorías con algunos de sus productos
+# Los productos de todas las categorías se traen con un solo prefetch (a lo sumo `preview_size` por categoría).
+class CategoryListView(ListView):
+    template_name = 'categories/categories.html'  # Plantilla a utilizar
+    context_object_name = 'category_list'  # Nombre que usan las plantillas
+    preview_size = 4  # Productos que se muestran de cada categoría
+
+    def get_queryset(self):
+        preview = Product.objects.select_related('card').order_by('id')[:self.preview_size]
+        return Category.objects.filter(product_count__gt=0).order_by('title').prefetch_related(
+            Prefetch('products', queryset=preview, to_attr='preview')
+        )
+
+# Vista para listar los productos de una categoría
+# El total sale del conteo desnormalizado de la categoría (no hay COUNT(*) por página).
+class CategoryProductListView(CursorPageMixin, ListView):
+    template_name = 'categories/category.html'  # Plantilla a utilizar
+    context_object_name = 'product_list'  # Nombre que usan las plantillas
+    paginate_by = 12  # Productos por página
+
+    # La categoría y la paginación se resuelven juntas en `load_page`.
+    def get_queryset(self):
+        return ProductCard.objects.none()
+
+    def cache_key(self, cursor, page_size):
+        return cache.page_key('category:{}'.format(self.kwargs['pk']), cursor, page_size)
+
+    def load_page(self, cursor, page_size):
+        category = get_object_or_404(Category, pk=self.kwargs['pk'])
+        cards = ProductCard.objects.filter(product__category=category).order_by('pk')
+        return CursorPaginator(cards, page_size, category.product_count).page(cursor), {'category': category}
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charges', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charge',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='charge',
+            name='amount',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='charge',
+            name='charges_id',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='charge',
+            name='payment_method',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
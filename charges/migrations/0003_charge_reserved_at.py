@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charges', '0002_charge_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charge',
+            name='reserved_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
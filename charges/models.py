@@ -1,34 +1,112 @@
-from django.db import models
+import logging
+from datetime import timedelta
 
-from stripeAPI.charge import create_charge as create_charge_stripe
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.utils import timezone
+
+from stripeAPI.charge import create_charge as create_charge_stripe, refund_charge as refund_charge_stripe
 
 from users.models import User
 from orders.models import Order
 # Create your models here.
 
-class ChargeManager(models.Model):
+logger = logging.getLogger(__name__)
+
+class ChargeManager(models.Manager):
+
+    def reserve(self, order):
+        # Reserva el cobro de la orden antes de llamar a Stripe. La relación uno a uno con la
+        # orden hace que solo una petición pueda reservarlo; las demás (doble clic, reintentos)
+        # reciben None y no vuelven a cobrar.
+        try:
+            with transaction.atomic():
+                return self.create(user=order.user,
+                                   order=order,
+                                   idempotency_key=Charge.idempotency_key_for(order),
+                                   status=Charge.PENDING)
+        except IntegrityError:
+            return self.resume(order)
+
+    def resume(self, order):
+        # Una reserva más vieja que CHARGE_RESERVATION_SECONDS quedó de una petición que murió antes
+        # de terminar (sin cobrar, o cobrada sin pagar la orden, que sigue abierta): la toma el
+        # reintento con un UPDATE condicional (solo uno la consigue) y cobra con la misma llave de
+        # idempotencia, así que si Stripe ya hizo el cargo recibe ese mismo cargo y no uno nuevo.
+        now = timezone.now()
+        expired = now - timedelta(seconds=getattr(settings, 'CHARGE_RESERVATION_SECONDS', 600))
+        stale = self.filter(order=order, reserved_at__lt=expired).exclude(
+            status__in=[Charge.REFUNDED, Charge.REFUND_FAILED]
+        )
+        if stale.update(reserved_at=now):
+            return self.get(order=order)
+
+        return None
 
     def create_charge(self, order):
-        charge = create_charge_stripe(order)
+        charge = self.reserve(order)
 
-        return self.create(user=order.user,
-                           order=order,
-                           charge_id=charge.id,
-                           amount =charge.amount,
-                           payment_method=charge.payment_method,
-                           status=charge.status)
+        if charge and charge.process(order):
+            return charge
 
 class Charge(models.Model):
+    PENDING = 'pending'
+    REFUNDED = 'refunded'
+    REFUND_FAILED = 'refund_failed'  # Cobrado sin orden pagada y sin reembolso: hay que conciliarlo
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     order = models.OneToOneField(Order, on_delete=models.CASCADE)
-    charges_id = models.CharField(max_length=50)
-    amount = models.IntegerField()
-    payment_method = models.CharField(max_length=50)
+    charges_id = models.CharField(max_length=50, blank=True)
+    idempotency_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    amount = models.IntegerField(default=0)
+    payment_method = models.CharField(max_length=50, blank=True)
     status = models.CharField(max_length=50)
     crated_at = models.DateTimeField(auto_now_add=True)
+    reserved_at = models.DateTimeField(default=timezone.now)  # Inicio de la reserva del cobro (PENDING)
 
     objects = ChargeManager()
 
     def __str__(self):
         return self.charges_id
-    
+
+    @staticmethod
+    def idempotency_key_for(order):
+        # Misma llave para todos los intentos de la orden con el mismo método de pago:
+        # si Stripe ya procesó el cobro, un reintento recibe el mismo cargo en lugar de uno nuevo.
+        return 'order-{}-{}'.format(order.order_id, order.billing_profile_id)
+
+    def process(self, order):
+        # Cobra en Stripe con la llave de idempotencia de la reserva. Si el cobro no se puede
+        # hacer, libera la reserva para que la orden se pueda volver a intentar.
+        try:
+            charge = create_charge_stripe(order, idempotency_key=self.idempotency_key)
+        except Exception:
+            self.delete()
+            raise
+
+        if charge is None:
+            self.delete()
+            return False
+
+        self.charges_id = charge.id
+        self.amount = charge.amount
+        self.payment_method = charge.payment_method
+        self.status = charge.status
+        self.save(update_fields=['charges_id', 'amount', 'payment_method', 'status'])
+
+        return True
+
+    def refund(self):
+        # Reembolsa un cobro cuya orden ya no se puede pagar (por ejemplo, se canceló mientras se
+        # cobraba). Si Stripe no responde, el cobro queda en REFUND_FAILED para conciliarlo a mano.
+        try:
+            refund_charge_stripe(self.charges_id, idempotency_key='refund-{}'.format(self.idempotency_key))
+        except Exception:
+            logger.exception('No se pudo reembolsar el cobro %s de la orden %s', self.charges_id, self.order_id)
+            self.status = Charge.REFUND_FAILED
+            self.save(update_fields=['status'])
+            return False
+
+        self.status = Charge.REFUNDED
+        self.save(update_fields=['status'])
+        return True
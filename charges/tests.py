@@ -1,3 +1,172 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from products.models import Product
+from carts.models import Cart, CartProducts
+from billing_profiles.models import BillingProfile
+from orders.common import OrderStatus
+from orders.models import Order, OutboxMail
+
+from .models import Charge
+
+
+class StripeStub:
+    """Reemplazo local de `stripeAPI.charge.create_charge`: registra las llamadas y tarda un poco
+    para que las peticiones concurrentes se superpongan."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, order, idempotency_key=None):
+        with self.lock:
+            self.calls.append(idempotency_key)
+
+        time.sleep(self.delay)
+        return SimpleNamespace(id='ch_{}'.format(len(self.calls)), amount=int(order.total) * 100,
+                               payment_method='card', status='succeeded')
+
+
+class ChargeTestMixin:
+
+    def create_order(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.user.customer_id = 'cus_123'
+        self.user.save()
+
+        cart = Cart.objects.create(user=self.user)
+        product = Product.objects.create(title='bollo', description='bollo de maiz',
+                                         price=Decimal('2.00'), image='products/bollo.jpg')
+        CartProducts.objects.create_or_update_quantity(Cart.objects.get(pk=cart.pk), product, 2)
+
+        billing_profile = BillingProfile.objects.create(user=self.user, token='tok', card_id='card',
+                                                        last4='4242', brand='Visa', default=True)
+        self.cart = Cart.objects.get(pk=cart.pk)
+        self.order = Order.objects.create(cart=self.cart, user=self.user, billing_profile=billing_profile)
+
+    def make_client(self):
+        client = Client()
+        client.force_login(self.user)
+
+        session = client.session
+        session['cart_id'] = self.cart.cart_id
+        session.save()
+        return client
+
+
+class ChargeTestCase(ChargeTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_order()
+
+    def test_reserve_only_once(self):
+        self.assertIsNotNone(Charge.objects.reserve(self.order))
+        self.assertIsNone(Charge.objects.reserve(self.order))
+
+    def test_failed_charge_releases_reservation(self):
+        with mock.patch('charges.models.create_charge_stripe', return_value=None):
+            self.assertIsNone(Charge.objects.create_charge(self.order))
+
+        self.assertFalse(Charge.objects.exists())
+
+        stub = StripeStub(delay=0)
+        with mock.patch('charges.models.create_charge_stripe', stub):
+            charge = Charge.objects.create_charge(self.order)
+
+        self.assertEqual(charge.charges_id, 'ch_1')
+        self.assertEqual(stub.calls, [Charge.idempotency_key_for(self.order)])
+
+    def test_stale_reservation_is_resumed_with_same_key(self):
+        charge = Charge.objects.reserve(self.order)
+        self.assertIsNone(Charge.objects.reserve(self.order))
+
+        # La petición que reservó murió: pasado el tiempo de la reserva, un reintento la retoma.
+        Charge.objects.filter(pk=charge.pk).update(reserved_at=timezone.now() - timedelta(hours=1))
+        stub = StripeStub(delay=0)
+        with mock.patch('charges.models.create_charge_stripe', stub):
+            resumed = Charge.objects.create_charge(self.order)
+
+        self.assertEqual(resumed.pk, charge.pk)
+        self.assertEqual(stub.calls, [charge.idempotency_key])
+        self.assertIsNone(Charge.objects.reserve(self.order))
+
+    def test_charge_is_refunded_when_order_cannot_be_paid(self):
+        client = self.make_client()
+        self.order.cancel()
+
+        # La orden se cancela mientras se cobra: pay() falla y el cobro se reembolsa.
+        with mock.patch('charges.models.create_charge_stripe', StripeStub(delay=0)), \
+                mock.patch('orders.decorators.get_checkout_order', return_value=self.order), \
+                mock.patch('charges.models.refund_charge_stripe') as refund:
+            client.get(reverse('orders:complete'))
+
+        refund.assert_called_once_with('ch_1', idempotency_key='refund-{}'.format(Charge.idempotency_key_for(self.order)))
+        self.assertEqual(Charge.objects.get().status, Charge.REFUNDED)
+
+        # Si el reembolso falla, el cobro queda marcado para conciliarlo.
+        charge = Charge.objects.get()
+        with mock.patch('charges.models.refund_charge_stripe', side_effect=Exception), \
+                self.assertLogs('charges.models', 'ERROR'):
+            self.assertFalse(charge.refund())
+        self.assertEqual(Charge.objects.get().status, Charge.REFUND_FAILED)
+
+    def test_status_transitions(self):
+        self.assertFalse(self.order.complete())
+        self.assertTrue(self.order.pay())
+        self.assertFalse(self.order.pay())
+        self.assertTrue(self.order.complete())
+        self.assertFalse(self.order.cancel())
+
+        self.assertEqual(Order.objects.filter(status=OrderStatus.COMPLETED).count(), 1)
+
+
+@override_settings(PRODUCT_IMAGES_ASYNC=False)
+class ConcurrentCompleteTestCase(ChargeTestMixin, TransactionTestCase):
+    THREADS = 6
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+        self.create_order()
+
+    def test_parallel_completes_charge_once(self):
+        stub = StripeStub()
+        clients = [self.make_client() for _ in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def complete(client):
+            try:
+                barrier.wait()
+                client.get(reverse('orders:complete'))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        with mock.patch('charges.models.create_charge_stripe', stub):
+            threads = [threading.Thread(target=complete, args=(client,)) for client in clients]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(stub.calls), 1)
+        self.assertEqual(Charge.objects.count(), 1)
+        self.assertEqual(Charge.objects.get().charges_id, 'ch_1')
+        self.assertEqual(Order.objects.filter(pk=self.order.pk, status=OrderStatus.COMPLETED).count(), 1)
+        self.assertEqual(OutboxMail.objects.filter(order=self.order).count(), 1)
+        self.assertEqual(self.order.lines.count(), 1)
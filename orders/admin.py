@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Order
+from .models import Order, OutboxMail
 # Register your models here.
 
-admin.site.register(Order)
\ No newline at end of file
+admin.site.register(Order)
+admin.site.register(OutboxMail)
\ No newline at end of file
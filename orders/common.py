@@ -6,4 +6,12 @@ class OrderStatus(Enum):
     COMPLETED = 'COMPLETED'
     CANCELED = 'CANCELED'
 
-choices = [(tag, tag.value) for tag in OrderStatus]
\ No newline at end of file
+choices = [(tag, tag.value) for tag in OrderStatus]
+
+class MailStatus(Enum):
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+mail_choices = [(tag, tag.value) for tag in MailStatus]
@@ -1,12 +1,18 @@
+from django.shortcuts import redirect
+
+from .utils import get_checkout_order
 from .utils import get_or_created_order
-from carts.utils import get_or_create_cart
 
 def validate_cart_and_order(function):
     def wrap(request, *args, **kwargs):
-        cart = get_or_create_cart(request)
+        order = get_checkout_order(request)
+
+        if order is None:
+            order = get_or_created_order(request.cart, request)
 
-        order = get_or_created_order(cart,request)
+        if order is None:
+            return redirect('carts:cart')
 
-        return function(request,cart, order, *args, **kwargs)
+        return function(request,order.cart, order, *args, **kwargs)
     
     return wrap
\ No newline at end of file
@@ -4,6 +4,9 @@ from django.conf import settings
 
 from django.template.loader import get_template
 from django.core.mail import EmailMultiAlternatives
+from django.core.mail import get_connection
+
+from .models import OutboxMail
 
 class Mail:
     @staticmethod
@@ -14,18 +17,72 @@ class Mail:
             )
 
     @staticmethod
-    def send_complete_order(order, user):
+    def complete_order_message(order, user, template=None, next_url=None, connection=None):
         subject = 'Tu pedido ha sido enviado'
-        template = get_template('orders/mails/complete.html')
+        template = template or get_template('orders/mails/complete.html')
         content = template.render({
             'user' : user,
-            'next_url': Mail.get_absolute_url('orders:completeds')
+            'order': order,
+            'next_url': next_url or Mail.get_absolute_url('orders:completeds')
         })
 
         message = EmailMultiAlternatives(subject,
                                          'mensaje impotante',
                                          settings.EMAIL_HOST_USER,
-                                         [user.email])
-        
+                                         [user.email],
+                                         connection=connection)
+
         message.attach_alternative(content,'text/html')
-        message.send()
\ No newline at end of file
+        return message
+
+    @staticmethod
+    def send_complete_order(order, user):
+        Mail.complete_order_message(order, user).send()
+
+    # Envía un lote de la bandeja de salida con una sola conexión SMTP; retorna (enviados, fallidos).
+    # El lote se toma primero (SENDING) para que otro proceso no lo envíe y cada correo se marca al salir.
+    # Si la conexión no abre, el lote se reprograma con espera, como los correos que fallan.
+    @staticmethod
+    def send_outbox(batch_size=50, connection=None):
+        mails = OutboxMail.objects.claim(batch_size)
+        if not mails:
+            return 0, 0
+
+        template = get_template('orders/mails/complete.html')
+        next_url = Mail.get_absolute_url('orders:completeds')
+
+        connection = connection or get_connection()
+        try:
+            connection.open()
+        except Exception as error:
+            OutboxMail.objects.reschedule(mails, error)
+            return 0, len(mails)
+
+        sent, failed = 0, 0
+        try:
+            for index, mail in enumerate(mails):
+                message = Mail.complete_order_message(mail.order, mail.order.user,
+                                                      template, next_url, connection)
+                try:
+                    message.send()
+                except Exception as error:
+                    mail.register_failure(error)
+                    mail.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                    failed += 1
+
+                    # Descarta la conexión por si quedó rota y abre otra para el resto del lote.
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as error:
+                        rest = mails[index + 1:]
+                        OutboxMail.objects.reschedule(rest, error)
+                        failed += len(rest)
+                        break
+                else:
+                    mail.mark_sent()
+                    sent += 1
+        finally:
+            connection.close()
+
+        return sent, failed
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.mails import Mail
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos pendientes de la bandeja de salida por lotes, reutilizando la conexión SMTP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Cantidad de correos por lote (una conexión SMTP por lote).')
+        parser.add_argument('--loop', action='store_true',
+                            help='Sigue revisando la bandeja de salida en lugar de terminar al vaciarla.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Segundos de espera entre revisiones cuando la bandeja está vacía.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = Mail.send_outbox(options['batch_size'])
+
+            if sent or failed:
+                self.stdout.write('Enviados: {} - Fallidos: {}'.format(sent, failed))
+                continue
+
+            if not options['loop']:
+                break
+
+            time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import orders.common
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_rename_billing_profiles_order_billing_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('complete_order', 'Orden completada')], max_length=50)),
+                ('status', models.CharField(choices=[(orders.common.MailStatus['PENDING'], 'PENDING'), (orders.common.MailStatus['SENT'], 'SENT'), (orders.common.MailStatus['FAILED'], 'FAILED')], default=orders.common.MailStatus['PENDING'], max_length=50)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='orders.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
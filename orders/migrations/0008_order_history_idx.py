@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_outboxmail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', '-id'], name='order_history_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from orders.common import OrderStatus
+
+
+def snapshot_completed_orders(apps, schema_editor):
+    # Copia las lineas de los carritos de las ordenes ya completadas (con el precio actual del producto).
+    Order = apps.get_model('orders', 'Order')
+    OrderLine = apps.get_model('orders', 'OrderLine')
+    CartProducts = apps.get_model('carts', 'CartProducts')
+
+    orders = dict(Order.objects.filter(status=OrderStatus.COMPLETED, cart__isnull=False).values_list('cart_id', 'id'))
+
+    lines = []
+    for cp in CartProducts.objects.filter(cart_id__in=orders).select_related('product').iterator():
+        lines.append(OrderLine(order_id=orders[cp.cart_id],
+                               product=cp.product,
+                               title=cp.product.title,
+                               image=cp.product.image,
+                               unit_price=cp.product.price,
+                               quantity=cp.quantity,
+                               line_total=cp.product.price * cp.quantity))
+
+    OrderLine.objects.bulk_create(lines, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_image'),
+        ('carts', '0003_cartproducts_unique_cart_product'),
+        ('orders', '0008_order_history_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='cart',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='carts.cart'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=50)),
+                ('image', models.ImageField(blank=True, upload_to='products/')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('quantity', models.IntegerField()),
+                ('line_total', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='orders.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(snapshot_completed_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:33
+
+from django.db import migrations, models
+import orders.common
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_orderline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmail',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='outboxmail',
+            name='status',
+            field=models.CharField(choices=[(orders.common.MailStatus['PENDING'], 'PENDING'), (orders.common.MailStatus['SENDING'], 'SENDING'), (orders.common.MailStatus['SENT'], 'SENT'), (orders.common.MailStatus['FAILED'], 'FAILED')], default=orders.common.MailStatus['PENDING'], max_length=50),
+        ),
+    ]
@@ -4,25 +4,57 @@ import decimal
 
 from enum import Enum
 
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
 
 from users.models import User
-from carts.models import Cart
+from products.models import Product
+from products.signals import on_products_changed
+from carts.models import Cart, CartProducts
 from shipping_addresses.models import ShippingAddress
 from billing_profiles.models import BillingProfile
 from promo_codes.models import PromoCode
+from reservations.models import StockReservation
+from sales.models import record_sale
 
 from .common import OrderStatus
+from .common import MailStatus
 from .common import choices
+from .common import mail_choices
 
 from django.db.models.signals import pre_save
 # Create your models here.
         
+class OrderQuerySet(models.QuerySet):
+
+    def for_checkout(self):
+        # Orden con todo lo que usa el flujo de compra: carrito, direccion, perfil de pago y
+        # codigo promocional en el mismo JOIN, y las lineas del carrito con su producto precargadas.
+        return self.select_related(
+            'cart', 'shipping_address', 'billing_profile', 'promo_code'
+        ).prefetch_related(
+            Prefetch('cart__cartproducts_set', queryset=CartProducts.objects.select_related('product'))
+        )
+
+    def for_history(self):
+        # Datos por fila del historial de pedidos: cantidad de lineas, direccion y lineas precargadas
+        # en la consulta de la página, en lugar de consultarlos por cada orden en la plantilla.
+        # Las lineas son la copia tomada al completar la orden (`OrderLine`), sin pasar por el carrito.
+        return self.select_related('shipping_address').annotate(
+            products_count=Count('lines')
+        ).prefetch_related('lines')
+
+OrderManager = models.Manager.from_queryset(OrderQuerySet)
 
 class Order(models.Model):
     order_id = models.CharField(max_length=100, null=False, blank=False, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
+    # Al completarse, la orden guarda sus lineas en `OrderLine`; el carrito se puede eliminar después.
+    cart = models.ForeignKey(Cart, null=True, blank=True, on_delete=models.SET_NULL)
     status = models.CharField(max_length=50, choices=choices, 
                               default=OrderStatus.CREATED)
     shipping_total = models.DecimalField(default=5, max_digits=8, decimal_places=2)
@@ -36,6 +68,14 @@ class Order(models.Model):
     billing_profile = models.ForeignKey(BillingProfile, null=True, blank=True,
                                          on_delete=models.CASCADE)
 
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            # Historial de pedidos: filtra por usuario y estado y pagina por id descendente.
+            models.Index(fields=['user', 'status', '-id'], name='order_history_idx'),
+        ]
+
     def __str__(self) :
         return self.order_id
     
@@ -56,6 +96,8 @@ class Order(models.Model):
         if billing_profile:
             self.update_billing_profile(billing_profile)
 
+        return billing_profile
+
     def get_or_set_shipping_address(self):
         if self.shipping_address:
             return self.shipping_address
@@ -74,17 +116,52 @@ class Order(models.Model):
         self.shipping_address = shipping_address
         self.save()
 
+    def transition(self, current, new):
+        # Cambia el estado solo si la orden sigue en `current` (UPDATE condicional, tipo CAS).
+        # Si otra petición ya la movió, no hace nada y retorna False.
+        updated = Order.objects.filter(pk=self.pk, status=current).update(status=new)
+        if updated:
+            self.status = new
+
+        return updated > 0
+
     def cancel(self):
-        self.status = OrderStatus.CANCELED
-        self.save()
-        
+        # Al cancelar, las unidades reservadas por el carrito vuelven al stock.
+        with transaction.atomic():
+            if not self.transition(OrderStatus.CREATED, OrderStatus.CANCELED):
+                return False
+
+            if self.cart_id:
+                StockReservation.objects.release(self.cart_id)
+
+        return True
+
+    def pay(self):
+        return self.transition(OrderStatus.CREATED, OrderStatus.PAYED)
+
     def complete(self):
-        self.status = OrderStatus.COMPLETED
-        self.save()
+        # El correo de confirmación queda en la bandeja de salida en la misma transacción.
+        with transaction.atomic():
+            if not self.transition(OrderStatus.PAYED, OrderStatus.COMPLETED):
+                return False
+
+            if not self.lines.exists():
+                self.snapshot_lines()
+
+            # Las unidades ya se descontaron del stock al reservarlas.
+            if self.cart_id:
+                StockReservation.objects.consume(self.cart_id)
+
+            # Suma la orden a los contadores de los más vendidos (una sola vez: la transición es condicional).
+            record_sale(self.lines.values_list('product_id', 'quantity'))
+
+            OutboxMail.objects.create(order=self, kind=OutboxMail.COMPLETE_ORDER)
+
+        return True
         
     def update_total(self):
         self.total = self.get_total()
-        self.save()
+        Order.objects.filter(pk=self.pk).update(total=self.total)
     
     def get_discount(self):
         if self.promo_code:
@@ -98,15 +175,133 @@ class Order(models.Model):
     @property
     def description(self):
         return 'Compra por ({}) productos'.format(
-            self.cart.products.count()
+            self.lines.count()
         )
 
+    def snapshot_lines(self):
+        # Copia las lineas del carrito (titulo, precio unitario, cantidad y total) en `OrderLine`
+        # con un solo INSERT, reemplazando una copia anterior si la había.
+        self.lines.all().delete()
+
+        return OrderLine.objects.bulk_create([
+            OrderLine(order=self,
+                      product=cp.product,
+                      title=cp.product.title,
+                      image=cp.product.image.name,
+                      unit_price=cp.product.price,
+                      quantity=cp.quantity,
+                      line_total=cp.product.price * cp.quantity)
+            for cp in self.cart.products_related()
+        ])
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL)
+    title = models.CharField(max_length=50)
+    image = models.ImageField(upload_to='products/', blank=True)
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2)
+    quantity = models.IntegerField()
+    line_total = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return '{} x {}'.format(self.quantity, self.title)
+
+class OutboxMailManager(models.Manager):
+
+    def claim(self, batch_size):
+        # Toma un lote para un solo proceso: los correos pasan a SENDING con un UPDATE condicional
+        # marcado con un token, así dos procesos nunca envían el mismo correo. La reserva vence a
+        # los CLAIM_LEASE (el proceso murió) y el correo se puede volver a tomar.
+        now = timezone.now()
+        due = Q(status=MailStatus.PENDING) | Q(status=MailStatus.SENDING)
+        ids = list(self.filter(due, next_attempt_at__lte=now).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        self.filter(due, pk__in=ids, next_attempt_at__lte=now).update(
+            status=MailStatus.SENDING, claimed_by=token, next_attempt_at=now + OutboxMail.CLAIM_LEASE
+        )
+        # Lote tomado, con la orden y el usuario en el mismo JOIN y las lineas de cada orden precargadas.
+        return list(self.select_related('order__user').prefetch_related('order__lines').filter(
+            status=MailStatus.SENDING, claimed_by=token
+        ).order_by('id'))
+
+    # Reprograma los correos de un lote que no se pudieron enviar (por ejemplo, sin conexión SMTP).
+    def reschedule(self, mails, error):
+        for mail in mails:
+            mail.register_failure(error)
+
+        self.bulk_update(mails, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+class OutboxMail(models.Model):
+    COMPLETE_ORDER = 'complete_order'
+    KINDS = [(COMPLETE_ORDER, 'Orden completada')]
+
+    # Reintentos: espera 1, 2, 4, 8... minutos entre intentos y se rinde tras MAX_ATTEMPTS.
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY = timedelta(minutes=1)
+    CLAIM_LEASE = timedelta(minutes=10)  # Tiempo que un proceso retiene un lote tomado
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=50, choices=KINDS)
+    status = models.CharField(max_length=50, choices=mail_choices, default=MailStatus.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.CharField(max_length=32, blank=True)  # Token del proceso que tomó el correo
+
+    objects = OutboxMailManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.kind, self.order_id)
+
+    def register_failure(self, error):
+        self.attempts += 1
+        self.last_error = str(error)
+
+        if self.attempts >= OutboxMail.MAX_ATTEMPTS:
+            self.status = MailStatus.FAILED
+        else:
+            self.status = MailStatus.PENDING
+            self.next_attempt_at = timezone.now() + OutboxMail.RETRY_DELAY * 2 ** (self.attempts - 1)
+
+    def mark_sent(self):
+        OutboxMail.objects.filter(pk=self.pk).update(status=MailStatus.SENT, sent_at=timezone.now())
+
 def set_order_id(sender, instance, *args, **kwargs):
     if not instance.order_id:
         instance.order_id = str(uuid.uuid4())
 
 def set_total(sender, instance, *args, **kwargs):
-    instance.total = instance.get_total()
+    if instance.cart_id:
+        instance.total = instance.get_total()
+
+# Recalcula con un solo UPDATE el total de las órdenes creadas cuyo carrito tiene alguno de los productos.
+# Replica `Order.get_total()`. Se registra después de `carts.models.update_totals_for_products`
+# (este módulo importa `carts.models`), así que usa los totales de los carritos ya actualizados.
+def update_totals_for_products(product_ids):
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    cart_total = Cart.objects.filter(pk=OuterRef('cart_id')).values('total')[:1]
+    discount = PromoCode.objects.filter(pk=OuterRef('promo_code_id')).values('discount')[:1]
+
+    orders = Order.objects.filter(status=OrderStatus.CREATED, cart__cartproducts__product_id__in=product_ids)
+    return Order.objects.filter(pk__in=orders.values('pk')).update(
+        total=Subquery(cart_total, output_field=amount) + F('shipping_total') - Coalesce(
+            Cast(Subquery(discount), output_field=amount), Value(decimal.Decimal('0'), output_field=amount)
+        )
+    )
 
 pre_save.connect(set_order_id, sender=Order)
-pre_save.connect(set_total, sender=Order)
\ No newline at end of file
+pre_save.connect(set_total, sender=Order)
+on_products_changed(update_totals_for_products)
@@ -1,3 +1,309 @@
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from categories.context_processors import category_menu
+from products.models import Product
+from carts.models import Cart, CartProducts
+from shipping_addresses.models import ShippingAddress
+from billing_profiles.models import BillingProfile
+
+from .common import MailStatus, OrderStatus
+from .mails import Mail
+from .models import Order, OutboxMail
+
+
+class CheckoutTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.cart = Cart.objects.create(user=self.user)
+        self.cart.refresh_from_db()
+
+        for i in range(5):
+            product = Product.objects.create(title='producto {}'.format(i), description='descripcion',
+                                             price=Decimal('2.00'), image='products/producto.jpg')
+            CartProducts.objects.create_or_update_quantity(self.cart, product, 1)
+
+        self.cart.refresh_from_db()
+        self.order = Order.objects.create(cart=self.cart, user=self.user)
+
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['cart_id'] = self.cart.cart_id
+        session['order_id'] = self.order.order_id
+        session.save()
+
+        # El menú de la navegación sale del caché del catálogo: se carga antes para que las pruebas
+        # cuenten solo las consultas de cada vista.
+        category_menu()
+
+    def add_shipping_address(self):
+        self.shipping_address = ShippingAddress.objects.create(
+            user=self.user, line1='calle 1', city='Cartagena', state='Bolivar',
+            country='Colombia', reference='casa', postal_code='130001', default=True
+        )
+        self.order.update_shipping_address(self.shipping_address)
+
+    def add_billing_profile(self):
+        self.billing_profile = BillingProfile.objects.create(
+            user=self.user, token='tok', card_id='card', last4='4242', brand='Visa', default=True
+        )
+        self.order.update_billing_profile(self.billing_profile)
+
+    def test_for_checkout_loads_order_in_two_queries(self):
+        self.add_shipping_address()
+        self.add_billing_profile()
+
+        with self.assertNumQueries(2):
+            order = Order.objects.for_checkout().get(pk=self.order.pk)
+
+            self.assertEqual(order.shipping_address, self.shipping_address)
+            self.assertEqual(order.billing_profile, self.billing_profile)
+            self.assertIsNone(order.promo_code)
+            self.assertTrue(order.cart.has_products())
+            self.assertEqual([cp.product.title for cp in order.cart.products_related()][0], 'producto 0')
+
+    def test_complete_snapshots_lines(self):
+        self.order.pay()
+        self.order.complete()
+
+        Product.objects.filter(title='producto 0').update(price=Decimal('9.00'))
+        CartProducts.objects.filter(cart=self.cart).delete()
+
+        lines = list(self.order.lines.all())
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[0].title, 'producto 0')
+        self.assertEqual(lines[0].unit_price, Decimal('2.00'))
+        self.assertEqual(lines[0].line_total, Decimal('2.00'))
+        self.assertEqual(self.order.description, 'Compra por (5) productos')
+
+    def test_completed_order_survives_cart_deletion(self):
+        self.order.pay()
+        self.order.complete()
+        total = Order.objects.get(pk=self.order.pk).total
+
+        self.cart.delete()
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertIsNone(order.cart)
+        self.assertEqual(order.total, total)
+        self.assertEqual(order.lines.count(), 5)
+
+    def test_order_view_queries(self):
+        # sesion + usuario + orden (JOIN) + lineas del carrito.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('orders:order'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'producto 4')
+
+    def test_address_view_queries(self):
+        self.add_shipping_address()
+
+        # sesion + usuario + orden (JOIN) + lineas del carrito + direcciones del usuario.
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('orders:address'))
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_payment_view_queries(self):
+        self.add_shipping_address()
+        self.add_billing_profile()
+
+        # sesion + usuario + orden (JOIN) + lineas del carrito.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('orders:payment'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '4242')
+
+    def test_confirm_view_queries(self):
+        self.add_shipping_address()
+        self.add_billing_profile()
+
+        # sesion + usuario + orden (JOIN) + lineas del carrito.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('orders:confirm'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'producto 4')
+
+    def test_empty_cart_redirects(self):
+        CartProducts.objects.filter(cart=self.cart).delete()
+
+        response = self.client.get(reverse('orders:order'))
+
+        self.assertRedirects(response, reverse('carts:cart'))
+
+
+class SMTPStandIn(EmailBackend):
+    """Servidor SMTP de prueba: cuenta las conexiones y rechaza los destinatarios en `refused`."""
+    opened = 0
+    refused = set()
+
+    def open(self):
+        SMTPStandIn.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if set(message.to) & SMTPStandIn.refused:
+                raise SMTPRecipientsRefused({address: (550, 'rechazado') for address in message.to})
+
+        return super().send_messages(messages)
+
+
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        SMTPStandIn.opened = 0
+        SMTPStandIn.refused = set()
+
+        self.orders = []
+        for i in range(3):
+            user = User.objects.create_user('cliente{}'.format(i), 'cliente{}@example.com'.format(i), 'password')
+            cart = Cart.objects.create(user=user)
+            cart.refresh_from_db()
+            self.orders.append(Order.objects.create(cart=cart, user=user))
+
+    def test_complete_enqueues_mail_without_sending(self):
+        self.orders[0].pay()
+        self.orders[0].complete()
+
+        self.assertEqual(OutboxMail.objects.filter(order=self.orders[0], status=MailStatus.PENDING).count(), 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_outbox_uses_one_connection_per_batch(self):
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        # ids pendientes + UPDATE que toma el lote + lote tomado (con orden y usuario)
+        # + lineas de las ordenes + un UPDATE por correo enviado
+        with self.assertNumQueries(7):
+            sent, failed = Mail.send_outbox(connection=SMTPStandIn())
+
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(SMTPStandIn.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['cliente0@example.com', 'cliente1@example.com', 'cliente2@example.com'])
+        self.assertFalse(OutboxMail.objects.filter(status=MailStatus.PENDING).exists())
+
+    def test_failed_mail_is_retried_with_backoff(self):
+        SMTPStandIn.refused = {'cliente1@example.com'}
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        sent, failed = Mail.send_outbox(connection=SMTPStandIn())
+
+        self.assertEqual((sent, failed), (2, 1))
+
+        outbox_mail = OutboxMail.objects.get(order=self.orders[1])
+        self.assertEqual(outbox_mail.status, str(MailStatus.PENDING))
+        self.assertEqual(outbox_mail.attempts, 1)
+        self.assertGreater(outbox_mail.next_attempt_at, outbox_mail.created_at)
+
+        # No se reintenta antes de tiempo.
+        self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (0, 0))
+
+    def test_claimed_mails_are_not_sent_twice(self):
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        claimed = OutboxMail.objects.claim(2)
+        self.assertEqual(len(claimed), 2)
+
+        # Otro proceso solo recibe el correo que no se tomó.
+        self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (1, 0))
+        self.assertEqual(OutboxMail.objects.filter(status=MailStatus.SENDING).count(), 2)
+
+        # Si el proceso que los tomó muere, se pueden volver a tomar cuando vence la reserva.
+        OutboxMail.objects.filter(status=MailStatus.SENDING).update(next_attempt_at=timezone.now())
+        self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (2, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_connection_failure_reschedules_batch(self):
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        with mock.patch.object(SMTPStandIn, 'open', side_effect=ConnectionRefusedError):
+            self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (0, 3))
+
+        self.assertEqual(OutboxMail.objects.filter(status=MailStatus.PENDING, attempts=1).count(), 3)
+        self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (0, 0))
+
+    def test_failed_mail_reopens_connection_once(self):
+        SMTPStandIn.refused = {'cliente0@example.com'}
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        self.assertEqual(Mail.send_outbox(connection=SMTPStandIn()), (2, 1))
+        self.assertEqual(SMTPStandIn.opened, 2)
+
+    def test_mail_fails_after_max_attempts(self):
+        outbox_mail = OutboxMail.objects.create(order=self.orders[0], kind=OutboxMail.COMPLETE_ORDER)
+
+        for _ in range(OutboxMail.MAX_ATTEMPTS):
+            outbox_mail.register_failure('rechazado')
+
+        self.assertEqual(outbox_mail.status, MailStatus.FAILED)
+
+    def test_send_mails_command(self):
+        for order in self.orders:
+            order.pay()
+            order.complete()
+
+        call_command('send_mails', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class OrderHistoryTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        products = [
+            Product.objects.create(title='producto {}'.format(i), description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+            for i in range(2)
+        ]
+
+        for _ in range(25):
+            cart = Cart.objects.create(user=self.user)
+            cart.refresh_from_db()
+            CartProducts.objects.bulk_create_or_update_quantity(cart, [(product.id, 1) for product in products])
+            Order.objects.create(cart=cart, user=self.user, status=OrderStatus.COMPLETED).snapshot_lines()
+
+        self.client.force_login(self.user)
+        category_menu()
+
+    def test_history_is_keyset_paginated(self):
+        # sesion + usuario + pagina (con cantidad de lineas) + lineas de las ordenes, sin COUNT(*).
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('orders:completeds'))
+
+        orders = response.context['object_list']
+        self.assertEqual(len(orders), 10)
+        self.assertEqual(orders[0].products_count, 2)
+        self.assertEqual(response.context['next_cursor'], orders[-1].id)
+
+        seen = [order.id for order in orders]
+        while response.context['next_cursor']:
+            response = self.client.get(reverse('orders:completeds'), {'cursor': response.context['next_cursor']})
+            seen += [order.id for order in response.context['object_list']]
 
-# Create your tests here.
+        self.assertEqual(seen, list(self.user.orders_complete().values_list('id', flat=True)))
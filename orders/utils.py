@@ -1,18 +1,53 @@
 from .models import Order
+from .common import OrderStatus
 
 from django.urls import reverse
 
+from carts.utils import get_cart
+
+def get_order(request):
+    # Resuelve la orden abierta del carrito una sola vez por petición.
+    if not hasattr(request, '_cached_order'):
+        cart = get_cart(request)
+        request._cached_order = cart.order if cart.pk else None
+
+    return request._cached_order
+
 def get_or_created_order(cart, request):
-    order = cart.order
+    order = get_order(request)
 
-    if order is None and request.user.is_authenticated:
+    # Solo se crea la orden para un carrito que ya existe en la base de datos.
+    if order is None and cart.pk and request.user.is_authenticated:
         order = Order.objects.create(cart=cart, user=request.user)
+        request._cached_order = order
 
-    if order:
+    if order and request.session.get('order_id') != order.order_id:
         request.session['order_id'] = order.order_id
 
     return order
 
+def get_checkout_order(request):
+    # Carga la orden abierta de la sesión para el flujo de compra en dos consultas
+    # (orden + relaciones en un JOIN, lineas del carrito con su producto) y la deja
+    # en la caché de la petición junto con su carrito.
+    cart_id = request.session.get('cart_id')
+    if not cart_id or not request.user.is_authenticated:
+        return None
+
+    order = Order.objects.for_checkout().filter(
+        cart__cart_id=cart_id, user=request.user, status=OrderStatus.CREATED
+    ).first()
+
+    if order:
+        order.user = request.user
+        request._cached_cart = order.cart
+        request._cached_order = order
+
+        if request.session.get('order_id') != order.order_id:
+            request.session['order_id'] = order.order_id
+
+    return order
+
 def breadcrumb(products=True, address=False, payment=False, confirmation=False):
     return [
         {'title':'Productos' ,'active': products, 'url': reverse('orders:order')},
@@ -23,3 +58,4 @@ def breadcrumb(products=True, address=False, payment=False, confirmation=False):
 
 def destroy_order(request):
     request.session['order_id'] = None
+    request.__dict__.pop('_cached_order', None)
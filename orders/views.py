@@ -1,5 +1,3 @@
-import threading
-
 from django.contrib import messages
 
 from django.shortcuts import render
@@ -13,13 +11,11 @@ from .utils import breadcrumb
 from .utils import destroy_order
 
 
-from carts.utils import get_or_create_cart
 from carts.utils import destroy_cart
 
-from .mails import Mail
-
 from .models import Order
 from charges.models import Charge
+from reservations.models import OutOfStock, StockReservation
 
 from shipping_addresses.models import ShippingAddress
 
@@ -35,9 +31,29 @@ from .decorators import validate_cart_and_order
 class OrderListView(LoginRequiredMixin, ListView):
     login_url = 'login'
     template_name = 'orders/orders.html'
+    page_size = 10
 
+    # Paginación por cursor (keyset): `?cursor=<id>` retorna las órdenes con id menor,
+    # usando el índice (user, status, id) en lugar de OFFSET y sin COUNT(*).
     def get_queryset(self):
-        return self.request.user.orders_complete()
+        orders = self.request.user.orders_complete().for_history()
+
+        cursor = self.request.GET.get('cursor')
+        if cursor and cursor.isdigit():
+            orders = orders.filter(id__lt=cursor)
+
+        return orders[:self.page_size + 1]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        # Se pide un elemento de más para saber si hay una página siguiente.
+        orders = list(context['object_list'])
+        context['object_list'] = orders[:self.page_size]
+        context['next_cursor'] = orders[self.page_size - 1].id if len(orders) > self.page_size else None
+        context['cursor'] = self.request.GET.get('cursor')
+
+        return context
 
 
 @login_required(login_url='login')
@@ -146,19 +162,45 @@ def complete(request, cart, order):
     if request.user.id != order.user_id:
         return redirect('carts:cart')
     
-    charge =Charge.objects.create_charge(order)
-    if charge:
-        with transaction.atomic():
-            order.complete()
+    # Reserva el cobro: si otra petición (doble clic, reintento) ya lo reservó, no se cobra de nuevo.
+    charge = Charge.objects.reserve(order)
+    if charge is None:
+        messages.error(request, 'La orden ya se esta procesando')
+        return redirect('index')
+
+    # Con el cobro reservado, asegura el stock de todas las lineas (las reservas vencidas se vuelven
+    # a tomar). Si algún producto se agotó, libera el cobro y vuelve al carrito.
+    try:
+        StockReservation.objects.reserve_cart(cart)
+    except OutOfStock as error:
+        charge.delete()
+        messages.error(request, 'No hay suficientes unidades de {}'.format(error.args[0].title))
+        return redirect('carts:cart')
+
+    # La descripción del cargo en Stripe se calcula con las lineas copiadas de la orden.
+    with transaction.atomic():
+        order.snapshot_lines()
+
+    if not charge.process(order):
+        messages.error(request, 'No se pudo realizar el cobro')
+        return redirect('index')
+
+    # CREATED -> PAYED -> COMPLETED, cada paso con un UPDATE condicional sobre el estado.
+    # Si la orden ya no se puede pagar (se canceló mientras se cobraba), se reembolsa el cobro.
+    if not order.pay():
+        if charge.refund():
+            messages.error(request, 'La orden ya no se puede pagar; el cobro fue reembolsado')
+        else:
+            messages.error(request, 'La orden ya no se puede pagar; el reembolso del cobro quedó pendiente')
+        return redirect('index')
 
-            thread = threading.Thread(target=Mail.send_complete_order, args=(
-                order, request.user
-            ))
-            thread.start()
-            
+    with transaction.atomic():
+        # Completa la orden y deja el correo de confirmación en la bandeja de salida;
+        # lo envía el comando `send_mails`.
+        order.complete()
 
-            destroy_cart(request)
-            destroy_order(request)
+        destroy_cart(request)
+        destroy_order(request)
 
-            messages.success(request, 'Compra completada exitosamente')
+        messages.success(request, 'Compra completada exitosamente')
     return redirect('index')
\ No newline at end of file
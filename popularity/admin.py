@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import ProductViews
+# Register your models here.
+
+class ProductViewsAdmin(admin.ModelAdmin):
+    list_display = ('product', 'views')
+    ordering = ('-views',)
+
+admin.site.register(ProductViews, ProductViewsAdmin)
@@ -0,0 +1,91 @@
+import logging  # Registro de los lotes que no se pudieron guardar
+import threading  # El buffer se comparte entre los hilos del proceso
+import time  # Intervalo entre lotes
+from collections import Counter  # Visitas pendientes por producto
+from functools import wraps  # Para el decorador de la vista
+
+from django.conf import settings  # Tamaño e intervalo de los lotes
+from django.db import DatabaseError  # Errores al guardar un lote
+
+from products import pages  # Id del producto de la página (ya consultado por la vista)
+from products.models import Product
+
+from .models import ProductViews, ViewCount
+
+# Buffer en memoria de las visitas a las páginas de producto.
+# Cada visita solo incrementa un contador del proceso; cuando se juntan POPULARITY_FLUSH_THRESHOLD
+# visitas o pasan POPULARITY_FLUSH_INTERVAL segundos desde el último lote (se revisa en la siguiente
+# visita), todas se guardan con un solo INSERT de una fila por producto. Con POPULARITY_BUFFER = False
+# cada visita se suma directamente al total (un UPDATE por visita, como referencia).
+# Los procesos web guardan las visitas pendientes al terminar (ver `JD_store/wsgi.py` y `asgi.py`).
+
+logger = logging.getLogger(__name__)
+
+
+class ViewBuffer:
+
+    def __init__(self, threshold=None, interval=None):
+        self.lock = threading.Lock()
+        self.threshold = threshold or getattr(settings, 'POPULARITY_FLUSH_THRESHOLD', 100)
+        self.interval = interval or getattr(settings, 'POPULARITY_FLUSH_INTERVAL', 30)
+        self.counts = Counter()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, product_id, views=1):
+        with self.lock:
+            self.counts[product_id] += views
+            self.pending += views
+            due = self.pending >= self.threshold or time.monotonic() - self.last_flush >= self.interval
+
+        if due:
+            self.flush()
+
+    # Guarda las visitas pendientes en un solo INSERT. Retorna la cantidad de visitas guardadas.
+    # Si el lote no se puede guardar, las visitas vuelven al buffer para el siguiente intento.
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.pending = 0
+            self.last_flush = time.monotonic()
+
+        if not counts:
+            return 0
+
+        try:
+            # Los productos borrados desde la visita se descartan.
+            existing = Product.objects.filter(id__in=counts).values_list('id', flat=True)
+            saved = ViewCount.objects.bulk_create([ViewCount(product_id=id, views=counts[id]) for id in existing])
+        except DatabaseError:
+            logger.exception('No se pudieron guardar las visitas de %s productos', len(counts))
+            with self.lock:
+                self.counts.update(counts)
+                self.pending += sum(counts.values())
+            return 0
+
+        return sum(count.views for count in saved)
+
+
+buffer = ViewBuffer()
+
+
+# Cuenta una visita al producto.
+def record_view(product_id):
+    if getattr(settings, 'POPULARITY_BUFFER', True):
+        buffer.add(product_id)
+    else:
+        ProductViews.objects.add_views({product_id: 1})
+
+# Decorador de la vista de detalle: cuenta las páginas servidas, también desde el caché y los 304.
+def count_views(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+
+        state = pages.page_state(request, kwargs['slug']) if response.status_code in (200, 304) else None
+        if state is not None:
+            record_view(state[0])
+
+        return response
+
+    return wrapper
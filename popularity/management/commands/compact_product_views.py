@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from popularity.models import ProductViews, compact
+
+
+class Command(BaseCommand):
+    help = ('Suma a los totales de visitas los lotes guardados por los procesos web (y los borra) '
+            'y muestra los productos más visitados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Productos por UPDATE.')
+        parser.add_argument('--top', type=int, default=5, help='Productos más visitados que se muestran.')
+
+    def handle(self, *args, **options):
+        rows, products = compact(options['batch_size'])
+        self.stdout.write('Lotes compactados: {} ({} productos)'.format(rows, products))
+
+        self.stdout.write('Más visitados: {}'.format(', '.join(
+            '{} ({})'.format(counter.product.title, counter.views) for counter in ProductViews.objects.top(options['top'])
+        ) or '-'))
@@ -0,0 +1,89 @@
+import random
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F, Sum
+
+from products.models import Product
+from popularity.buffer import ViewBuffer
+from popularity.models import ProductViews, ViewCount, compact
+
+
+# Forma anterior (para comparar): un UPDATE por visita.
+def direct(buffer, product_id):
+    ProductViews.objects.filter(product_id=product_id).update(views=F('views') + 1)
+
+def buffered(buffer, product_id):
+    buffer.add(product_id)
+
+STRATEGIES = {
+    'directo': direct,
+    'buffer': buffered,
+}
+
+
+class Command(BaseCommand):
+    help = ('Varios hilos registran visitas a productos para medir cuántas visitas por segundo se procesan '
+            'escribiendo cada una o acumulándolas en el buffer, y si los totales coinciden. Los datos se crean '
+            'en la base de datos (los hilos usan conexiones distintas) con slugs propios de cada ejecución, '
+            'solo se compactan sus visitas y se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50, help='Productos visitados.')
+        parser.add_argument('--threads', type=int, default=8, help='Hilos que registran visitas a la vez.')
+        parser.add_argument('--hits', type=int, default=500, help='Visitas por hilo.')
+        parser.add_argument('--threshold', type=int, default=100, help='Visitas por lote del buffer.')
+        parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<10} {:>10} {:>10} {:>12}'.format('estrategia', 'visitas', 'contadas', 'visitas/s'))
+
+        for name in options['strategies']:
+            counted, seconds = self.run(STRATEGIES[name], options['products'], options['threads'],
+                                        options['hits'], options['threshold'])
+            total_hits = options['threads'] * options['hits']
+            self.stdout.write('{:<10} {:>10} {:>10} {:>12.0f}'.format(name, total_hits, counted, total_hits / seconds))
+
+    def run(self, strategy, products, threads, hits, threshold):
+        run = uuid.uuid4().hex[:8]
+        products = Product.objects.bulk_create([
+            Product(title='benchmark visitas {}'.format(i), slug='benchmark-visitas-{}-{}'.format(run, i),
+                    description='benchmark', image='products/benchmark.jpg')
+            for i in range(products)
+        ])
+        ids = [product.pk for product in products]
+
+        try:
+            ProductViews.objects.bulk_create([ProductViews(product_id=id) for id in ids])
+
+            buffer = ViewBuffer(threshold=threshold, interval=60)
+            barrier = threading.Barrier(threads)
+
+            def visit():
+                try:
+                    barrier.wait()
+                    for _ in range(hits):
+                        strategy(buffer, random.choice(ids))
+                finally:
+                    connection.close()
+
+            workers = [threading.Thread(target=visit) for _ in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            buffer.flush()
+            seconds = time.perf_counter() - start
+
+            # Solo las visitas de los productos del benchmark: las de la tienda quedan para `compact_product_views`.
+            compact(product_ids=ids)
+            counted = ProductViews.objects.filter(product_id__in=ids).aggregate(total=Sum('views'))['total']
+        finally:
+            ViewCount.objects.filter(product_id__in=ids).delete()
+            Product.objects.filter(pk__in=ids).delete()
+
+        return counted, seconds
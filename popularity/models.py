@@ -0,0 +1,81 @@
+from django.db import models, transaction
+from django.db.models import Case, F, Max, Sum, Value, When
+
+from products.models import Product
+
+# Visitas por producto, como señal de popularidad para los rankings.
+# Las visitas no se escriben una por una: cada proceso las acumula en memoria (ver `buffer`) y las
+# guarda de a lotes como filas nuevas de `ViewCount` con un solo INSERT. Como solo se insertan filas,
+# varios procesos pueden guardar a la vez sin pisarse. `compact` suma esas filas a los totales de
+# `ProductViews` con un solo UPDATE ... CASE y las borra (comando `compact_product_views`).
+
+
+class ViewCount(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    views = models.PositiveIntegerField()  # Visitas acumuladas por un proceso desde el lote anterior
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return '{}: +{}'.format(self.product_id, self.views)
+
+
+class ProductViewsManager(models.Manager):
+
+    # Suma `{id del producto: visitas}` a los totales: crea los que faltan y actualiza todos
+    # con un solo UPDATE (views = views + CASE product_id WHEN ... END).
+    def add_views(self, counts):
+        counts = {int(id): int(views) for id, views in counts.items() if views}
+        if not counts:
+            return 0
+
+        with transaction.atomic():
+            self.bulk_create([ProductViews(product_id=id) for id in counts], ignore_conflicts=True)
+            return self.filter(product_id__in=counts).update(views=F('views') + Case(
+                *[When(product_id=id, then=Value(views)) for id, views in counts.items()],
+                default=Value(0), output_field=models.PositiveBigIntegerField()
+            ))
+
+    # Productos con más visitas (ya compactadas).
+    def top(self, limit=10):
+        return self.filter(views__gt=0).select_related('product__card').order_by('-views', 'product_id')[:limit]
+
+
+class ProductViews(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='views')
+    views = models.PositiveBigIntegerField(default=0)  # Visitas totales
+
+    objects = ProductViewsManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['-views'], name='product_views_views_idx')]
+
+    def __str__(self):
+        return '{}: {}'.format(self.product_id, self.views)
+
+
+# Suma a los totales las filas de `ViewCount` que existen al empezar y las borra, en una transacción.
+# Las filas que otros procesos insertan mientras tanto tienen ids mayores y quedan para la siguiente vez;
+# si otra compactación borró las mismas filas primero, esta no suma nada.
+# Con `product_ids` solo se compactan las filas de esos productos.
+# Retorna (filas compactadas, productos actualizados).
+def compact(batch_size=1000, product_ids=None):
+    rows = ViewCount.objects.all() if product_ids is None else ViewCount.objects.filter(product_id__in=product_ids)
+    last_id = rows.aggregate(last_id=Max('id'))['last_id']
+    if last_id is None:
+        return 0, 0
+
+    rows = rows.filter(id__lte=last_id)
+    total_rows = rows.count()
+    counts = dict(rows.order_by().values('product_id').annotate(total=Sum('views')).values_list('product_id', 'total'))
+
+    with transaction.atomic():
+        deleted, _ = rows.delete()
+        if deleted != total_rows:
+            transaction.set_rollback(True)
+            return 0, 0
+
+        ids = list(counts)
+        for start in range(0, len(ids), batch_size):
+            ProductViews.objects.add_views({id: counts[id] for id in ids[start:start + batch_size]})
+
+    return deleted, len(counts)
@@ -0,0 +1,126 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products import cache
+from products.models import Product
+
+from . import buffer as buffer_module
+from .buffer import ViewBuffer
+from .models import ProductViews, ViewCount, compact
+
+
+class ProductViewsTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.bollo, self.arepa = [
+            Product.objects.create(title=title, description='descripcion', price=Decimal('2.00'),
+                                   image='products/producto.jpg')
+            for title in ('bollo', 'arepa')
+        ]
+
+        # Un buffer propio en cada prueba (el del proceso puede tener visitas de otras pruebas).
+        self.buffer = ViewBuffer(threshold=100, interval=60)
+        patcher = mock.patch.object(buffer_module, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def totals(self):
+        return dict(ProductViews.objects.values_list('product__title', 'views'))
+
+    def test_add_views_uses_one_update(self):
+        ProductViews.objects.add_views({self.bollo.pk: 2})
+
+        with CaptureQueriesContext(connection) as queries:
+            ProductViews.objects.add_views({self.bollo.pk: 3, self.arepa.pk: 4})
+
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('CASE', updates[0])
+        self.assertEqual(self.totals(), {'bollo': 5, 'arepa': 4})
+
+    def test_buffer_flushes_on_threshold(self):
+        buffer = ViewBuffer(threshold=3, interval=60)
+        buffer.add(self.bollo.pk)
+        buffer.add(self.arepa.pk)
+        self.assertFalse(ViewCount.objects.exists())
+
+        buffer.add(self.bollo.pk)
+        self.assertEqual(dict(ViewCount.objects.values_list('product_id', 'views')), {self.bollo.pk: 2, self.arepa.pk: 1})
+        self.assertEqual(buffer.pending, 0)
+
+    def test_buffer_flushes_on_interval(self):
+        buffer = ViewBuffer(threshold=100, interval=60)
+        buffer.add(self.bollo.pk)
+
+        buffer.last_flush -= 61
+        buffer.add(self.bollo.pk)
+        self.assertEqual(ViewCount.objects.get().views, 2)
+
+    def test_failed_flush_keeps_views(self):
+        buffer = ViewBuffer(threshold=100, interval=60)
+        buffer.add(self.bollo.pk)
+        buffer.add(self.bollo.pk)
+
+        with mock.patch.object(ViewCount.objects, 'bulk_create', side_effect=DatabaseError), \
+                self.assertLogs('popularity.buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.counts[self.bollo.pk], 2)
+
+        # Los productos borrados desde la visita se descartan.
+        buffer.add(self.arepa.pk)
+        self.arepa.delete()
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(list(ViewCount.objects.values_list('product_id', 'views')), [(self.bollo.pk, 2)])
+
+    def test_compact(self):
+        ViewCount.objects.bulk_create([
+            ViewCount(product=self.bollo, views=3), ViewCount(product=self.arepa, views=1),
+            ViewCount(product=self.bollo, views=2),
+        ])
+
+        self.assertEqual(compact(), (3, 2))
+        self.assertFalse(ViewCount.objects.exists())
+        self.assertEqual(self.totals(), {'bollo': 5, 'arepa': 1})
+
+        ViewCount.objects.create(product=self.arepa, views=7)
+        out = StringIO()
+        call_command('compact_product_views', stdout=out)
+        self.assertIn('Lotes compactados: 1 (1 productos)', out.getvalue())
+        self.assertIn('Más visitados: arepa (8), bollo (5)', out.getvalue())
+
+    def test_compact_only_some_products(self):
+        ViewCount.objects.bulk_create([ViewCount(product=self.bollo, views=3), ViewCount(product=self.arepa, views=1)])
+
+        self.assertEqual(compact(product_ids=[self.bollo.pk]), (1, 1))
+        self.assertEqual(self.totals(), {'bollo': 3})
+        self.assertEqual(list(ViewCount.objects.values_list('product_id', 'views')), [(self.arepa.pk, 1)])
+
+    def test_detail_view_counts_cached_pages_and_revalidations(self):
+        url = reverse('products:product', args=[self.bollo.slug])
+        response = self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.client.get(reverse('products:product', args=['no-existe']))
+
+        # Las visitas solo se escriben con el lote.
+        self.assertFalse(ViewCount.objects.exists())
+        self.assertEqual(self.buffer.counts, {self.bollo.pk: 3})
+
+        self.buffer.flush()
+        compact()
+        self.assertEqual(self.totals(), {'bollo': 3})
+
+    @override_settings(POPULARITY_BUFFER=False)
+    def test_unbuffered_views(self):
+        self.client.get(reverse('products:product', args=[self.arepa.slug]))
+
+        self.assertEqual(self.totals(), {'arepa': 1})
+        self.assertFalse(self.buffer.counts)
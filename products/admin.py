@@ -1,10 +1,39 @@
 from django.contrib import admin
+from django.shortcuts import render
 
 # Register your models here.
-from .models import Product
+from .models import Product, MediaBlob
+from .forms import RepriceForm
+from .pricing import Rule, reprice
 
 class ProductAdmin(admin.ModelAdmin):
-    fields = ('title','description','price','image')
-    list_display = ('__str__','slug','created_at')
+    fields = ('title','description','price','stock','image')
+    list_display = ('__str__','slug','price','stock','created_at')
+    actions = ['reprice']
 
-admin.site.register(Product, ProductAdmin)
\ No newline at end of file
+    # Muestra el formulario del cambio de precio y, al enviarlo, lo aplica a los productos seleccionados.
+    @admin.action(description='Cambiar el precio de los productos seleccionados')
+    def reprice(self, request, queryset):
+        form = RepriceForm(request.POST if 'apply' in request.POST else None)
+
+        if form.is_valid():
+            data = form.cleaned_data
+            total = reprice([Rule(data['kind'], data['value'])], data['round_99'], data['floor'], data['ceiling'],
+                            queryset=queryset)
+            self.message_user(request, 'Precios actualizados: {}'.format(total))
+            return None
+
+        return render(request, 'admin/products/product/reprice.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Cambiar precios',
+            'form': form,
+            'queryset': queryset,
+        })
+
+admin.site.register(Product, ProductAdmin)
+
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'references', 'created_at')
+    readonly_fields = ('name', 'digest', 'size', 'references', 'created_at')
+
+admin.site.register(MediaBlob, MediaBlobAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Conecta las señales que mantienen sincronizados los índices de búsqueda y autocompletado,
+        # las tarjetas de producto y las imágenes derivadas, y las que invalidan el caché del catálogo
+        # y las páginas de detalle, y el índice de facetas del listado.
+        from . import search, cards, images, autocomplete, cache, pages, facets  # noqa: F401
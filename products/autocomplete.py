@@ -0,0 +1,265 @@
+import heapq  # Los mejores candidatos sin ordenar todos
+import re  # Para separar los títulos en palabras
+import threading  # Candado para leer y actualizar el índice desde varios hilos
+import unicodedata  # Para quitar tildes al normalizar
+from collections import Counter  # Conteo de trigramas compartidos
+
+from django.db import transaction  # Las actualizaciones se aplican al confirmar la transacción
+from django.db.models.signals import post_save, post_delete  # Señales que mantienen el índice
+
+from categories.models import Category
+from .models import Product
+
+# Índice en memoria del catálogo para el autocompletado y la corrección de errores de escritura.
+# - Un trie con las palabras de los títulos de los productos responde `complete` sin ir a la base de datos.
+# - Un índice de trigramas sobre las palabras de los títulos de productos y categorías corrige palabras
+#   mal escritas (`correct`), con la misma similitud que usa pg_trgm.
+# Se carga con una consulta la primera vez que se usa y después se actualiza con las señales de
+# `Product` y `Category`. Cada proceso tiene su propia copia.
+
+# Similitud mínima para aceptar una corrección.
+SIMILARITY_THRESHOLD = 0.3
+
+# Quita las tildes, pasa a minúsculas y separa en palabras.
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r'\w+', text.lower())
+
+# Indica si las palabras de un título empiezan con el texto escrito (palabras completas + prefijo).
+def starts_with(words, complete_words, prefix):
+    size = len(complete_words)
+    return words[:size] == complete_words and len(words) > size and words[size].startswith(prefix)
+
+# Trigramas de una palabra, con relleno al inicio y al final como en pg_trgm.
+def trigrams(word):
+    padded = '  {} '.format(word)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrieNode:
+    __slots__ = ('children', 'products')
+
+    def __init__(self):
+        self.children = {}
+        self.products = set()
+
+
+class Trie:
+    """Trie de palabras; cada nodo final guarda los ids de los productos que contienen la palabra."""
+
+    def __init__(self):
+        self.root = TrieNode()
+
+    def insert(self, word, product_id):
+        node = self.root
+        for char in word:
+            node = node.children.setdefault(char, TrieNode())
+        node.products.add(product_id)
+
+    def remove(self, word, product_id):
+        path = [self.root]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+
+        path[-1].products.discard(product_id)
+
+        # Poda los nodos que quedaron vacíos.
+        for depth in range(len(word), 0, -1):
+            node = path[depth]
+            if node.products or node.children:
+                break
+            del path[depth - 1].children[word[depth - 1]]
+
+    # Retorna los ids de los productos que contienen exactamente la palabra.
+    def exact(self, word):
+        node = self.root
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+
+        return node.products
+
+    # Retorna los ids de todos los productos con alguna palabra que empieza por `prefix`.
+    # El recorrido no se corta antes: el orden del trie no es el del ranking, así que cortar
+    # podría dejar fuera a los mejores candidatos.
+    def search(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+
+        found, stack = set(), [node]
+        while stack:
+            node = stack.pop()
+            found.update(node.products)
+            stack.extend(node.children.values())
+
+        return found
+
+
+class CatalogIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.clear()
+
+    def clear(self):
+        self.trie = Trie()
+        self.products = {}  # id -> (título, slug, palabras normalizadas)
+        self.categories = {}  # id -> palabras
+        self.words = Counter()  # palabra -> cantidad de títulos que la usan
+        self.trigrams = {}  # trigrama -> palabras
+
+    # Carga el catálogo completo (una consulta por modelo). Se llama sola en el primer uso.
+    def load(self):
+        with self.lock:
+            self.clear()
+            for id, title, slug in Product.objects.values_list('id', 'title', 'slug').iterator():
+                self.add_product(id, title, slug)
+
+            for id, title in Category.objects.values_list('id', 'title').iterator():
+                self.add_category(id, title)
+
+            self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def add_words(self, words):
+        for word in words:
+            if self.words[word] == 0:
+                for trigram in trigrams(word):
+                    self.trigrams.setdefault(trigram, set()).add(word)
+            self.words[word] += 1
+
+    def remove_words(self, words):
+        for word in words:
+            self.words[word] -= 1
+            if self.words[word] <= 0:
+                del self.words[word]
+                for trigram in trigrams(word):
+                    self.trigrams[trigram].discard(word)
+
+    def add_product(self, id, title, slug):
+        with self.lock:
+            self.remove_product(id)
+
+            words = normalize(title)
+            self.products[id] = (title, slug, words)
+            self.add_words(set(words))
+            for word in set(words):
+                self.trie.insert(word, id)
+
+    def remove_product(self, id):
+        with self.lock:
+            if id not in self.products:
+                return
+
+            _, _, words = self.products.pop(id)
+            self.remove_words(set(words))
+            for word in set(words):
+                self.trie.remove(word, id)
+
+    def add_category(self, id, title):
+        with self.lock:
+            self.remove_category(id)
+
+            words = set(normalize(title))
+            self.categories[id] = words
+            self.add_words(words)
+
+    def remove_category(self, id):
+        with self.lock:
+            if id in self.categories:
+                self.remove_words(self.categories.pop(id))
+
+    # Autocompleta un texto parcial: la última palabra se toma como prefijo y las anteriores deben
+    # estar completas en el título. Retorna [(título, slug)], primero los títulos que empiezan igual.
+    def complete(self, text, limit=8):
+        words = normalize(text)
+        if not words:
+            return []
+
+        with self.lock:
+            self.ensure_loaded()
+
+            *complete_words, prefix = words
+
+            # Todos los candidatos: productos con una palabra que empieza por el prefijo y con cada
+            # palabra completa (intersección de conjuntos, empezando por el más pequeño).
+            candidates = [self.trie.search(prefix)] + [self.trie.exact(word) for word in complete_words]
+            candidates.sort(key=len)
+            results = [self.products[id] for id in candidates[0].intersection(*candidates[1:])]
+
+        # Se ordenan todos los candidatos antes de cortar en `limit`.
+        best = heapq.nsmallest(
+            limit, results, key=lambda product: (not starts_with(product[2], complete_words, prefix), len(product[0]), product[0])
+        )
+        return [(title, slug) for title, slug, _ in best]
+
+    # Corrige una palabra con la palabra conocida más parecida por trigramas; None si no hay ninguna.
+    def correct_word(self, word):
+        if word in self.words:
+            return word
+
+        query = trigrams(word)
+        shared = Counter()
+        for trigram in query:
+            shared.update(self.trigrams.get(trigram, ()))
+
+        best, best_score = None, SIMILARITY_THRESHOLD
+        for candidate, count in shared.items():
+            score = count / (len(query) + len(trigrams(candidate)) - count)
+            if score > best_score or (score == best_score and best and self.words[candidate] > self.words[best]):
+                best, best_score = candidate, score
+
+        return best
+
+    # Corrige cada palabra del texto. Retorna el texto corregido, o None si no hay nada que corregir.
+    def correct(self, text):
+        words = normalize(text)
+        if not words:
+            return None
+
+        with self.lock:
+            self.ensure_loaded()
+            corrected = [self.correct_word(word) or word for word in words]
+
+        return ' '.join(corrected) if corrected != words else None
+
+
+catalog = CatalogIndex()
+
+
+# Señales: los cambios se aplican al índice cuando la transacción se confirma,
+# y solo si el índice ya se cargó (si no, se leerán al cargarlo).
+def product_saved(sender, instance, *args, **kwargs):
+    if catalog.loaded:
+        transaction.on_commit(lambda: catalog.add_product(instance.pk, instance.title, instance.slug))
+
+def product_deleted(sender, instance, *args, **kwargs):
+    if catalog.loaded:
+        id = instance.pk
+        transaction.on_commit(lambda: catalog.remove_product(id))
+
+def category_saved(sender, instance, *args, **kwargs):
+    if catalog.loaded:
+        transaction.on_commit(lambda: catalog.add_category(instance.pk, instance.title))
+
+def category_deleted(sender, instance, *args, **kwargs):
+    if catalog.loaded:
+        id = instance.pk
+        transaction.on_commit(lambda: catalog.remove_category(id))
+
+post_save.connect(product_saved, sender=Product)
+post_delete.connect(product_deleted, sender=Product)
+post_save.connect(category_saved, sender=Category)
+post_delete.connect(category_deleted, sender=Category)
@@ -0,0 +1,64 @@
+import random  # Datos sintéticos reproducibles
+import statistics  # Mediana de los tiempos
+import time  # Medición de tiempos
+
+from categories.models import Category
+from .models import Product
+from . import search
+from .cards import refresh_cards
+
+# Utilidades compartidas por los comandos de benchmark del catálogo.
+# Los comandos crean el catálogo dentro de una transacción que revierten al terminar.
+
+WORDS = ['bollo', 'maiz', 'queso', 'arepa', 'yuca', 'coco', 'dulce', 'salado', 'frito', 'horneado',
+         'pollo', 'carne', 'cerdo', 'platano', 'guayaba', 'mango', 'panela', 'leche', 'arroz', 'frijol']
+SYLLABLES = ['ba', 'ca', 'de', 'fi', 'go', 'la', 'me', 'ni', 'po', 'ru', 'sa', 'te', 'vo', 'za', 'chi', 'ña']
+
+
+# Crea `total` productos y `total_categories` categorías sintéticas (dos categorías por producto).
+# Retorna la lista de productos creados.
+def create_catalog(total, total_categories=20):
+    random.seed(0)
+
+    # Vocabulario sintético: las palabras reales se mezclan con ~2000 palabras inventadas,
+    # para que cada término aparezca solo en una parte del catálogo, como en uno real.
+    vocabulary = WORDS + sorted({''.join(random.choices(SYLLABLES, k=3)) for _ in range(2500)})
+
+    first_id = (Product.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    products = []
+    for i in range(total):
+        title = ' '.join(random.sample(vocabulary, 3))
+        products.append(Product(
+            id=first_id + i, title=title, slug='benchmark-{}'.format(first_id + i),
+            description=' '.join(random.choices(vocabulary, k=12)), price=random.randint(1, 100),
+            image='products/benchmark.jpg'
+        ))
+    Product.objects.bulk_create(products, batch_size=5000)
+
+    categories = Category.objects.bulk_create([
+        Category(title='{} {}'.format(WORDS[i % len(WORDS)], i), description='categoria sintetica')
+        for i in range(total_categories)
+    ])
+    Through = Category.products.through
+    Through.objects.bulk_create([
+        Through(category_id=category.id, product_id=product.id)
+        for product in products
+        for category in random.sample(categories, 2)
+    ], batch_size=5000)
+
+    # bulk_create no dispara señales: el índice de búsqueda, las tarjetas y los conteos se llenan de una vez.
+    search.rebuild()
+    refresh_cards([product.id for product in products])
+    Category.objects.update_product_counts([category.id for category in categories])
+
+    return products
+
+# Mediana en milisegundos de `repeat` llamadas a `function`.
+def median_ms(function, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
@@ -0,0 +1,140 @@
+import hashlib  # Para construir claves cortas a partir del término de búsqueda
+import threading  # Los contadores del proceso se comparten entre hilos
+from collections import Counter  # Aciertos y fallos del proceso aún no publicados
+
+from django.conf import settings  # Alias del caché del catálogo
+from django.core.cache import caches  # Backends de caché configurados en CACHES
+from django.db import transaction  # La versión cambia al confirmar la transacción
+from django.db.models.signals import post_save, post_delete, m2m_changed  # Señales que invalidan el caché
+from django.utils import timezone  # Fecha del último cambio del catálogo
+
+from categories.models import Category
+from .models import Product
+
+# Caché de listados y búsquedas del catálogo.
+# Las entradas se guardan con la versión actual del catálogo; cualquier cambio en `Product` o
+# `Category` incrementa la versión, así que las entradas viejas dejan de leerse y el backend las
+# descarta cuando se llena (MAX_ENTRIES). El backend se elige en settings (`CATALOG_CACHE`).
+# La versión y los contadores de aciertos/fallos viven en otro caché sin límite de entradas
+# (`CATALOG_META_CACHE`): si se guardaran junto a las páginas, el backend podría descartar la versión
+# al llenarse y volver a servir entradas viejas guardadas con la misma versión. Ese caché es compartido
+# entre procesos (ver settings), así que un cambio hecho en cualquier proceso invalida a todos.
+
+VERSION_KEY = 'catalog:version'
+CHANGED_AT_KEY = 'catalog:changed-at'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+# Los aciertos y fallos se cuentan en memoria y se publican en el caché compartido cada tantos eventos,
+# para que un acierto no sea también una escritura.
+STATS_FLUSH_EVERY = 100
+
+MISSING = object()
+
+local_stats = Counter()
+local_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE]
+
+def get_meta_cache():
+    return caches[getattr(settings, 'CATALOG_META_CACHE', settings.CATALOG_CACHE)]
+
+# Incrementa un contador del caché de metadatos, creándolo si no existe.
+def increment(key, delta=1):
+    cache = get_meta_cache()
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+# Versión actual del catálogo.
+def catalog_version():
+    cache = get_meta_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY)
+
+    return version
+
+# Fecha del último cambio del catálogo (None si no ha cambiado desde que arrancó el caché).
+def catalog_changed_at():
+    return get_meta_cache().get(CHANGED_AT_KEY)
+
+# Invalida todo lo guardado: las entradas de la versión anterior ya no se leen.
+def bump_version():
+    get_meta_cache().set(CHANGED_AT_KEY, timezone.now(), timeout=None)
+    return increment(VERSION_KEY)
+
+# Cuenta un acierto o fallo en el proceso; cada STATS_FLUSH_EVERY eventos los suma al caché compartido.
+def record(key):
+    with local_stats_lock:
+        local_stats[key] += 1
+        if sum(local_stats.values()) < STATS_FLUSH_EVERY:
+            return
+
+        pending = dict(local_stats)
+        local_stats.clear()
+
+    for name, count in pending.items():
+        increment(name, count)
+
+# Retorna el valor guardado en `key` para la versión actual; si no existe, lo calcula con `function`.
+def cached(key, function):
+    cache = get_cache()
+    version = catalog_version()
+
+    value = cache.get(key, MISSING, version=version)
+    if value is not MISSING:
+        record(HITS_KEY)
+        return value
+
+    record(MISSES_KEY)
+    value = function()
+    cache.set(key, value, version=version)
+    return value
+
+# Clave de una página del listado (identificada por su cursor).
+def page_key(name, cursor, page_size):
+    return 'catalog:{}:{}:{}'.format(name, cursor, page_size)
+
+# Clave de una búsqueda: el término se resume con md5 para respetar los límites de los backends.
+def search_key(query, cursor, page_size):
+    digest = hashlib.md5(' '.join((query or '').lower().split()).encode()).hexdigest()
+    return 'catalog:search:{}:{}:{}'.format(digest, cursor, page_size)
+
+# Aciertos y fallos publicados por todos los procesos más los de este proceso que aún no se publicaron.
+def stats():
+    cache = get_meta_cache()
+    with local_stats_lock:
+        local = dict(local_stats)
+
+    return {
+        'version': catalog_version(),
+        'hits': cache.get(HITS_KEY, 0) + local.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0) + local.get(MISSES_KEY, 0),
+    }
+
+def reset_stats():
+    with local_stats_lock:
+        local_stats.clear()
+
+    get_meta_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+# Señales: cualquier cambio en el catálogo incrementa la versión al confirmar la transacción.
+def catalog_changed(sender, *args, **kwargs):
+    transaction.on_commit(bump_version)
+
+def category_products_changed(sender, action, *args, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_version)
+
+post_save.connect(catalog_changed, sender=Product)
+post_delete.connect(catalog_changed, sender=Product)
+post_save.connect(catalog_changed, sender=Category)
+post_delete.connect(catalog_changed, sender=Category)
+m2m_changed.connect(category_products_changed, sender=Category.products.through)
@@ -0,0 +1,39 @@
+from .models import Product, ProductCard
+from .images import variant_url
+from .signals import on_products_changed
+
+# Mantiene las tarjetas de producto (`ProductCard`) que usan los listados.
+# Las tarjetas de los productos borrados se eliminan en cascada.
+
+CARD_FIELDS = ['title', 'slug', 'price', 'thumbnail_url', 'thumbnail_webp_url', 'categories']
+
+
+# Arma la tarjeta de un producto (con sus categorías ya cargadas).
+def build_card(product):
+    return ProductCard(
+        product_id=product.id,
+        title=product.title,
+        slug=product.slug,
+        price=product.price,
+        thumbnail_url=variant_url(product, 'card'),
+        thumbnail_webp_url=variant_url(product, 'card', 'webp'),
+        categories=', '.join(category.title for category in product.category_set.all()),
+    )
+
+# Crea o actualiza las tarjetas de los productos indicados: dos consultas para leer y una para escribir.
+def refresh_cards(ids=None):
+    products = Product.objects.prefetch_related('category_set').order_by('id')
+    if ids is not None:
+        products = products.filter(id__in=ids)
+
+    cards = [build_card(product) for product in products]
+    ProductCard.objects.bulk_create(cards, batch_size=500, update_conflicts=True,
+                                    unique_fields=['product'], update_fields=CARD_FIELDS)
+    return len(cards)
+
+# Vuelve a generar todas las tarjetas. Retorna la cantidad de tarjetas.
+def rebuild_cards():
+    ProductCard.objects.exclude(product__in=Product.objects.all()).delete()
+    return refresh_cards()
+
+on_products_changed(refresh_cards)
@@ -0,0 +1,192 @@
+import csv  # Lectura y escritura de CSV
+import json  # Lectura y escritura de JSONL
+import uuid  # Sufijo de los slugs repetidos (igual que `set_slug`)
+from collections import Counter  # Referencias nuevas de cada imagen
+from decimal import Decimal, InvalidOperation  # Validación de los precios
+
+from django.db import transaction  # Caché del catálogo e índice de autocompletado al confirmar
+from django.utils.text import slugify  # Convierte texto en formato slug
+
+from categories.models import Category
+from .models import MediaBlob, Product
+from .signals import notify
+
+# Importación y exportación masiva del catálogo (comandos `import_products` y `export_products`).
+# La importación no guarda los productos uno por uno: los slugs se asignan en memoria contra los
+# que ya existen, los productos y sus categorías se insertan con `bulk_create` por lotes y las
+# proyecciones del catálogo (búsqueda, tarjetas...) se actualizan una vez por lote con `notify`.
+
+FORMATS = ('csv', 'jsonl')
+
+FIELDS = ['title', 'slug', 'description', 'price', 'stock', 'image', 'categories']
+
+CATEGORY_SEPARATOR = '|'  # Separador de las categorías en una celda del CSV
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+# Formato según la extensión del archivo ('jsonl' para .jsonl/.ndjson, si no 'csv').
+def guess_format(path):
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+class SlugAllocator:
+    """Asigna slugs únicos en memoria a partir de los slugs que ya existen en la base de datos."""
+
+    def __init__(self, existing=None):
+        self.used = set(Product.objects.values_list('slug', flat=True)) if existing is None else set(existing)
+
+    def allocate(self, title, slug=''):
+        slug = slugify(slug or title)
+        while not slug or slug in self.used:
+            slug = slugify('{}-{}'.format(title, str(uuid.uuid4())[:8]))
+
+        self.used.add(slug)
+        return slug
+
+
+# Lee las filas del archivo como diccionarios con las categorías en una lista.
+# Las filas mal formadas lanzan ValueError (InvalidRow o el error del JSON).
+def read_rows(file, format):
+    if format == 'jsonl':
+        for line in file:
+            if line.strip():
+                row = json.loads(line)
+                row['categories'] = row.get('categories') or []
+                yield row
+    else:
+        for row in csv.DictReader(file):
+            row['categories'] = (row.get('categories') or '').split(CATEGORY_SEPARATOR)
+            yield row
+
+# Valida una fila y arma el producto (sin guardarlo).
+def build_product(row, slugs, line):
+    title = (row.get('title') or '').strip()
+    if not title:
+        raise InvalidRow('Línea {}: el producto no tiene título'.format(line))
+
+    try:
+        price = Decimal(str(row.get('price') or 0))
+    except InvalidOperation:
+        raise InvalidRow('Línea {}: precio inválido {!r}'.format(line, row.get('price')))
+
+    # Stock vacío: el producto no lleva control de inventario.
+    stock = row.get('stock')
+    try:
+        stock = None if stock in (None, '') else int(stock)
+        if stock is not None and stock < 0:
+            raise ValueError(stock)
+    except ValueError:
+        raise InvalidRow('Línea {}: stock inválido {!r}'.format(line, stock))
+
+    return Product(
+        title=title[:50],
+        slug=slugs.allocate(title, row.get('slug') or ''),
+        description=row.get('description') or '',
+        price=price,
+        stock=stock,
+        image=row.get('image') or '',
+    )
+
+
+class CatalogImporter:
+    """Inserta productos por lotes; las categorías que no existen se crean por título."""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.slugs = SlugAllocator()
+        self.categories = dict(Category.objects.values_list('title', 'id'))
+        self.total = 0
+
+    def category_ids(self, titles):
+        missing = [title for title in dict.fromkeys(titles) if title not in self.categories]
+        if missing:
+            for category in Category.objects.bulk_create([Category(title=title, description='') for title in missing]):
+                self.categories[category.title] = category.id
+
+        return [self.categories[title] for title in titles]
+
+    # Inserta un lote de (producto, títulos de categorías) y avisa a las proyecciones del catálogo.
+    def insert(self, batch):
+        products = Product.objects.bulk_create([product for product, titles in batch])
+
+        memberships = {(category_id, product.id) for product, titles in batch for category_id in self.category_ids(titles)}
+        Through = Category.products.through
+        Through.objects.bulk_create([
+            Through(category_id=category_id, product_id=product_id) for category_id, product_id in memberships
+        ], ignore_conflicts=True)
+
+        # bulk_create no dispara m2m_changed: el conteo de productos de las categorías se recalcula aquí.
+        Category.objects.update_product_counts({category_id for category_id, product_id in memberships})
+
+        for name, references in Counter(product.image.name for product in products if product.image).items():
+            MediaBlob.objects.add_reference(name, references)
+
+        notify([product.id for product in products])
+        self.total += len(products)
+
+    def run(self, rows):
+        batch = []
+        for line, row in enumerate(rows, 1):
+            titles = [title.strip()[:50] for title in row['categories'] if title.strip()]
+            batch.append((build_product(row, self.slugs, line), titles))
+
+            if len(batch) >= self.batch_size:
+                self.insert(batch)
+                batch = []
+
+        if batch:
+            self.insert(batch)
+
+        transaction.on_commit(catalog_imported)
+        return self.total
+
+# Al confirmar la importación se invalida el caché y el índice de autocompletado se vuelve a cargar.
+def catalog_imported():
+    from .autocomplete import catalog
+    from .cache import bump_version
+
+    bump_version()
+    catalog.loaded = False
+
+
+# Recorre el catálogo por lotes ordenados por id, con las categorías de cada producto.
+def export_rows(batch_size=1000):
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects.filter(id__gt=last_id).order_by('id').prefetch_related('category_set')[:batch_size]
+        )
+        if not products:
+            return
+
+        for product in products:
+            yield {
+                'title': product.title,
+                'slug': product.slug,
+                'description': product.description,
+                'price': str(product.price),
+                'stock': product.stock,
+                'image': product.image.name,
+                'categories': [category.title for category in product.category_set.all()],
+            }
+
+        last_id = products[-1].id
+
+# Escribe las filas en el archivo. Retorna la cantidad de filas escritas.
+def write_rows(file, rows, format):
+    total = 0
+    if format == 'jsonl':
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            total += 1
+    else:
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, categories=CATEGORY_SEPARATOR.join(row['categories'])))
+            total += 1
+
+    return total
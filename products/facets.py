@@ -0,0 +1,254 @@
+import threading  # El índice se comparte entre los hilos del proceso
+from decimal import Decimal  # Límites de las bandas de precio
+
+import numpy as np  # Para construir los mapas de bits en la carga completa
+
+from django.db import transaction  # Los cambios se aplican al confirmar la transacción
+from django.db.models.signals import post_save, post_delete  # Señales que mantienen el índice
+
+from categories.models import Category
+from .cache import catalog_version
+from .models import Product, ProductCard
+from .pagination import NEXT, PREVIOUS, CursorPaginator, build_page, decode_cursor
+from .signals import on_products_changed
+
+# Índice en memoria para filtrar el catálogo por categoría y por banda de precio.
+# Cada valor de faceta (una categoría, una banda de precio) es un mapa de bits: un entero de Python
+# con el bit `id` encendido para cada producto que lo tiene. Filtrar es intersecar mapas (`&`),
+# contar es `bit_count()` y la página se trae con una sola consulta de tarjetas por id.
+# Se carga completo en el primer uso y se actualiza con las señales del catálogo al confirmar.
+# Esas señales solo llegan al proceso que hizo el cambio: el índice guarda la versión del catálogo
+# (compartida entre procesos, ver `cache`) con la que se cargó y se vuelve a cargar cuando cambia.
+
+# Bandas de precio: (clave para la URL, desde, hasta sin incluir).
+PRICE_BANDS = [
+    ('0-5', Decimal('0'), Decimal('5')),
+    ('5-10', Decimal('5'), Decimal('10')),
+    ('10-25', Decimal('10'), Decimal('25')),
+    ('25-50', Decimal('25'), Decimal('50')),
+    ('50+', Decimal('50'), None),
+]
+
+# Con más productos cambiados que esto, es más barato volver a cargar todo que actualizar bit por bit.
+RELOAD_THRESHOLD = 1000
+
+
+def price_band(price):
+    for key, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return key
+
+    return PRICE_BANDS[0][0]
+
+# Arma un mapa de bits a partir de una lista de ids.
+def bitmap(ids):
+    ids = np.fromiter(ids, dtype=np.int64)
+    if not len(ids):
+        return 0
+
+    bits = np.zeros(int(ids.max()) + 1, dtype=bool)
+    bits[ids] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+# Hasta `limit` ids del mapa mayores que `after`, de menor a mayor.
+def ids_after(bits, after, limit):
+    bits >>= after + 1
+    ids = []
+    while bits and len(ids) < limit:
+        lowest = bits & -bits
+        position = lowest.bit_length() - 1
+        ids.append(after + 1 + position)
+        bits ^= lowest
+
+    return ids
+
+# Hasta `limit` ids del mapa menores que `before`, de mayor a menor.
+def ids_before(bits, before, limit):
+    bits &= (1 << before) - 1
+    ids = []
+    while bits and len(ids) < limit:
+        position = bits.bit_length() - 1
+        ids.append(position)
+        bits ^= 1 << position
+
+    return ids
+
+
+class Selection:
+    """Facetas elegidas: categorías (cualquiera de ellas) y una banda de precio."""
+
+    def __init__(self, categories=(), price=None):
+        self.categories = sorted(set(categories))
+        self.price = price if price in dict((key, None) for key, _, _ in PRICE_BANDS) else None
+
+    def __bool__(self):
+        return bool(self.categories or self.price)
+
+    def key(self):
+        return '{}:{}'.format(','.join(str(id) for id in self.categories), self.price or '')
+
+
+class FacetIndex:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.version = None  # Versión del catálogo con la que se cargó
+        self.clear()
+
+    def clear(self):
+        self.all = 0
+        self.categories = {}  # id -> mapa de bits
+        self.titles = {}  # id -> título de la categoría
+        self.prices = {key: 0 for key, _, _ in PRICE_BANDS}  # banda -> mapa de bits
+        self.products = {}  # id -> (ids de sus categorías, banda de precio)
+
+    # Carga el catálogo completo (una consulta por tabla). Se llama sola en el primer uso y cuando
+    # cambia la versión del catálogo. La versión se lee antes que los datos: un cambio confirmado
+    # mientras se carga deja la versión guardada atrás y provoca otra carga.
+    def load(self):
+        with self.lock:
+            self.version = catalog_version()
+            self.clear()
+            bands = {key: [] for key in self.prices}
+            for id, price in Product.objects.values_list('id', 'price').iterator():
+                band = price_band(price)
+                bands[band].append(id)
+                self.products[id] = (set(), band)
+
+            members = {id: [] for id in Category.objects.values_list('id', flat=True)}
+            for category_id, product_id in Category.products.through.objects.values_list('category_id', 'product_id').iterator():
+                members.setdefault(category_id, []).append(product_id)
+                self.products[product_id][0].add(category_id)
+
+            self.all = bitmap(self.products)
+            self.prices = {key: bitmap(ids) for key, ids in bands.items()}
+            self.categories = {id: bitmap(ids) for id, ids in members.items()}
+            self.titles = dict(Category.objects.values_list('id', 'title'))
+            self.loaded = True
+
+    def ensure_loaded(self):
+        if not self.loaded or self.version != catalog_version():
+            self.load()
+
+    def add_product(self, id, price, categories):
+        with self.lock:
+            self.remove_product(id)
+
+            bit = 1 << id
+            band = price_band(price)
+            self.products[id] = (set(categories), band)
+            self.all |= bit
+            self.prices[band] |= bit
+            for category_id in categories:
+                self.categories[category_id] = self.categories.get(category_id, 0) | bit
+
+    def remove_product(self, id):
+        with self.lock:
+            if id not in self.products:
+                return
+
+            categories, band = self.products.pop(id)
+            mask = ~(1 << id)
+            self.all &= mask
+            self.prices[band] &= mask
+            for category_id in categories:
+                if category_id in self.categories:
+                    self.categories[category_id] &= mask
+
+    # Vuelve a leer los productos indicados (precio y categorías) con dos consultas.
+    def update_products(self, ids):
+        if len(ids) > RELOAD_THRESHOLD:
+            self.loaded = False
+            return
+
+        categories = {id: [] for id in ids}
+        for category_id, product_id in Category.products.through.objects.filter(
+            product_id__in=ids
+        ).values_list('category_id', 'product_id'):
+            categories[product_id].append(category_id)
+        found = dict(Product.objects.filter(id__in=ids).values_list('id', 'price'))
+
+        with self.lock:
+            for id in ids:
+                if id in found:
+                    self.add_product(id, found[id], categories[id])
+                else:
+                    self.remove_product(id)
+
+    def set_category(self, id, title):
+        with self.lock:
+            self.titles[id] = title
+            self.categories.setdefault(id, 0)
+
+    def remove_category(self, id):
+        with self.lock:
+            self.titles.pop(id, None)
+            self.categories.pop(id, None)
+            for categories, _ in self.products.values():
+                categories.discard(id)
+
+    # Productos que cumplen la selección y conteos de cada valor de faceta.
+    # Las categorías se combinan con O y las facetas entre sí con Y; el conteo de cada categoría
+    # respeta el filtro de precio (y viceversa), como al agregarla a la selección.
+    # Retorna (mapa de bits del resultado, {id categoría: conteo}, {banda: conteo}).
+    def search(self, selection):
+        with self.lock:
+            self.ensure_loaded()
+
+            by_category = self.all
+            if selection.categories:
+                by_category = 0
+                for id in selection.categories:
+                    by_category |= self.categories.get(id, 0)
+
+            by_price = self.prices[selection.price] if selection.price else self.all
+
+            result = by_category & by_price
+            category_counts = {id: (bits & by_price).bit_count() for id, bits in self.categories.items()}
+            price_counts = {key: (bits & by_category).bit_count() for key, bits in self.prices.items()}
+
+        return result, category_counts, price_counts
+
+    # Página de tarjetas (ordenadas por id) de los productos del mapa, a partir del cursor.
+    def page(self, bits, per_page, cursor=None):
+        direction, key = decode_cursor(cursor)
+
+        if direction == PREVIOUS:
+            ids = ids_before(bits, CursorPaginator.key_id(key), per_page + 1)
+        else:
+            after = CursorPaginator.key_id(key) if direction == NEXT else -1
+            ids = ids_after(bits, after, per_page + 1)
+
+        cards = ProductCard.objects.in_bulk(ids)
+        rows = [cards[id] for id in ids if id in cards]
+        return build_page(rows, per_page, direction, lambda card: [card.pk], bits.bit_count())
+
+
+catalog_facets = FacetIndex()
+
+
+# Señales: los cambios se aplican al índice cuando la transacción se confirma,
+# y solo si el índice ya se cargó (si no, se leerán al cargarlo).
+def products_changed(ids):
+    if catalog_facets.loaded:
+        transaction.on_commit(lambda: catalog_facets.update_products(ids))
+
+def product_deleted(sender, instance, *args, **kwargs):
+    if catalog_facets.loaded:
+        id = instance.pk
+        transaction.on_commit(lambda: catalog_facets.remove_product(id))
+
+def category_saved(sender, instance, *args, **kwargs):
+    if catalog_facets.loaded:
+        transaction.on_commit(lambda: catalog_facets.set_category(instance.pk, instance.title))
+
+def category_deleted(sender, instance, *args, **kwargs):
+    if catalog_facets.loaded:
+        id = instance.pk
+        transaction.on_commit(lambda: catalog_facets.remove_category(id))
+
+on_products_changed(products_changed)
+post_delete.connect(product_deleted, sender=Product)
+post_save.connect(category_saved, sender=Category)
+post_delete.connect(category_deleted, sender=Category)
@@ -0,0 +1,24 @@
+from django import forms
+
+from .pricing import AMOUNT, PERCENT
+
+
+# Formulario de la acción del admin que cambia el precio de los productos seleccionados.
+class RepriceForm(forms.Form):
+    # Porcentaje o monto fijo que se suma al precio (negativo para bajarlo)
+    kind = forms.ChoiceField(label='Tipo de cambio', choices=[(PERCENT, 'Porcentaje'), (AMOUNT, 'Monto fijo')])
+    value = forms.DecimalField(label='Valor', max_digits=8, decimal_places=2)
+
+    # Ajustes aplicados después del cambio
+    round_99 = forms.BooleanField(label='Terminar en .99', required=False)
+    floor = forms.DecimalField(label='Precio mínimo', max_digits=8, decimal_places=2, min_value=0, required=False)
+    ceiling = forms.DecimalField(label='Precio máximo', max_digits=8, decimal_places=2, min_value=0, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        floor, ceiling = cleaned_data.get('floor'), cleaned_data.get('ceiling')
+
+        if floor is not None and ceiling is not None and floor > ceiling:
+            raise forms.ValidationError('El precio mínimo no puede ser mayor que el precio máximo.')
+
+        return cleaned_data
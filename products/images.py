@@ -0,0 +1,134 @@
+import hashlib  # Hash del contenido para nombrar las imágenes derivadas
+import logging  # Registro de imágenes que no se pudieron procesar
+from concurrent.futures import ThreadPoolExecutor  # Pool de hilos que procesa las imágenes
+from io import BytesIO  # Imagen generada en memoria antes de guardarla
+
+from PIL import Image, ImageOps, UnidentifiedImageError  # Procesamiento de imágenes
+
+from django.conf import settings  # Configuración del pipeline
+from django.core.files.base import ContentFile  # Para guardar las imágenes generadas
+from django.core.files.storage import default_storage  # Almacenamiento de los archivos de media
+from django.db import connection, transaction  # Conexión de cada hilo y on_commit
+from django.db.models.signals import post_save  # Señal que dispara el procesamiento
+from django.utils import timezone  # Fecha de modificación del producto
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Pipeline de imágenes derivadas de los productos.
+# Al subir una imagen se generan versiones de tamaño fijo (JPEG y WebP) en un pool de hilos, para que
+# la petición no espere. Los archivos se nombran con el hash del contenido original, así que su URL
+# cambia solo si cambia la imagen y se pueden servir con caché de larga duración.
+# Las rutas generadas se guardan en `Product.image_variants` y se usan con las etiquetas de `product_extras`.
+
+# Tamaños generados (ancho, alto), al doble de como se muestran para pantallas de alta densidad.
+SIZES = {
+    'thumb': (120, 120),  # Carrito y líneas de orden (60x60)
+    'medium': (400, 400),  # Detalle del producto (200x200)
+    'card': (600, 400),  # Tarjetas de los listados (alto 200)
+}
+
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+DERIVATIVES_DIR = 'products/derivatives'
+
+executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+                              thread_name_prefix='product-images')
+
+
+# Hash corto del contenido del archivo original.
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+
+    return digest.hexdigest()[:16]
+
+# Genera las imágenes derivadas de un archivo y retorna {'source': nombre, tamaño: {formato: nombre}}.
+# Las derivadas se nombran solo con el hash del contenido: si ya existen (misma imagen), se reutilizan.
+def generate_variants(name):
+    with default_storage.open(name, 'rb') as file:
+        digest = content_hash(file)
+        file.seek(0)
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+
+    variants = {'source': name}
+
+    for size, dimensions in SIZES.items():
+        image = ImageOps.fit(original.convert('RGB'), dimensions, Image.LANCZOS)
+        variants[size] = {}
+
+        for extension, (format, options) in FORMATS.items():
+            path = '{}/{}/{}.{}.{}'.format(DERIVATIVES_DIR, digest[:2], digest, size, extension)
+
+            if not default_storage.exists(path):
+                buffer = BytesIO()
+                image.save(buffer, format, **options)
+                path = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+            variants[size][extension] = path
+
+    return variants
+
+# Procesa la imagen actual de un producto y guarda las rutas; actualiza su tarjeta y el caché del catálogo.
+def process_product(product_id):
+    from .cache import bump_version
+    from .cards import refresh_cards
+
+    product = Product.objects.filter(pk=product_id).only('image').first()
+    if product is None or not product.image:
+        return None
+
+    try:
+        variants = generate_variants(product.image.name)
+    except (OSError, UnidentifiedImageError) as error:
+        logger.warning('No se pudo procesar la imagen de %s: %s', product.image.name, error)
+        return None
+
+    # Solo si la imagen no cambió mientras se procesaba.
+    updated = Product.objects.filter(pk=product_id, image=product.image.name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if updated:
+        refresh_cards([product_id])
+        bump_version()
+
+    return variants
+
+# Ejecuta `process_product` en un hilo del pool y cierra la conexión de ese hilo al terminar.
+def process_in_worker(product_id):
+    try:
+        return process_product(product_id)
+    except Exception:
+        logger.exception('Error procesando la imagen del producto %s', product_id)
+    finally:
+        connection.close()
+
+# Programa el procesamiento en el pool (o lo ejecuta de inmediato si PRODUCT_IMAGES_ASYNC es False).
+def schedule(product_id):
+    if getattr(settings, 'PRODUCT_IMAGES_ASYNC', True):
+        return executor.submit(process_in_worker, product_id)
+
+    return process_product(product_id)
+
+# URL de una derivada; si todavía no existe, la URL de la imagen original.
+def variant_url(product, size, format='jpeg'):
+    path = (product.image_variants or {}).get(size, {}).get(format)
+    if path:
+        return default_storage.url(path)
+
+    return product.image.url if product.image and format == 'jpeg' else ''
+
+
+# Señal: al guardar un producto con una imagen nueva, genera sus derivadas al confirmar la transacción.
+def product_saved(sender, instance, *args, **kwargs):
+    if instance.image and (instance.image_variants or {}).get('source') != instance.image.name:
+        product_id = instance.pk
+        transaction.on_commit(lambda: schedule(product_id))
+
+post_save.connect(product_saved, sender=Product)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from products import cache
+
+
+class Command(BaseCommand):
+    help = 'Muestra la versión y los aciertos/fallos del caché del catálogo, o lo invalida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invalidate', action='store_true',
+                            help='Incrementa la versión del catálogo (descarta los listados guardados).')
+        parser.add_argument('--reset-stats', action='store_true', help='Reinicia los contadores.')
+
+    def handle(self, *args, **options):
+        if options['invalidate']:
+            cache.bump_version()
+
+        if options['reset_stats']:
+            cache.reset_stats()
+
+        stats = cache.stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+
+        self.stdout.write('Versión: {version} - Aciertos: {hits} - Fallos: {misses}'.format(**stats) +
+                          ' ({:.1f}% de aciertos)'.format(ratio))
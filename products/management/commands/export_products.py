@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.catalog_io import FORMATS, export_rows, guess_format, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo a un archivo CSV o JSONL, leyendo los productos por lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo de salida ("-" para la salida estándar).')
+        parser.add_argument('--format', choices=FORMATS, help='Formato del archivo (por defecto, según la extensión).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Productos por consulta.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        file = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+
+        start = time.perf_counter()
+        try:
+            total = write_rows(file, export_rows(options['batch_size']), format)
+        finally:
+            if file is not self.stdout:
+                file.close()
+
+        seconds = time.perf_counter() - start
+        report = self.stderr if path == '-' else self.stdout
+        report.write('Productos exportados: {} en {:.2f} s ({:.0f} filas/s)'.format(
+            total, seconds, total / seconds if seconds else 0
+        ))
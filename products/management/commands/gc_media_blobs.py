@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from orders.models import OrderLine
+from products.models import MediaBlob, Product
+
+
+class Command(BaseCommand):
+    help = 'Borra los archivos de imagen (MediaBlob) que ningún producto ni línea de orden usa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='No borra archivos más nuevos que esto (pueden ser de una subida en curso).')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recalcula los contadores de referencias a partir de los productos.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra lo que se borraría.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.recount()
+
+        before = timezone.now() - timedelta(hours=options['grace_hours'])
+        blobs = MediaBlob.objects.unreferenced(before)
+
+        # Las líneas de órdenes conservan la imagen del producto al momento de la compra.
+        blobs = blobs.exclude(name__in=OrderLine.objects.values('image'))
+
+        deleted, freed = 0, 0
+        for blob in blobs.iterator():
+            self.stdout.write('Borrando {} ({} bytes)'.format(blob.name, blob.size))
+            if not options['dry_run']:
+                storage = Product._meta.get_field('image').storage
+                storage.delete(blob.name)
+                blob.delete()
+
+            deleted += 1
+            freed += blob.size
+
+        self.stdout.write('Archivos borrados: {} - Bytes liberados: {}'.format(deleted, freed))
+
+    def recount(self):
+        counts = dict(Product.objects.values_list('image').annotate(total=Count('id')))
+
+        blobs = list(MediaBlob.objects.all())
+        for blob in blobs:
+            blob.references = counts.get(blob.name, 0)
+
+        MediaBlob.objects.bulk_update(blobs, ['references'], batch_size=500)
@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.images import process_in_worker, process_product
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Genera las imágenes derivadas (miniaturas y WebP) de los productos que todavía no las tienen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenera también los productos ya procesados.')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+                            help='Cantidad de hilos que procesan imágenes.')
+
+    def handle(self, *args, **options):
+        pending = [
+            id for id, image, variants in Product.objects.exclude(image='').values_list('id', 'image', 'image_variants')
+            if options['force'] or (variants or {}).get('source') != image
+        ]
+
+        if options['force']:
+            Product.objects.filter(id__in=pending).update(image_variants={})
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                results = list(executor.map(process_in_worker, pending))
+        else:
+            results = [process_product(id) for id in pending]
+
+        done = sum(1 for result in results if result)
+        self.stdout.write('Productos procesados: {} - Con error: {}'.format(done, len(pending) - done))
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.catalog_io import FORMATS, CatalogImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Importa productos desde un archivo CSV o JSONL (uno por línea) en lotes. '
+            'Columnas: title, slug, description, price, stock, image, categories (separadas por "|" en el CSV). '
+            'Las categorías que no existen se crean. Todo el archivo se importa en una sola transacción.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar ("-" para la entrada estándar).')
+        parser.add_argument('--format', choices=FORMATS, help='Formato del archivo (por defecto, según la extensión).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Productos por inserción.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or guess_format(path)
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                total = CatalogImporter(options['batch_size']).run(read_rows(file, format))
+        except ValueError as error:
+            raise CommandError('No se importó ningún producto. {}'.format(error))
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        seconds = time.perf_counter() - start
+        self.stdout.write('Productos importados: {} en {:.2f} s ({:.0f} filas/s)'.format(
+            total, seconds, total / seconds if seconds else 0
+        ))
+        self.stdout.write('Las imágenes derivadas se generan con el comando generate_image_variants.')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from products.models import Product
+from products.benchmark import create_catalog, median_ms
+from products.pagination import NEXT, CursorPaginator, encode_cursor
+
+
+class Command(BaseCommand):
+    help = ('Compara la paginación con OFFSET + COUNT(*) con la paginación por cursor a distintas '
+            'profundidades sobre un catálogo sintético. Los datos se revierten al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Tamaño del catálogo sintético.')
+        parser.add_argument('--per-page', type=int, default=12, help='Productos por página.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por página.')
+
+    def handle(self, *args, **options):
+        per_page = options['per_page']
+
+        with transaction.atomic():
+            self.stdout.write('Creando {} productos sintéticos...'.format(options['products']))
+            create_catalog(options['products'])
+
+            queryset = Product.objects.order_by('id')
+            ids = list(queryset.values_list('id', flat=True))
+            last_page = (len(ids) - 1) // per_page + 1
+
+            self.stdout.write('{:>8} {:>12} {:>12}'.format('pagina', 'offset ms', 'cursor ms'))
+            for number in sorted({1, 10, 100, 1000, last_page // 2, last_page}):
+                if number > last_page:
+                    continue
+
+                # El cursor de la página `number` es el id del último producto de la página anterior.
+                cursor = encode_cursor(NEXT, [ids[(number - 1) * per_page - 1]]) if number > 1 else None
+
+                offset = median_ms(lambda: list(Paginator(queryset, per_page).page(number)), options['repeat'])
+                keyset = median_ms(lambda: list(CursorPaginator(queryset, per_page).page(cursor)), options['repeat'])
+                self.stdout.write('{:>8} {:>12.2f} {:>12.2f}'.format(number, offset, keyset))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.cards import rebuild_cards
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye las tarjetas de producto (ProductCard) que usan los listados.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_cards()
+
+        self.stdout.write('Tarjetas generadas: {}'.format(total))
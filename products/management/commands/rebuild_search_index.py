@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda FTS5 de productos a partir del catálogo.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write('El índice de búsqueda solo está disponible en SQLite; nada que hacer.')
+            return
+
+        with transaction.atomic():
+            total = search.rebuild()
+
+        self.stdout.write('Productos indexados: {}'.format(total))
@@ -0,0 +1,38 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.pricing import parse_rule, reprice
+
+
+class Command(BaseCommand):
+    help = ('Cambia el precio de todo el catálogo según reglas "categoria:percent:-10", "categoria:amount:2" '
+            'o "percent:5" (todos los productos). A cada producto se le aplica la primera regla que le corresponde. '
+            'También recalcula los carritos abiertos y las órdenes creadas con esos productos.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', action='append', required=True, dest='rules', help='Regla de precio (se puede repetir).')
+        parser.add_argument('--round-99', action='store_true', help='Redondea los precios nuevos a .99.')
+        parser.add_argument('--floor', help='Precio mínimo.')
+        parser.add_argument('--ceiling', help='Precio máximo.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Productos por bulk_update.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta los productos que cambiarían.')
+
+    def handle(self, *args, **options):
+        try:
+            rules = [parse_rule(rule) for rule in options['rules']]
+            floor, ceiling = (Decimal(options[name]) if options[name] else None for name in ('floor', 'ceiling'))
+        except (ValueError, InvalidOperation) as error:
+            raise CommandError(error)
+
+        if floor is not None and ceiling is not None and floor > ceiling:
+            raise CommandError('El precio mínimo ({}) no puede ser mayor que el precio máximo ({}).'.format(floor, ceiling))
+
+        start = time.perf_counter()
+        total = reprice(rules, options['round_99'], floor, ceiling,
+                        batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        self.stdout.write('{}: {} en {:.2f} s'.format(
+            'Productos que cambiarían' if options['dry_run'] else 'Precios actualizados', total, time.perf_counter() - start
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products import search
+from products.benchmark import create_catalog, median_ms
+
+
+class Command(BaseCommand):
+    help = ('Compara la búsqueda FTS5 con la búsqueda anterior (icontains) sobre un catálogo sintético. '
+            'Los datos se crean dentro de una transacción que se revierte al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Tamaño del catálogo sintético.')
+        parser.add_argument('--categories', type=int, default=20, help='Cantidad de categorías sintéticas.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por término.')
+        parser.add_argument('--terms', nargs='+', default=['bollo', 'maiz queso', 'platano frito', 'guay'],
+                            help='Términos a buscar.')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('El benchmark necesita SQLite con FTS5.')
+
+        with transaction.atomic():
+            self.stdout.write('Creando {} productos sintéticos...'.format(options['products']))
+            create_catalog(options['products'], options['categories'])
+
+            self.stdout.write('{:<16} {:>8} {:>14} {:>14}'.format('termino', 'hits', 'icontains ms', 'fts5 ms'))
+            for term in options['terms']:
+                hits = search.search(term).count
+                old = median_ms(lambda: search.icontains_search(term, 0, 12), options['repeat'])
+                new = median_ms(lambda: search.search(term, 12), options['repeat'])
+                self.stdout.write('{:<16} {:>8} {:>14.2f} {:>14.2f}'.format(term, hits, old, new))
+
+            transaction.set_rollback(True)
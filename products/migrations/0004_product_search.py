@@ -0,0 +1,48 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'products_search'
+
+
+# Crea la tabla virtual FTS5 del índice de búsqueda y la llena con el catálogo actual.
+# Solo aplica en SQLite; en otros motores la búsqueda usa icontains (ver `products.search`).
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    Product = apps.get_model('products', 'Product')
+    Category = apps.get_model('categories', 'Category')
+
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE {} USING fts5('
+        'title, categories, description, tokenize = "unicode61 remove_diacritics 2")'.format(SEARCH_TABLE)
+    )
+    schema_editor.execute(
+        'INSERT INTO {table} (rowid, title, categories, description) '
+        'SELECT p.id, p.title, COALESCE(GROUP_CONCAT(c.title, \' \'), \'\'), p.description '
+        'FROM {product} p '
+        'LEFT JOIN {through} cp ON cp.product_id = p.id '
+        'LEFT JOIN {category} c ON c.id = cp.category_id '
+        'GROUP BY p.id'.format(
+            table=SEARCH_TABLE, product=Product._meta.db_table,
+            through=Category.products.through._meta.db_table, category=Category._meta.db_table
+        )
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute('DROP TABLE IF EXISTS {}'.format(SEARCH_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_image'),
+        ('categories', '0002_category_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
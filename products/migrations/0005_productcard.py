@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.core.files.storage import default_storage
+
+
+# Genera las tarjetas de los productos existentes.
+def create_cards(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductCard = apps.get_model('products', 'ProductCard')
+
+    ProductCard.objects.bulk_create([
+        ProductCard(
+            product_id=product.id, title=product.title, slug=product.slug, price=product.price,
+            thumbnail_url=default_storage.url(product.image.name) if product.image else '',
+            categories=', '.join(category.title for category in product.category_set.all()),
+        )
+        for product in Product.objects.prefetch_related('category_set')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search'),
+        ('categories', '0002_category_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('title', models.CharField(max_length=50)),
+                ('slug', models.SlugField()),
+                ('price', models.DecimalField(decimal_places=2, default=0.0, max_digits=8)),
+                ('thumbnail_url', models.CharField(blank=True, max_length=255)),
+                ('categories', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(create_cards, migrations.RunPython.noop),
+    ]
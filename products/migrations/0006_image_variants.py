@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='thumbnail_webp_url',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
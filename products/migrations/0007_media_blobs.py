@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:03
+
+from django.db import migrations, models
+import products.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('references', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(storage=products.storage.blob_storage, upload_to='products/'),
+        ),
+    ]
@@ -1,21 +1,69 @@
 import uuid  # Para generar identificadores únicos
 from django.db import models  # Herramientas para definir modelos en Django
-from django.db.models.signals import pre_save  # Señal que se dispara antes de guardar un objeto
+from django.db.models import F  # Para actualizar los contadores sin leerlos
+from django.db.models.signals import pre_save, post_save, post_delete  # Señales del modelo
 from django.utils.text import slugify  # Convierte texto en formato slug
 
+from .storage import blob_storage  # Almacenamiento direccionado por contenido
+
 # Modelo Product para representar un producto en la tienda
 class Product(models.Model):
     title = models.CharField(max_length=50)  # Título del producto (máximo 50 caracteres)
     description = models.TextField()  # Descripción del producto
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0.0)  # Precio del producto con 2 decimales
+    stock = models.PositiveIntegerField(null=True, blank=True)  # Unidades disponibles (nulo: sin control de inventario, ver `reservations`)
     slug = models.SlugField(null=False, blank=False, unique=True)  # Slug único basado en el título
-    image = models.ImageField(upload_to='products/', null=False, blank=False)  # Imagen del producto
+    image = models.ImageField(upload_to='products/', storage=blob_storage, null=False, blank=False)  # Imagen del producto (una sola copia por contenido)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Rutas de las imágenes derivadas (ver `products.images`)
     created_at = models.DateTimeField(auto_now_add=True)  # Fecha de creación (se asigna automáticamente)
+    updated_at = models.DateTimeField(auto_now=True)  # Última modificación del producto o de sus categorías (ver `products.pages`)
 
     def __str__(self):
         """Devuelve el título del producto como representación en cadena."""
         return self.title
 
+# Proyección de lectura con lo que necesita la tarjeta de un producto en los listados.
+# Tiene el mismo id que el producto (clave primaria) y se mantiene con las señales del catálogo
+# (ver `products.cards`); se puede reconstruir con el comando `rebuild_product_cards`.
+class ProductCard(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    title = models.CharField(max_length=50)  # Título del producto
+    slug = models.SlugField()  # Slug para el enlace al detalle
+    price = models.DecimalField(max_digits=8, decimal_places=2, default=0.0)  # Precio del producto
+    thumbnail_url = models.CharField(max_length=255, blank=True)  # URL de la imagen de la tarjeta
+    thumbnail_webp_url = models.CharField(max_length=255, blank=True)  # URL de la misma imagen en WebP
+    categories = models.TextField(blank=True)  # Títulos de las categorías separados por coma
+
+    def __str__(self):
+        return self.title
+
+# Archivo guardado por `ContentAddressedStorage`: una fila por contenido distinto, con la cantidad
+# de productos que lo usan. Los que llegan a cero se borran con el comando `gc_media_blobs`.
+class MediaBlobManager(models.Manager):
+
+    def add_reference(self, name, count=1):
+        self.filter(name=name).update(references=F('references') + count)
+
+    def remove_reference(self, name):
+        self.filter(name=name, references__gt=0).update(references=F('references') - 1)
+
+    # Archivos sin referencias creados antes de `before` (los recientes pueden ser de una subida en curso).
+    def unreferenced(self, before):
+        return self.filter(references=0, created_at__lt=before)
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # Ruta del archivo en el almacenamiento
+    digest = models.CharField(max_length=64)  # sha256 del contenido
+    size = models.PositiveBigIntegerField(default=0)  # Tamaño en bytes
+    references = models.PositiveIntegerField(default=0)  # Productos que usan el archivo
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MediaBlobManager()
+
+    def __str__(self):
+        return self.name
+
 # Función que genera un slug único antes de guardar el producto
 def set_slug(sender, instance, *args, **kwargs):
     """Genera un slug basado en el título del producto si no existe uno."""
@@ -25,8 +73,30 @@ def set_slug(sender, instance, *args, **kwargs):
         # Si el slug ya existe, añade una cadena única para evitar duplicados
         while Product.objects.filter(slug=slug).exists():
             slug = slugify('{}-{}'.format(instance.title, str(uuid.uuid4())[:8]))
-    
-    instance.slug = slug  # Asigna el slug generado al producto
+
+        instance.slug = slug  # Asigna el slug generado al producto
+
+# Guarda la imagen que tenía el producto antes de guardarlo, para mover la referencia si cambia
+def remember_image(sender, instance, *args, **kwargs):
+    instance._previous_image = (
+        sender.objects.filter(pk=instance.pk).values_list('image', flat=True).first() if instance.pk else None
+    )
+
+# Actualiza los contadores de referencias de los archivos cuando cambia la imagen del producto
+def count_image_references(sender, instance, *args, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if previous != instance.image.name:
+        if instance.image.name:
+            MediaBlob.objects.add_reference(instance.image.name)
+        if previous:
+            MediaBlob.objects.remove_reference(previous)
+
+def release_image(sender, instance, *args, **kwargs):
+    if instance.image.name:
+        MediaBlob.objects.remove_reference(instance.image.name)
 
 # Conecta la señal pre_save con el modelo Product para generar el slug antes de guardar
 pre_save.connect(set_slug, sender=Product)
+pre_save.connect(remember_image, sender=Product)
+post_save.connect(count_image_references, sender=Product)
+post_delete.connect(release_image, sender=Product)
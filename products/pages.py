@@ -0,0 +1,74 @@
+from django.contrib import messages  # Para no guardar páginas con mensajes pendientes
+from django.middleware.csrf import get_token  # Token CSRF de cada visitante
+from django.utils import timezone  # Fecha de modificación de los productos
+
+from .cache import catalog_changed_at, catalog_version, get_cache  # Las páginas se guardan en el caché del catálogo
+from .models import Product
+from .signals import on_products_changed
+
+# Caché HTTP de la página de detalle de un producto.
+# Cada producto tiene `updated_at`, que cambia al guardarlo y también cuando cambian sus categorías.
+# Con esa fecha se arman el ETag y Last-Modified, así que los navegadores y proxies pueden revalidar
+# la página con un 304 sin que se vuelva a generar. La página también muestra el menú de categorías,
+# así que el ETag lleva la versión del catálogo y Last-Modified es la fecha más reciente entre la del
+# producto y la del último cambio del catálogo. Para los visitantes anónimos, además, el HTML
+# se guarda completo bajo el id y la fecha del producto y la versión del catálogo: una fecha nueva o
+# un cambio en cualquier otra parte del catálogo (que también se muestra en la página) es una clave nueva.
+# El token CSRF del formulario del carrito se guarda como un marcador y se reemplaza en cada petición.
+
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+
+
+# (id, updated_at) del producto del slug; se consulta una sola vez por petición.
+def page_state(request, slug):
+    if not hasattr(request, '_product_page_state'):
+        request._product_page_state = Product.objects.filter(slug=slug).values_list('id', 'updated_at').first()
+
+    return request._product_page_state
+
+# Las páginas con mensajes pendientes se muestran una sola vez: no se revalidan ni se guardan.
+def has_messages(request):
+    return len(messages.get_messages(request)) > 0
+
+# La navegación cambia si el usuario inició sesión, así que va en el ETag.
+def product_etag(request, slug):
+    state = page_state(request, slug)
+    if state is None or has_messages(request):
+        return None
+
+    id, updated_at = state
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    return '{}-{}-{}-{}'.format(id, int(updated_at.timestamp() * 1000000), catalog_version(), user)
+
+def product_last_modified(request, slug):
+    state = page_state(request, slug)
+    if state is None or has_messages(request):
+        return None
+
+    changed_at = catalog_changed_at()
+    return max(state[1], changed_at) if changed_at else state[1]
+
+# Solo se guardan las páginas de los visitantes anónimos sin mensajes pendientes.
+def is_cacheable(request, slug):
+    return (request.method in ('GET', 'HEAD') and not request.user.is_authenticated
+            and page_state(request, slug) is not None and not has_messages(request))
+
+def page_key(request, slug):
+    id, updated_at = page_state(request, slug)
+    return 'product-page:{}:{}:{}'.format(id, int(updated_at.timestamp() * 1000000), catalog_version())
+
+def get_page(key):
+    return get_cache().get(key)
+
+def set_page(key, html):
+    get_cache().set(key, html)
+
+# Pone el token CSRF del visitante en el HTML guardado.
+def render_page(request, html):
+    return html.replace(CSRF_PLACEHOLDER, get_token(request))
+
+
+# Señal: cualquier cambio del producto o de sus categorías actualiza su fecha de modificación.
+@on_products_changed
+def touch_products(ids):
+    Product.objects.filter(id__in=ids).update(updated_at=timezone.now())
@@ -0,0 +1,109 @@
+import base64  # Para que los cursores sean opacos en la URL
+import json  # Para serializar la posición del cursor
+
+# Paginación por cursor (keyset) para los listados del catálogo.
+# En lugar de OFFSET + COUNT(*), cada página se pide a partir de la clave del último (o primer)
+# producto de la página anterior, así que el costo no crece con la profundidad de la página.
+# Los cursores son opacos: base64 de la dirección y la clave de ordenamiento.
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, key):
+    payload = json.dumps([direction, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+# Retorna (dirección, clave); (None, None) si no hay cursor. Lanza InvalidCursor si está mal formado.
+def decode_cursor(token):
+    if not token:
+        return None, None
+
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, key = json.loads(payload)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Cursor inválido')
+
+    if direction not in (NEXT, PREVIOUS) or not isinstance(key, list):
+        raise InvalidCursor('Cursor inválido')
+
+    return direction, key
+
+
+class CursorPage:
+    """Página de resultados con los cursores hacia la página siguiente y la anterior."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count  # Total (aproximado) de resultados, si se conoce
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+# Arma la página a partir de hasta `per_page + 1` filas leídas en la dirección del cursor.
+# La fila extra solo indica que hay más resultados en esa dirección.
+def build_page(rows, per_page, direction, key, count=None):
+    rows = list(rows)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == PREVIOUS:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, direction == NEXT
+
+    return CursorPage(
+        rows,
+        encode_cursor(NEXT, key(rows[-1])) if rows and has_next else None,
+        encode_cursor(PREVIOUS, key(rows[0])) if rows and has_previous else None,
+        count
+    )
+
+
+class CursorPaginator:
+    """Pagina un queryset ordenado por clave primaria. `count` es opcional (por ejemplo, un total guardado en caché)."""
+
+    def __init__(self, queryset, per_page, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.count = count
+
+    def page(self, token=None):
+        direction, key = decode_cursor(token)
+
+        if direction is None:
+            rows = self.queryset.order_by('pk')
+        elif direction == NEXT:
+            rows = self.queryset.filter(pk__gt=self.key_id(key)).order_by('pk')
+        else:
+            rows = self.queryset.filter(pk__lt=self.key_id(key)).order_by('-pk')
+
+        count = self.count() if callable(self.count) else self.count
+        return build_page(rows[:self.per_page + 1], self.per_page, direction, lambda row: [row.pk], count)
+
+    @staticmethod
+    def key_id(key):
+        if len(key) != 1 or not isinstance(key[0], int):
+            raise InvalidCursor('Cursor inválido')
+
+        return key[0]
@@ -0,0 +1,122 @@
+from decimal import Decimal  # Precios nuevos con dos decimales
+
+import numpy as np  # Cálculo de todos los precios en una sola pasada
+
+from django.db import transaction  # Caché del catálogo al confirmar
+
+from categories.models import Category
+from .models import Product
+from .signals import notify
+
+# Cambio masivo de precios del catálogo (comando `reprice_products` y acción del admin).
+# Los precios se leen de una vez, se calculan con NumPy en centavos (enteros, sin errores de
+# redondeo) y solo los que cambian se escriben con `bulk_update` por lotes. Después de cada lote,
+# `notify` actualiza las proyecciones del catálogo y los totales de los carritos abiertos y las
+# órdenes creadas que tienen esos productos (con UPDATEs por conjunto, ver `carts` y `orders`).
+
+PERCENT = 'percent'
+AMOUNT = 'amount'
+
+MAX_CENTS = 99999999  # DecimalField(max_digits=8, decimal_places=2)
+
+
+class Rule:
+    """Cambio de precio: porcentaje o monto fijo, para una categoría o para todo el catálogo."""
+
+    def __init__(self, kind, value, category=None):
+        if kind not in (PERCENT, AMOUNT):
+            raise ValueError('Tipo de regla inválido: {}'.format(kind))
+
+        self.kind = kind
+        self.value = Decimal(str(value))
+        self.category = category  # Título de la categoría, o None para todos los productos
+
+    def __repr__(self):
+        return 'Rule({!r}, {}, {!r})'.format(self.kind, self.value, self.category)
+
+# Convierte 'panes:percent:-10' o 'percent:5' en una regla.
+def parse_rule(text):
+    parts = text.rsplit(':', 2)
+    if len(parts) == 2:
+        parts.insert(0, None)
+
+    if len(parts) != 3:
+        raise ValueError('Regla inválida: {}'.format(text))
+
+    category, kind, value = parts
+    try:
+        return Rule(kind, value, category)
+    except ArithmeticError:
+        raise ValueError('Valor inválido en la regla: {}'.format(text))
+
+
+# Calcula los precios nuevos (en centavos) de todos los productos.
+# A cada producto se le aplica la primera regla que le corresponda; los que no tienen regla no cambian.
+def compute_prices(ids, cents, memberships, rules, round_99=False, floor=None, ceiling=None):
+    rule_index = np.full(len(ids), -1)
+    for index in range(len(rules) - 1, -1, -1):
+        rule = rules[index]
+        matches = np.ones(len(ids), dtype=bool) if rule.category is None else np.isin(ids, memberships[rule.category])
+        rule_index[matches] = index
+
+    percents = np.array([float(rule.value) if rule.kind == PERCENT else 0.0 for rule in rules] + [0.0])
+    amounts = np.array([int(rule.value * 100) if rule.kind == AMOUNT else 0 for rule in rules] + [0])
+
+    new = np.rint(cents * (1 + percents[rule_index] / 100)).astype(np.int64) + amounts[rule_index]
+
+    low = max(int(Decimal(str(floor)) * 100), 0) if floor is not None else 0
+    high = min(int(Decimal(str(ceiling)) * 100), MAX_CENTS) if ceiling is not None else MAX_CENTS
+    if low > high:
+        raise ValueError('El precio mínimo no puede ser mayor que el precio máximo')
+    new = np.clip(new, low, high)
+
+    # Precio terminado en .99: el entero más cercano menos un centavo (como mínimo 0.99), movido al .99
+    # siguiente o anterior si se sale de los límites. Los precios en cero y los que no tienen un .99
+    # dentro de los límites se dejan como están.
+    if round_99:
+        rounded = np.maximum(np.rint(new / 100).astype(np.int64) * 100 - 1, 99)
+        rounded = np.where(rounded < low, rounded + 100, rounded)
+        rounded = np.where(rounded > high, rounded - 100, rounded)
+        new = np.where((new > 0) & (rounded >= low) & (rounded <= high), rounded, new)
+
+    return np.where(rule_index >= 0, new, cents)
+
+# Aplica las reglas a los productos de `queryset` (por defecto, todo el catálogo).
+# Retorna la cantidad de productos cuyo precio cambió.
+def reprice(rules, round_99=False, floor=None, ceiling=None, queryset=None, batch_size=1000, dry_run=False):
+    queryset = Product.objects.all() if queryset is None else queryset
+    rows = list(queryset.order_by('id').values_list('id', 'price'))
+    if not rows or not rules:
+        return 0
+
+    ids = np.array([id for id, price in rows], dtype=np.int64)
+    cents = np.array([int(price * 100) for id, price in rows], dtype=np.int64)
+
+    titles = {rule.category for rule in rules if rule.category is not None}
+    memberships = {title: [] for title in titles}
+    for title, product_id in Category.products.through.objects.filter(
+        category__title__in=titles
+    ).values_list('category__title', 'product_id'):
+        memberships[title].append(product_id)
+
+    new = compute_prices(ids, cents, memberships, rules, round_99, floor, ceiling)
+    changed = np.flatnonzero(new != cents)
+    if dry_run or not len(changed):
+        return len(changed)
+
+    with transaction.atomic():
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            Product.objects.bulk_update([
+                Product(id=int(ids[index]), price=Decimal(int(new[index])) / 100) for index in batch
+            ], ['price'])
+
+            notify(ids[batch].tolist())
+
+        transaction.on_commit(prices_changed)
+
+    return len(changed)
+
+def prices_changed():
+    from .cache import bump_version
+    bump_version()
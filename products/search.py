@@ -0,0 +1,154 @@
+import re  # Para separar el término de búsqueda en palabras
+
+from django.db import connection  # Conexión a la base de datos (consultas SQL directas)
+from django.db.models import Q  # Para la búsqueda de respaldo con icontains
+from django.db.models.signals import post_delete  # Señal que quita del índice los productos borrados
+
+from categories.models import Category
+from .models import Product, ProductCard
+from .signals import on_products_changed
+from .pagination import NEXT, PREVIOUS, CursorPage, CursorPaginator, InvalidCursor, build_page, decode_cursor
+
+# Índice de búsqueda de productos sobre una tabla virtual FTS5 de SQLite.
+# Cada fila del índice es un producto (rowid = id del producto) con su título, los títulos de sus
+# categorías y su descripción. El índice se actualiza con las señales de `Product` y `Category`
+# dentro de la misma transacción que el cambio, y se puede reconstruir con `rebuild_search_index`.
+
+SEARCH_TABLE = 'products_search'
+
+# Peso de cada columna para el ranking BM25: título, categorías, descripción.
+WEIGHTS = (10.0, 5.0, 1.0)
+
+# Cantidad máxima de palabras que se toman del término de búsqueda.
+MAX_TERMS = 10
+
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5('
+    'title, categories, description, tokenize = "unicode61 remove_diacritics 2")'
+).format(SEARCH_TABLE)
+
+DROP_SQL = 'DROP TABLE IF EXISTS {}'.format(SEARCH_TABLE)
+
+
+# El índice solo existe en SQLite; en otros motores la búsqueda usa icontains.
+def is_available():
+    return connection.vendor == 'sqlite'
+
+# Convierte el texto del usuario en una expresión MATCH segura: cada palabra como prefijo entre comillas,
+# todas obligatorias. Así los caracteres especiales de FTS5 (comillas, *, NEAR, AND...) no se interpretan.
+def build_match(query):
+    terms = re.findall(r'\w+', query or '')[:MAX_TERMS]
+    return ' '.join('"{}"*'.format(term) for term in terms)
+
+# Busca productos y retorna una `CursorPage` de tarjetas (`ProductCard`) con el total de coincidencias,
+# en una sola consulta.
+# Los resultados están ordenados por relevancia (BM25) y luego por id; el cursor es la pareja (rank, id).
+# No se repiten productos aunque coincidan varias categorías.
+def search(query, per_page=12, cursor=None):
+    direction, key = decode_cursor(cursor)
+
+    match = build_match(query)
+    if not match:
+        return CursorPage([], count=0)
+
+    if not is_available():
+        queryset = ProductCard.objects.filter(product__in=icontains_queryset(query).values('id'))
+        return CursorPaginator(queryset, per_page, count=queryset.count).page(cursor)
+
+    where, order, params = '', 'rank, product_id', []
+    if direction is not None:
+        if len(key) != 2 or not all(isinstance(value, (int, float)) for value in key):
+            raise InvalidCursor('Cursor inválido')
+
+        operator = '>' if direction == NEXT else '<'
+        where = 'WHERE (rank {0} %s OR (rank = %s AND product_id {0} %s))'.format(operator)
+        params = [key[0], key[0], key[1]]
+
+        if direction == PREVIOUS:
+            order = 'rank DESC, product_id DESC'
+
+    # El ranking se calcula en una CTE materializada (FTS5 no permite bm25() fuera de la consulta MATCH);
+    # el total se cuenta sobre las coincidencias que tienen tarjeta (las mismas filas que se muestran),
+    # antes de aplicar el cursor.
+    cards = ProductCard.objects.raw(
+        ('WITH matches AS MATERIALIZED ('
+         '  SELECT rowid AS id, bm25({table}, %s, %s, %s) AS rank FROM {table} WHERE {table} MATCH %s'
+         '), ranked AS ('
+         '  SELECT {card}.*, matches.rank AS rank, COUNT(*) OVER () AS hits'
+         '  FROM matches INNER JOIN {card} ON {card}.product_id = matches.id'
+         ') '
+         'SELECT * FROM ranked ' + where + ' '
+         'ORDER BY ' + order + ' LIMIT %s').format(table=SEARCH_TABLE, card=ProductCard._meta.db_table),
+        [*WEIGHTS, match, *params, per_page + 1]
+    )
+
+    page = build_page(cards, per_page, direction, lambda card: [card.rank, card.pk])
+    page.count = page.object_list[0].hits if page.object_list else 0
+    return page
+
+# Búsqueda anterior (título o categoría con icontains), usada como respaldo y en el benchmark.
+def icontains_queryset(query):
+    filters = Q(title__icontains=query) | Q(category__title__icontains=query)
+    return Product.objects.filter(filters).distinct().order_by('id')
+
+def icontains_search(query, offset=0, limit=12):
+    queryset = icontains_queryset(query)
+    return list(queryset[offset:offset + limit]), queryset.count()
+
+# Inserta (o reemplaza) en el índice los productos indicados con una sola sentencia.
+def index_products(ids):
+    ids = [int(id) for id in ids]
+    if not ids or not is_available():
+        return
+
+    remove_products(ids)
+    insert_products('WHERE p.id IN ({})'.format(', '.join(['%s'] * len(ids))), ids)
+
+# Elimina del índice los productos indicados.
+def remove_products(ids):
+    ids = [int(id) for id in ids]
+    if not ids or not is_available():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(SEARCH_TABLE, ', '.join(['%s'] * len(ids))), ids)
+
+# Vacía el índice y lo vuelve a llenar con todo el catálogo. Retorna la cantidad de productos indexados.
+def rebuild():
+    if not is_available():
+        return 0
+
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_SQL)
+        cursor.execute('DELETE FROM {}'.format(SEARCH_TABLE))
+
+    insert_products()
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*) FROM {}'.format(SEARCH_TABLE))
+        return cursor.fetchone()[0]
+
+# Llena el índice a partir del catálogo, con los títulos de las categorías de cada producto en una columna.
+def insert_products(where='', params=()):
+    through = Category.products.through
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {table} (rowid, title, categories, description) '
+            'SELECT p.id, p.title, COALESCE(GROUP_CONCAT(c.title, \' \'), \'\'), p.description '
+            'FROM {product} p '
+            'LEFT JOIN {through} cp ON cp.product_id = p.id '
+            'LEFT JOIN {category} c ON c.id = cp.category_id '
+            '{where} GROUP BY p.id'.format(
+                table=SEARCH_TABLE, product=Product._meta.db_table, through=through._meta.db_table,
+                category=Category._meta.db_table, where=where
+            ),
+            list(params)
+        )
+
+
+# Señales que mantienen el índice sincronizado con el catálogo.
+def product_deleted(sender, instance, *args, **kwargs):
+    remove_products([instance.pk])
+
+on_products_changed(index_products)
+post_delete.connect(product_deleted, sender=Product)
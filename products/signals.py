@@ -0,0 +1,56 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed  # Señales del catálogo
+
+from categories.models import Category
+from .models import Product
+
+# Avisa a las proyecciones del catálogo (índice de búsqueda, tarjetas de producto...) qué productos
+# cambiaron: al guardar un producto, al renombrar o borrar una categoría y al cambiar los productos
+# de una categoría. Cada proyección registra una función que recibe la lista de ids afectados y se
+# ejecuta dentro de la misma transacción que el cambio.
+
+listeners = []
+
+
+# Registra `callback(ids)` para que se llame cada vez que cambian productos del catálogo.
+def on_products_changed(callback):
+    listeners.append(callback)
+    return callback
+
+def notify(ids):
+    ids = [int(id) for id in ids]
+    if not ids:
+        return
+
+    for callback in listeners:
+        callback(ids)
+
+
+def product_saved(sender, instance, *args, **kwargs):
+    notify([instance.pk])
+
+def category_saved(sender, instance, created, *args, **kwargs):
+    if not created:
+        notify(instance.products.values_list('id', flat=True))
+
+# Antes de borrar una categoría se guardan sus productos, porque después la relación ya no existe.
+def category_deleting(sender, instance, *args, **kwargs):
+    instance._changed_product_ids = list(instance.products.values_list('id', flat=True))
+
+def category_deleted(sender, instance, *args, **kwargs):
+    notify(getattr(instance, '_changed_product_ids', []))
+
+def category_products_changed(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._changed_product_ids = list(instance.products.values_list('id', flat=True))
+
+    elif action == 'post_clear':
+        notify([instance.pk] if reverse else getattr(instance, '_changed_product_ids', []))
+
+    elif action in ('post_add', 'post_remove'):
+        notify([instance.pk] if reverse else pk_set)
+
+post_save.connect(product_saved, sender=Product)
+post_save.connect(category_saved, sender=Category)
+pre_delete.connect(category_deleting, sender=Category)
+post_delete.connect(category_deleted, sender=Category)
+m2m_changed.connect(category_products_changed, sender=Category.products.through)
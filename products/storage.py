@@ -0,0 +1,79 @@
+import hashlib  # Hash del contenido de los archivos subidos
+import os  # Para armar las rutas
+
+from django.core.files import File  # Para envolver contenidos que no son archivos de Django
+from django.core.files.storage import FileSystemStorage  # Almacenamiento base en disco
+from django.utils.deconstruct import deconstructible  # Para poder usarlo en las migraciones
+
+# Almacenamiento direccionado por contenido para las imágenes de los productos.
+# Cada archivo se guarda una sola vez bajo el hash de su contenido (`products/blobs/ab/abcd....jpg`):
+# si se sube dos veces la misma foto, la segunda subida reutiliza el archivo existente.
+# Cada archivo tiene un `MediaBlob` que cuenta cuántos productos lo usan; los que quedan sin
+# referencias se borran con el comando `gc_media_blobs`.
+
+CHUNK_SIZE = 64 * 1024
+
+BLOBS_DIR = 'blobs'
+
+
+class BlobExists(FileExistsError):
+    pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    # Calcula el sha256 leyendo el archivo por partes, sin cargarlo completo en memoria.
+    @staticmethod
+    def digest(content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        for chunk in content.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        return digest.hexdigest()
+
+    # Ruta del archivo según su contenido: <carpeta de upload_to>/blobs/<2 primeros>/<hash><extensión>.
+    def blob_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, BLOBS_DIR, digest[:2], digest + extension).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = self.digest(content)
+        name = self.blob_name(name, digest)
+
+        # Si otra subida guardó el mismo contenido al mismo tiempo, el archivo ya es el correcto.
+        if not self.exists(name):
+            try:
+                name = self._save(name, content)
+            except BlobExists:
+                pass
+
+        from .models import MediaBlob
+        MediaBlob.objects.get_or_create(name=name, defaults={'digest': digest, 'size': content.size})
+
+        return name
+
+    # El nombre ya es único por contenido: nunca se le agrega un sufijo. Si el archivo ya existe,
+    # tiene el mismo contenido y no hay que escribirlo.
+    def get_available_name(self, name, max_length=None):
+        if self.exists(name):
+            raise BlobExists(name)
+
+        return name
+
+
+def blob_storage():
+    return ContentAddressedStorage()
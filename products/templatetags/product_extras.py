@@ -1,7 +1,26 @@
 from django import template
 
+from products.images import SIZES, variant_url
+
 register = template.Library()
 
 @register.filter()
 def price_format(value):
-    return'${0:.2f}'.format(value)
\ No newline at end of file
+    return'${0:.2f}'.format(value)
+
+# URL de una imagen derivada del producto: {% image_variant product 'thumb' 'webp' %}
+@register.simple_tag()
+def image_variant(product, size, format='jpeg'):
+    return variant_url(product, size, format)
+
+# <picture> con la versión WebP y la JPEG de respaldo, al tamaño en que se muestra (la mitad del generado).
+@register.inclusion_tag('products/snippets/picture.html')
+def product_picture(product, size, alt='Imagen del producto'):
+    width, height = SIZES[size]
+    return {
+        'src': variant_url(product, size),
+        'webp': variant_url(product, size, 'webp'),
+        'alt': alt,
+        'width': width // 2,
+        'height': height // 2,
+    }
@@ -1,3 +1,981 @@
-from django.test import TestCase
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from categories.models import Category
+from users.models import User
+
+from . import cache, images, pages, pricing, search
+from .facets import FacetIndex, Selection, catalog_facets, ids_after, ids_before
+from .benchmark import create_catalog
+from .cards import rebuild_cards
+from .autocomplete import CatalogIndex, catalog
+from .forms import RepriceForm
+from .models import MediaBlob, Product, ProductCard
+from .views import media_blob
+from .pagination import NEXT, CursorPaginator, encode_cursor
+
+
+class ProductSearchTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+    def create_product(self, title, description='descripcion'):
+        return Product.objects.create(title=title, description=description,
+                                      price=Decimal('2.00'), image='products/producto.jpg')
+
+    def titles(self, query):
+        return [product.title for product in search.search(query)]
+
+    def test_title_matches_rank_above_description(self):
+        self.create_product('arepa de huevo', 'frita, rellena de bollo')
+        self.create_product('bollo de maiz')
+
+        self.assertEqual(self.titles('bollo'), ['bollo de maiz', 'arepa de huevo'])
+
+    def test_results_and_hits_in_one_query(self):
+        for i in range(15):
+            self.create_product('bollo {}'.format(i))
+
+        first = search.search('bollo', per_page=10)
+
+        with self.assertNumQueries(1):
+            page = search.search('bollo', per_page=10, cursor=first.next_cursor)
+
+        self.assertEqual(len(page), 5)
+        self.assertEqual(page.count, 15)
+        self.assertFalse(page.has_next())
+
+        previous = search.search('bollo', per_page=10, cursor=page.previous_cursor)
+        self.assertEqual([p.pk for p in previous], [p.pk for p in first])
+        self.assertFalse(previous.has_previous())
+
+    def test_hits_count_only_products_with_cards(self):
+        for i in range(3):
+            self.create_product('bollo {}'.format(i))
+        ProductCard.objects.filter(title='bollo 0').delete()
+
+        page = search.search('bollo')
+        self.assertEqual(len(page), 2)
+        self.assertEqual(page.count, 2)
+
+    def test_benchmark_catalog_has_cards(self):
+        products = create_catalog(50, 4)
+
+        self.assertEqual(ProductCard.objects.filter(product__in=products).count(), 50)
+        self.assertGreater(search.search(products[0].title.split()[0]).count, 0)
+
+    def test_products_are_not_duplicated_across_categories(self):
+        product = self.create_product('enyucado')
+        for title in ('dulces tipicos', 'dulces caseros'):
+            Category.objects.create(title=title, description='categoria').products.add(product)
+
+        page = search.search('dulces')
+
+        self.assertEqual([p.pk for p in page], [product.pk])
+        self.assertEqual(page.count, 1)
+
+    def test_index_follows_product_and_category_changes(self):
+        product = self.create_product('bollo preñao')
+        self.assertEqual(self.titles('prenao'), ['bollo preñao'])
+
+        product.title = 'bollo limpio'
+        product.save()
+        self.assertEqual(self.titles('prenao'), [])
+
+        category = Category.objects.create(title='costeños', description='categoria')
+        category.products.add(product)
+        self.assertEqual(self.titles('costenos'), ['bollo limpio'])
+
+        category.title = 'tipicos'
+        category.save()
+        self.assertEqual(self.titles('costenos'), [])
+        self.assertEqual(self.titles('tipicos'), ['bollo limpio'])
+
+        category.delete()
+        self.assertEqual(self.titles('tipicos'), [])
+
+        product.delete()
+        self.assertEqual(self.titles('bollo'), [])
+
+    def test_query_operators_are_escaped(self):
+        self.create_product('bollo de maiz')
+
+        self.assertEqual(self.titles('"bollo" OR NEAR(*'), [])
+        self.assertEqual(self.titles('bol mai'), ['bollo de maiz'])
+        self.assertEqual(search.search('  ?? ').count, 0)
+
+    def test_rebuild(self):
+        self.create_product('bollo de maiz')
+        Product.objects.update(title='arepa de huevo')
+
+        self.assertEqual(search.rebuild(), 1)
+        self.assertEqual(rebuild_cards(), 1)
+        self.assertEqual(self.titles('arepa'), ['arepa de huevo'])
+
+    def test_search_view_is_paginated(self):
+        for i in range(15):
+            self.create_product('bollo {}'.format(i))
+
+        response = self.client.get(reverse('products:search'), {'q': 'bollo'})
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('products:search'), {'q': 'bollo', 'cursor': cursor})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['count'], 15)
+        self.assertEqual(len(response.context['product_list']), 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+        response = self.client.get(reverse('products:search'), {'q': 'bollo', 'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogIndexTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        catalog.loaded = False
+        self.addCleanup(setattr, catalog, 'loaded', False)
+
+        for title in ('bollo de maiz', 'bollo preñao', 'arepa de huevo', 'carimañola'):
+            Product.objects.create(title=title, description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+        Category.objects.create(title='Fritos', description='categoria')
+
+    def titles(self, text):
+        return [title for title, _ in catalog.complete(text)]
+
+    def test_complete_by_word_prefix(self):
+        self.assertEqual(self.titles('bol'), ['bollo preñao', 'bollo de maiz'])
+        self.assertEqual(self.titles('Bollo pre'), ['bollo preñao'])
+        self.assertEqual(self.titles('hue'), ['arepa de huevo'])
+        self.assertEqual(self.titles('carimano'), ['carimañola'])
+        self.assertEqual(self.titles('pan'), [])
+
+    def test_index_follows_product_changes(self):
+        catalog.load()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title='bollo limpio', description='descripcion',
+                                             price=Decimal('2.00'), image='products/producto.jpg')
+        self.assertIn('bollo limpio', self.titles('bol'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.title = 'queso costeño'
+            product.save()
+        self.assertNotIn('bollo limpio', self.titles('bol'))
+        self.assertEqual(self.titles('cost'), ['queso costeño'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.titles('cost'), [])
+        self.assertIsNone(catalog.trie.root.children.get('q'))
+
+    def test_complete_ranks_every_candidate_under_a_large_prefix(self):
+        index = CatalogIndex()
+        index.loaded = True
+        # Los títulos más cortos quedan en ramas del trie que se recorren después de más de `limit * 50`
+        # productos con el mismo prefijo.
+        index.add_product(500, 'bollito', 'bollito')
+        index.add_product(501, 'bolsa', 'bolsa')
+        for i in range(500):
+            index.add_product(i, 'bollo{} relleno de queso costeño'.format(i), 'bollo-{}'.format(i))
+
+        self.assertEqual(index.complete('bol', limit=2), [('bolsa', 'bolsa'), ('bollito', 'bollito')])
+        self.assertEqual(len(index.complete('bollo', limit=600)), 500)
+
+    def test_correct_misspelled_words(self):
+        self.assertEqual(catalog.correct('bolo de mais'), 'bollo de maiz')
+        self.assertEqual(catalog.correct('fritoss'), 'fritos')
+        self.assertIsNone(catalog.correct('bollo'))
+        self.assertIsNone(catalog.correct('xyz'))
+
+    def test_autocomplete_view_does_not_query_database(self):
+        catalog.load()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('products:autocomplete'), {'q': 'bollo p'})
+
+        self.assertEqual(response.json(), {'results': [
+            {'title': 'bollo preñao', 'url': reverse('products:product', args=['bollo-prenao'])}
+        ]})
+
+    def test_search_view_corrects_typos(self):
+        response = self.client.get(reverse('products:search'), {'q': 'bolo'})
+
+        self.assertEqual(response.context['corrected_query'], 'bollo')
+        self.assertEqual(response.context['count'], 2)
+
+    def test_complete_is_served_from_memory(self):
+        index = CatalogIndex()
+        index.loaded = True
+        for i in range(20000):
+            index.add_product(i, 'producto {} bollo {}'.format(i, i % 97), 'producto-{}'.format(i))
+
+        # Con el índice cargado, autocompletar no consulta la base de datos.
+        with self.assertNumQueries(0):
+            results = index.complete('producto 1234')
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(results[0], ('producto 1234 bollo 70', 'producto-1234'))
+        self.assertTrue(all(title.startswith('producto 1234') for title, _ in results))
+
+
+class CatalogCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.reset_stats()
+
+        for i in range(5):
+            Product.objects.create(title='bollo {}'.format(i), description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+
+    def test_index_page_is_cached_until_catalog_changes(self):
+        response = self.client.get(reverse('index'))
+        self.assertEqual(len(response.context['product_list']), 3)
+        self.assertEqual(response.context['page_obj'].count, 5)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['page_obj'].count, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(title='arepa', description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['page_obj'].count, 6)
+        # Página y menú de categorías en la segunda petición.
+        self.assertEqual(cache.stats()['hits'], 2)
+        # Página, total (aparte) y menú de categorías en cada versión del catálogo.
+        self.assertEqual(cache.stats()['misses'], 6)
+
+    def test_search_is_cached_and_invalidated_by_categories(self):
+        self.client.get(reverse('products:search'), {'q': 'tipicos'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('products:search'), {'q': '  Tipicos '})
+        self.assertEqual(response.context['count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(title='tipicos', description='categoria')
+        with self.captureOnCommitCallbacks(execute=True):
+            category.products.add(*Product.objects.all()[:2])
+
+        response = self.client.get(reverse('products:search'), {'q': 'tipicos'})
+        self.assertEqual(response.context['count'], 2)
+
+    def test_version_survives_page_eviction(self):
+        version = cache.bump_version()
+
+        # Aunque el caché de páginas se llene y descarte todo, la versión no vuelve a empezar.
+        cache.get_cache().clear()
+        self.assertEqual(cache.catalog_version(), version)
+
+    def test_version_is_shared_between_processes(self):
+        version = cache.catalog_version()
+
+        subprocess.run([sys.executable, 'manage.py', 'catalog_cache', '--invalidate'],
+                       cwd=settings.BASE_DIR, check=True, capture_output=True)
+
+        self.assertEqual(cache.catalog_version(), version + 1)
+
+    def test_hits_are_published_in_batches(self):
+        cache.cached('catalog:test', lambda: 1)
+        for _ in range(cache.STATS_FLUSH_EVERY - 2):
+            cache.cached('catalog:test', lambda: 1)
+
+        self.assertIsNone(cache.get_meta_cache().get(cache.HITS_KEY))
+        self.assertEqual(cache.stats()['hits'], cache.STATS_FLUSH_EVERY - 2)
+
+        cache.cached('catalog:test', lambda: 1)
+        self.assertEqual(cache.get_meta_cache().get(cache.HITS_KEY), cache.STATS_FLUSH_EVERY - 1)
+        self.assertEqual(cache.stats(), {'version': cache.catalog_version(),
+                                         'hits': cache.STATS_FLUSH_EVERY - 1, 'misses': 1})
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(reverse('index'), {'cursor': 'x'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('index'), {'cursor': encode_cursor(NEXT, ['1'])}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('index'), {'cursor': encode_cursor(NEXT, [10 ** 6])}).status_code, 404)
+
+
+class CursorPaginatorTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+        self.products = [
+            Product.objects.create(title='producto {}'.format(i), description='descripcion',
+                                   price=Decimal('2.00'), image='products/producto.jpg')
+            for i in range(8)
+        ]
+
+    def test_walk_forward_and_back(self):
+        paginator = CursorPaginator(Product.objects.all(), 3)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+
+        self.assertEqual([[p.pk for p in page] for page in pages],
+                         [[p.pk for p in self.products[i:i + 3]] for i in (0, 3, 6)])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([p.pk for p in back], [p.pk for p in self.products[3:6]])
+        self.assertTrue(back.has_next())
+        self.assertTrue(back.has_previous())
+
+    def test_pages_do_not_count(self):
+        paginator = CursorPaginator(Product.objects.all(), 3)
+        cursor = paginator.page().next_cursor
+
+        with self.assertNumQueries(1):
+            page = paginator.page(cursor)
+        self.assertIsNone(page.count)
+
+    def test_index_view_walks_catalog(self):
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get(reverse('index'), {'cursor': cursor})
+            seen += [p.pk for p in response.context['product_list']]
+            cursor = response.context['page_obj'].next_cursor
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [p.pk for p in self.products])
+
+
+class ProductCardTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+        self.product = Product.objects.create(title='bollo de maiz', description='descripcion',
+                                              price=Decimal('2.50'), image='products/bollo.jpg')
+
+    def card(self):
+        return ProductCard.objects.get(pk=self.product.pk)
+
+    def test_card_follows_catalog_changes(self):
+        self.assertEqual(self.card().thumbnail_url, '/media/products/bollo.jpg')
+        self.assertEqual(self.card().price, Decimal('2.50'))
+
+        self.product.title = 'bollo limpio'
+        self.product.save()
+        self.assertEqual(self.card().title, 'bollo limpio')
+
+        category = Category.objects.create(title='tipicos', description='categoria')
+        category.products.add(self.product)
+        Category.objects.create(title='bollos', description='categoria').products.add(self.product)
+        self.assertEqual(self.card().categories, 'tipicos, bollos')
+
+        category.title = 'costeños'
+        category.save()
+        self.assertEqual(self.card().categories, 'costeños, bollos')
+
+        category.delete()
+        self.assertEqual(self.card().categories, 'bollos')
+
+        self.product.delete()
+        self.assertFalse(ProductCard.objects.exists())
+
+    def test_rebuild_cards_command(self):
+        ProductCard.objects.all().delete()
+
+        call_command('rebuild_product_cards', stdout=StringIO())
+
+        self.assertEqual(self.card().title, 'bollo de maiz')
+
+    def test_index_reads_only_cards(self):
+        # El índice de facetas se carga una sola vez por proceso, no en cada página.
+        catalog_facets.load()
+        self.addCleanup(setattr, catalog_facets, 'loaded', False)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+
+        self.assertContains(response, '$2.50')
+        page_query = queries.captured_queries[0]['sql']
+        self.assertIn(ProductCard._meta.db_table, page_query)
+        self.assertNotIn('description', page_query)
+        self.assertNotIn('JOIN', page_query)
+
+
+@override_settings(PRODUCT_IMAGES_ASYNC=False)
+class ProductImagesTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('bollo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def create_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(title='bollo de maiz', description='descripcion',
+                                          price=Decimal('2.00'), image=self.upload())
+
+    def test_upload_generates_hashed_variants(self):
+        product = self.create_product()
+        product.refresh_from_db()
+
+        self.assertEqual(product.image_variants['source'], product.image.name)
+        for size, dimensions in images.SIZES.items():
+            for format in images.FORMATS:
+                path = product.image_variants[size][format]
+                self.assertRegex(path, r'^products/derivatives/[0-9a-f]{2}/[0-9a-f]{16}\.%s\.%s$' % (size, format))
+                with default_storage.open(path) as file:
+                    self.assertEqual(Image.open(file).size, dimensions)
+
+        card = ProductCard.objects.get(pk=product.pk)
+        self.assertTrue(card.thumbnail_url.endswith('.card.jpeg'))
+        self.assertTrue(card.thumbnail_webp_url.endswith('.card.webp'))
+
+    def test_same_content_reuses_variants(self):
+        first = images.generate_variants(self.create_product().image.name)
+        second = images.generate_variants(self.create_product().image.name)
+
+        self.assertEqual(first['thumb'], second['thumb'])
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        product = self.create_product()
+        product.refresh_from_db()
+
+        with mock.patch('products.images.generate_variants') as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.title = 'bollo limpio'
+                product.save()
+
+        generate.assert_not_called()
+
+    def test_picture_tag(self):
+        product = self.create_product()
+        product.refresh_from_db()
+
+        html = Template("{% load product_extras %}{% product_picture product 'thumb' %}").render(
+            Context({'product': product})
+        )
+
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('.thumb.jpeg', html)
+        self.assertIn('width="60" height="60"', html)
+
+    def test_missing_file_falls_back_to_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title='arepa', description='descripcion',
+                                             price=Decimal('2.00'), image='products/no-existe.jpg')
+        product.refresh_from_db()
+
+        self.assertEqual(product.image_variants, {})
+        self.assertEqual(images.variant_url(product, 'thumb'), '/media/products/no-existe.jpg')
+        self.assertEqual(images.variant_url(product, 'thumb', 'webp'), '')
+
+    def test_backfill_command(self):
+        product = self.create_product()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+
+        product.refresh_from_db()
+        self.assertIn('thumb', product.image_variants)
+
+
+@override_settings(PRODUCT_IMAGES_ASYNC=False)
+class MediaBlobTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name='bollo.jpg', color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def create_product(self, **kwargs):
+        return Product.objects.create(title='bollo de maiz', description='descripcion',
+                                      price=Decimal('2.00'), image=self.upload(**kwargs))
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.create_product(name='bollo.jpg')
+        second = self.create_product(name='otra-foto.JPG')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/blobs/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.references, 2)
+        self.assertEqual(blob.size, first.image.size)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_references_follow_image_changes(self):
+        product = self.create_product()
+        old = product.image.name
+
+        product.image = self.upload(color='blue')
+        product.save()
+        self.assertEqual(MediaBlob.objects.get(name=old).references, 0)
+        self.assertEqual(MediaBlob.objects.get(name=product.image.name).references, 1)
+
+        product.title = 'bollo limpio'
+        product.save()
+        self.assertEqual(MediaBlob.objects.get(name=product.image.name).references, 1)
+
+        product.delete()
+        self.assertEqual(MediaBlob.objects.get(name=product.image.name).references, 0)
+
+    def test_gc_removes_unreferenced_blobs(self):
+        kept = self.create_product(color='red')
+        removed = self.create_product(color='blue')
+        path = removed.image.path
+        removed.delete()
+
+        call_command('gc_media_blobs', grace_hours=0, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(list(MediaBlob.objects.values_list('name', flat=True)), [kept.image.name])
+        self.assertTrue(os.path.exists(kept.image.path))
+
+    def test_gc_recount(self):
+        product = self.create_product()
+        MediaBlob.objects.update(references=0)
+
+        call_command('gc_media_blobs', grace_hours=0, recount=True, stdout=StringIO())
+
+        self.assertEqual(MediaBlob.objects.get(name=product.image.name).references, 1)
+
+    def test_blobs_are_served_as_immutable(self):
+        product = self.create_product()
+
+        response = media_blob(RequestFactory().get('/'), product.image.name)
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+
+class ProductPageCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.product = Product.objects.create(title='bollo de maiz', description='descripcion',
+                                              price=Decimal('2.00'), image='products/producto.jpg')
+        self.url = reverse('products:product', kwargs={'slug': self.product.slug})
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_category_changes_invalidate_the_page(self):
+        category = Category.objects.create(title='panes', description='panes')
+        etag = self.client.get(self.url)['ETag']
+
+        category.products.add(self.product)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        category.title = 'panaderia'
+        category.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_anonymous_pages_are_cached(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'bollo de maiz')
+
+        self.product.title = 'bollo limpio'
+        self.product.save()
+        self.assertContains(self.client.get(self.url), 'bollo limpio')
+
+    def test_catalog_changes_invalidate_cached_html(self):
+        self.client.get(self.url)
+
+        # Otro producto o categoría cambia: el HTML guardado (que incluye partes del resto del
+        # catálogo) deja de servirse.
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title='panes', description='panes')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertGreater(len(queries), 1)
+
+    def test_catalog_changes_invalidate_conditional_get(self):
+        # Last-Modified tiene resolución de segundos: el producto y el catálogo cambiaron hace una hora.
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=an_hour_ago)
+        cache.get_meta_cache().set(cache.CHANGED_AT_KEY, an_hour_ago)
+        response = self.client.get(self.url)
+
+        # El menú de categorías de la página cambia aunque el producto no: no se responde con 304.
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(title='panes', description='panes').products.add(
+                Product.objects.create(title='arepa', description='descripcion', price=Decimal('1.00'),
+                                       image='products/producto.jpg')
+            )
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+    def test_cached_page_has_the_visitor_csrf_token(self):
+        self.client.get(self.url)
+
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(self.url)
+        content = response.content.decode()
+        self.assertNotIn(pages.CSRF_PLACEHOLDER, content)
+
+        token = content.split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+        response = client.post(reverse('carts:add'), {'product_id': self.product.id, 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_authenticated_pages_are_not_shared(self):
+        anonymous = self.client.get(self.url)
+
+        user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+
+        self.assertNotEqual(response['ETag'], anonymous['ETag'])
+        self.assertContains(response, 'Logout')
+
+
+class CatalogImportTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_products(self, path, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_products', path, stdout=StringIO(), **options)
+
+    def test_import_csv(self):
+        Product.objects.create(title='bollo de maiz', description='descripcion',
+                               price=Decimal('2.00'), image='products/producto.jpg')
+        Category.objects.create(title='panes', description='panes')
+        path = self.write('catalogo.csv', (
+            'title,slug,description,price,image,categories\n'
+            'bollo de maiz,,con queso,3.50,products/producto.jpg,panes|fritos\n'
+            'bollo de maiz,,sin queso,2.50,products/producto.jpg,fritos\n'
+            'arepa,arepa-rellena,de huevo,4,,\n'
+        ))
+
+        self.import_products(path, batch_size=2)
+
+        self.assertEqual(Product.objects.count(), 4)
+        self.assertEqual(len(set(Product.objects.values_list('slug', flat=True))), 4)
+        self.assertTrue(Product.objects.filter(slug='arepa-rellena', price=Decimal('4')).exists())
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(Category.objects.get(title='fritos').products.count(), 2)
+        self.assertEqual(Category.objects.get(title='fritos').product_count, 2)
+        self.assertEqual(ProductCard.objects.count(), 4)
+        self.assertEqual(ProductCard.objects.get(product__description='con queso').categories, 'panes, fritos')
+        self.assertEqual(search.search('queso').count, 2)
+
+    def test_queries_do_not_grow_with_rows(self):
+        rows = ''.join('producto {},,descripcion,1,,panes\n'.format(i) for i in range(200))
+        path = self.write('catalogo.csv', 'title,slug,description,price,image,categories\n' + rows)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.import_products(path)
+
+        self.assertEqual(Product.objects.count(), 200)
+        self.assertLess(len(queries), 30)
+
+    def test_export_and_import_jsonl(self):
+        category = Category.objects.create(title='panes', description='panes')
+        product = Product.objects.create(title='bollo de maiz', description='descripcion',
+                                         price=Decimal('2.00'), image='products/producto.jpg')
+        category.products.add(product)
+        path = os.path.join(self.directory, 'catalogo.jsonl')
+
+        call_command('export_products', path, stdout=StringIO())
+        product.delete()
+        self.import_products(path)
+
+        imported = Product.objects.get()
+        self.assertEqual(imported.slug, product.slug)
+        self.assertEqual(imported.image.name, 'products/producto.jpg')
+        self.assertEqual(list(imported.category_set.all()), [category])
+
+    def test_invalid_rows_import_nothing(self):
+        path = self.write('catalogo.csv', (
+            'title,slug,description,price,image,categories\n'
+            'bollo de maiz,,con queso,3.50,,\n'
+            'arepa,,de huevo,gratis,,\n'
+        ))
+
+        with self.assertRaisesMessage(CommandError, 'Línea 2'):
+            self.import_products(path, batch_size=1)
+
+        self.assertFalse(Product.objects.exists())
+
+
+class RepricingTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.panes = Category.objects.create(title='panes', description='panes')
+        self.bollo = self.create_product('bollo de maiz', '2.50')
+        self.arepa = self.create_product('arepa', '10.00')
+        self.yuca = self.create_product('yuca frita', '4.20')
+        self.panes.products.add(self.bollo, self.arepa)
+
+    def create_product(self, title, price):
+        return Product.objects.create(title=title, description='descripcion',
+                                      price=Decimal(price), image='products/producto.jpg')
+
+    def prices(self):
+        return dict(Product.objects.values_list('title', 'price'))
+
+    def test_compute_prices(self):
+        rules = [pricing.Rule(pricing.PERCENT, -10, 'panes'), pricing.Rule(pricing.AMOUNT, '1.25')]
+        new = pricing.compute_prices([1, 2, 3], [250, 1000, 420], {'panes': [1, 2]}, rules)
+        self.assertEqual(list(new), [225, 900, 545])
+
+        new = pricing.compute_prices([1, 2, 3], [250, 1000, 420], {'panes': [1, 2]}, rules, round_99=True)
+        self.assertEqual(list(new), [199, 899, 499])
+
+        new = pricing.compute_prices([1, 2, 3], [250, 1000, 420], {'panes': [1, 2]}, rules[:1], floor=3, ceiling=8)
+        self.assertEqual(list(new), [300, 800, 420])
+
+    def test_round_99_keeps_zeros_and_limits(self):
+        rules = [pricing.Rule(pricing.PERCENT, 0)]
+
+        new = pricing.compute_prices([1, 2, 3], [0, 30, 420], {}, rules, round_99=True)
+        self.assertEqual(list(new), [0, 99, 399])
+
+        # Los límites se aplican antes de redondear y el precio final sigue terminando en .99 dentro de ellos.
+        new = pricing.compute_prices([1, 2, 3], [250, 1000, 420], {}, rules, round_99=True, floor=3, ceiling=8)
+        self.assertEqual(list(new), [399, 799, 399])
+
+        # Sin un .99 entre los límites, el precio queda en el límite.
+        new = pricing.compute_prices([1], [250], {}, rules, round_99=True, floor='3.00', ceiling='3.50')
+        self.assertEqual(list(new), [300])
+
+    def test_reprice_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reprice_products', rules=['panes:percent:20'], round_99=True, stdout=StringIO())
+
+        self.assertEqual(self.prices(), {
+            'bollo de maiz': Decimal('2.99'), 'arepa': Decimal('11.99'), 'yuca frita': Decimal('4.20'),
+        })
+        self.assertEqual(ProductCard.objects.get(product=self.arepa).price, Decimal('11.99'))
+        self.assertGreater(Product.objects.get(pk=self.arepa.pk).updated_at, self.arepa.updated_at)
+
+    def test_dry_run_and_invalid_rules(self):
+        call_command('reprice_products', rules=['percent:50'], dry_run=True, stdout=StringIO())
+        self.assertEqual(self.prices()['arepa'], Decimal('10.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('reprice_products', rules=['panes:double:2'], stdout=StringIO())
+
+    def test_floor_above_ceiling_is_rejected(self):
+        with self.assertRaises(ValueError):
+            pricing.compute_prices([1], [250], {}, [pricing.Rule(pricing.PERCENT, 10)], floor=5, ceiling=3)
+
+        with self.assertRaises(CommandError):
+            call_command('reprice_products', rules=['percent:10'], floor='5', ceiling='3', stdout=StringIO())
+
+        form = RepriceForm({'kind': pricing.PERCENT, 'value': '10', 'floor': '5', 'ceiling': '3'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('El precio mínimo no puede ser mayor que el precio máximo.', form.non_field_errors())
+
+        self.assertEqual(self.prices(), {
+            'bollo de maiz': Decimal('2.50'), 'arepa': Decimal('10.00'), 'yuca frita': Decimal('4.20'),
+        })
+
+    def test_admin_action(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        url = reverse('admin:products_product_changelist')
+        selected = {'action': 'reprice', '_selected_action': [self.yuca.pk]}
+
+        response = self.client.post(url, selected)
+        self.assertContains(response, 'Cambiar el precio de 1 producto(s)')
+
+        self.client.post(url, dict(selected, apply='1', kind=pricing.AMOUNT, value='-0.20'))
+        self.assertEqual(self.prices()['yuca frita'], Decimal('4.00'))
+
+
+class FacetIndexTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        catalog_facets.loaded = False
+        self.addCleanup(setattr, catalog_facets, 'loaded', False)
+
+        self.fritos = Category.objects.create(title='Fritos', description='categoria')
+        self.panes = Category.objects.create(title='Panes', description='categoria')
+
+        self.products = {}
+        for title, price, categories in (('carimañola', '3.00', [self.fritos]),
+                                         ('arepa de huevo', '6.00', [self.fritos]),
+                                         ('bollo de maiz', '4.00', [self.panes]),
+                                         ('pan de bono', '12.00', [self.panes, self.fritos]),
+                                         ('queso costeño', '30.00', [])):
+            product = Product.objects.create(title=title, description='descripcion',
+                                             price=Decimal(price), image='products/producto.jpg')
+            product.category_set.set(categories)
+            self.products[title] = product
+
+    def titles(self, response):
+        return [card.title for card in response.context['product_list']]
+
+    def facet_counts(self, response, name):
+        return {facet['title']: facet['count'] for facet in response.context['facets'][name]}
+
+    def test_search_and_counts(self):
+        bits, categories, prices = catalog_facets.search(Selection([self.fritos.pk], '0-5'))
+
+        self.assertEqual(bits, 1 << self.products['carimañola'].pk)
+        # Cada faceta se cuenta con el filtro de la otra.
+        self.assertEqual(categories, {self.fritos.pk: 1, self.panes.pk: 1})
+        self.assertEqual(prices, {'0-5': 1, '5-10': 1, '10-25': 1, '25-50': 0, '50+': 0})
+
+        bits, _, _ = catalog_facets.search(Selection([self.fritos.pk, self.panes.pk]))
+        self.assertEqual(bits.bit_count(), 4)
+
+    def test_index_reloads_when_another_process_changes_the_catalog(self):
+        _, categories, prices = catalog_facets.search(Selection())
+        self.assertEqual(categories[self.panes.pk], 2)
+
+        # Cambios sin señales en este proceso, como los que hace otro worker o un comando:
+        # solo llega la versión nueva del catálogo.
+        Category.products.through.objects.filter(category=self.panes).delete()
+        Product.objects.filter(pk=self.products['queso costeño'].pk).update(price=Decimal('3.00'))
+        cache.bump_version()
+
+        _, categories, prices = catalog_facets.search(Selection())
+        self.assertEqual(categories[self.panes.pk], 0)
+        self.assertEqual((prices['0-5'], prices['25-50']), (3, 0))
+
+    def test_bit_iteration(self):
+        bits = (1 << 3) | (1 << 7) | (1 << 64) | (1 << 200)
+
+        self.assertEqual(ids_after(bits, -1, 3), [3, 7, 64])
+        self.assertEqual(ids_after(bits, 7, 5), [64, 200])
+        self.assertEqual(ids_before(bits, 64, 5), [7, 3])
+        self.assertEqual(ids_before(bits, 3, 5), [])
+
+    def test_list_view_filters_and_paginates(self):
+        response = self.client.get(reverse('index'), {'categoria': self.fritos.pk})
+
+        self.assertEqual(self.titles(response), ['carimañola', 'arepa de huevo', 'pan de bono'])
+        self.assertEqual(response.context['page_obj'].count, 3)
+        self.assertEqual(self.facet_counts(response, 'prices'), {'0-5': 1, '5-10': 1, '10-25': 1})
+        self.assertEqual(self.facet_counts(response, 'categories'), {'Fritos': 3, 'Panes': 2})
+        self.assertNotIn('best_sellers', response.context)
+
+        response = self.client.get(reverse('index'), {'categoria': [self.fritos.pk, self.panes.pk], 'precio': '0-5'})
+        self.assertEqual(self.titles(response), ['carimañola', 'bollo de maiz'])
+        self.assertFalse(response.context['page_obj'].has_other_pages())
+
+        # Páginas siguiente y anterior dentro del filtro.
+        response = self.client.get(reverse('index'), {'categoria': [self.fritos.pk, self.panes.pk]})
+        self.assertEqual(self.titles(response), ['carimañola', 'arepa de huevo', 'bollo de maiz'])
+        next_cursor = response.context['page_obj'].next_cursor
+
+        response = self.client.get(reverse('index'), {'categoria': [self.fritos.pk, self.panes.pk], 'cursor': next_cursor})
+        self.assertEqual(self.titles(response), ['pan de bono'])
+        previous_cursor = response.context['page_obj'].previous_cursor
+
+        response = self.client.get(reverse('index'), {'categoria': [self.fritos.pk, self.panes.pk], 'cursor': previous_cursor})
+        self.assertEqual(self.titles(response), ['carimañola', 'arepa de huevo', 'bollo de maiz'])
+
+    def test_applying_a_facet_costs_one_query(self):
+        catalog_facets.load()
+        self.client.get(reverse('index'))  # Guarda el menú de categorías en el caché
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('index'), {'categoria': self.panes.pk, 'precio': '10-25'})
+        self.assertEqual(self.titles(response), ['pan de bono'])
+
+    def test_index_follows_catalog_changes(self):
+        catalog_facets.load()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(title='yuca frita', description='descripcion',
+                                             price=Decimal('2.00'), image='products/producto.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.category_set.add(self.fritos)
+        self.assertEqual(catalog_facets.search(Selection([self.fritos.pk], '0-5'))[0].bit_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.price = Decimal('60.00')
+            product.save()
+        _, _, prices = catalog_facets.search(Selection([self.fritos.pk]))
+        self.assertEqual((prices['0-5'], prices['50+']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.panes.delete()
+        _, categories, prices = catalog_facets.search(Selection())
+        self.assertEqual(categories, {self.fritos.pk: 3})
+        self.assertEqual(prices['50+'], 0)
+
+    def test_search_is_served_from_memory(self):
+        index = FacetIndex()
+        index.loaded, index.version = True, cache.catalog_version()
+        for i in range(1, 50001):
+            index.add_product(i, Decimal(i % 60), [i % 20, 20 + i % 7])
+
+        # Filtrar y contar son operaciones sobre los mapas de bits, sin consultas.
+        with self.assertNumQueries(0):
+            bits, categories, prices = index.search(Selection([1, 2, 3], '10-25'))
+
+        expected = [i for i in range(1, 50001) if i % 20 in (1, 2, 3) and 10 <= i % 60 < 25]
+        self.assertEqual(ids_after(bits, 0, len(expected) + 1), expected)
+        self.assertEqual(categories[1], len([i for i in range(1, 50001) if i % 20 == 1 and 10 <= i % 60 < 25]))
+        self.assertEqual(prices['10-25'], len(expected))
@@ -6,5 +6,6 @@ app_name = 'products'
 
 urlpatterns =[
     path('search',views.ProductSearchListView.as_view(),name='search'),
+    path('autocomplete', views.autocomplete, name='autocomplete'),
     path('<slug:slug>',views.ProductDetailView.as_view(), name='product'),
 ]
@@ -1,62 +1,221 @@
 from typing import Any  # Anotaciones de tipos opcionales
 from django.db.models.query import QuerySet  # Anotaciones de tipos para QuerySet
 from django.shortcuts import render  # Para renderizar plantillas
-from django.db.models import Q  # Para construir consultas complejas
+from django.http import Http404, HttpResponse, JsonResponse  # Para páginas inexistentes y respuestas HTML y JSON
+from django.urls import reverse  # Para construir la URL de cada producto
+from django.utils.http import urlencode  # Para los enlaces de las facetas
+from django.conf import settings  # Carpeta de los archivos de media
+from django.views.static import serve  # Para servir archivos de media en desarrollo
+from django.views.decorators.http import condition  # Respuestas 304 con ETag y Last-Modified
+from django.utils.decorators import method_decorator  # Para decorar vistas basadas en clases
 
 from django.views.generic.list import ListView  # Vista genérica para listar objetos
 from django.views.generic.detail import DetailView  # Vista genérica para detalles de objetos
 
-from products.models import Product  # Modelo de producto
+from products.models import Product, ProductCard  # Modelos de producto y de tarjeta para los listados
+from products import search  # Índice de búsqueda de productos
+from products import cache  # Caché versionado del catálogo
+from products import pages  # Caché HTTP de las páginas de detalle
+from products.pagination import CursorPaginator, InvalidCursor, decode_cursor  # Paginación por cursor
+from products.autocomplete import catalog  # Índice en memoria para autocompletar y corregir
+from products.facets import PRICE_BANDS, Selection, catalog_facets  # Filtros por categoría y precio
+from sales import leaderboard  # Más vendidos a partir de los contadores de ventas
+from popularity.buffer import count_views  # Visitas por producto, acumuladas en memoria
 
-from pprint import pprint
+# Mixin para listados paginados por cursor cuyas páginas se guardan en el caché del catálogo.
+# Cada vista define `cache_key` y `load_page`, que retorna (CursorPage, contexto extra).
+class CursorPageMixin:
+    cursor_kwarg = 'cursor'
+    extra_page_context = {}
+
+    # Cursor opaco desde los parámetros GET ('' para la primera página); 404 si está mal formado
+    def get_cursor(self):
+        cursor = self.request.GET.get(self.cursor_kwarg) or ''
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor:
+            raise Http404('Página inválida')
+
+        return cursor
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.get_cursor()
+        try:
+            page, self.extra_page_context = cache.cached(
+                self.cache_key(cursor, page_size), lambda: self.load_page(cursor, page_size)
+            )
+        except InvalidCursor:
+            raise Http404('Página inválida')
+
+        if cursor and not page.object_list:
+            raise Http404('Página inválida')
+
+        return None, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.extra_page_context)
+        return context
 
 # Vista para listar productos
-class ProductListView(ListView):
+# Se puede filtrar por categorías (?categoria=1&categoria=2) y por banda de precio (?precio=5-10).
+# Los filtros y sus conteos salen del índice de facetas en memoria (ver `products.facets`).
+class ProductListView(CursorPageMixin, ListView):
     template_name = 'index.html'  # Plantilla a utilizar
-    queryset = Product.objects.all().order_by('id')  # Lista de productos, ordenados por 'id'
+    queryset = ProductCard.objects.all().order_by('pk')  # Tarjetas de los productos, ordenadas por id del producto
+    context_object_name = 'product_list'  # Nombre que usan las plantillas
     paginate_by = 3  # Muestra 1 producto por página
 
+    # Facetas elegidas desde los parámetros GET (los ids que no son números se ignoran)
+    def selection(self):
+        categories = [int(id) for id in self.request.GET.getlist('categoria') if id.isdigit()]
+        return Selection(categories, self.request.GET.get('precio'))
+
+    def cache_key(self, cursor, page_size):
+        return cache.page_key('index:' + self.selection().key(), cursor, page_size)
+
+    # Sin filtros trae la página por cursor; el total se guarda aparte en el caché (no hay COUNT(*) por página).
+    # Con filtros, la página sale de la intersección de los mapas de bits y una consulta de tarjetas por id.
+    def load_page(self, cursor, page_size):
+        selection = self.selection()
+        bits, category_counts, price_counts = catalog_facets.search(selection)
+
+        if selection:
+            page = catalog_facets.page(bits, page_size, cursor)
+        else:
+            count = lambda: cache.cached(cache.page_key('index-count', '', 0), self.queryset.count)
+            page = CursorPaginator(self.queryset, page_size, count).page(cursor)
+
+        return page, {
+            'category_counts': category_counts,
+            'price_counts': price_counts,
+            'category_titles': dict(catalog_facets.titles),
+        }
+
+    # Enlaces para agregar o quitar cada valor de faceta, con su conteo
+    def facets(self, selection):
+        counts = self.extra_page_context
+
+        def url(categories, price):
+            return '?' + urlencode([('categoria', id) for id in sorted(categories)] + ([('precio', price)] if price else []))
+
+        categories = []
+        for id, title in sorted(counts['category_titles'].items(), key=lambda item: item[1]):
+            selected = id in selection.categories
+            count = counts['category_counts'].get(id, 0)
+            if count or selected:
+                toggled = set(selection.categories) ^ {id}
+                categories.append({'title': title, 'count': count, 'selected': selected,
+                                   'url': url(toggled, selection.price)})
+
+        prices = []
+        for key, low, high in PRICE_BANDS:
+            selected = key == selection.price
+            count = counts['price_counts'].get(key, 0)
+            if count or selected:
+                prices.append({'title': key, 'count': count, 'selected': selected,
+                               'url': url(selection.categories, None if selected else key)})
+
+        return {'categories': categories, 'prices': prices, 'query': url(selection.categories, selection.price)[1:]}
+
     # Añadir datos adicionales al contexto de la vista
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)  # Obtener el contexto básico
-        print("\n\n\n")
-        pprint( context)
-        print("\n\n\n")
         context['message'] = 'Listado de Producto'  # Mensaje personalizado
-        print("\n\n\n")
-        pprint( context)
-        print("\n\n\n")
+
+        selection = self.selection()
+        context['facets'] = self.facets(selection)  # Filtros con sus conteos
+        context['facets_selected'] = bool(selection)
+
+        # Más vendidos de la semana, solo en la primera página sin filtros
+        if not self.get_cursor() and not selection:
+            context['best_sellers'] = leaderboard.top_products(days=7, limit=4)
 
         return context
 
 # Vista para mostrar los detalles de un producto
+# El navegador revalida la página con ETag/Last-Modified y recibe un 304 si el producto no cambió.
+# A los visitantes anónimos se les sirve el HTML guardado en el caché (ver `products.pages`).
+# Todas las páginas servidas (también las del caché y los 304) cuentan como visita (ver `popularity`).
+@method_decorator(count_views, name='dispatch')
+@method_decorator(condition(etag_func=pages.product_etag, last_modified_func=pages.product_last_modified), name='dispatch')
 class ProductDetailView(DetailView):
     model = Product  # Modelo que se mostrará
     template_name = 'products/product.html'  # Plantilla para el detalle del producto
 
+    def get(self, request, *args, **kwargs):
+        slug = kwargs['slug']
+        if not pages.is_cacheable(request, slug):
+            return super().get(request, *args, **kwargs)
+
+        key = pages.page_key(request, slug)
+        html = pages.get_page(key)
+
+        if html is None:
+            response = super().get(request, *args, **kwargs)
+            html = response.render().content.decode(response.charset)
+            pages.set_page(key, html)
+
+        return HttpResponse(pages.render_page(request, html))
+
     # Añadir datos adicionales al contexto de la vista
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)  # Obtener el contexto básico
-        print(context)  # Imprimir contexto para depuración
+
+        # En la página que se guarda, el token CSRF queda como marcador (se reemplaza en cada petición)
+        if pages.is_cacheable(self.request, self.kwargs['slug']):
+            context['csrf_token'] = pages.CSRF_PLACEHOLDER
+
         return context
 
 # Vista para buscar productos
-class ProductSearchListView(ListView):
+class ProductSearchListView(CursorPageMixin, ListView):
     template_name = 'products/search.html'  # Plantilla para los resultados de búsqueda
+    paginate_by = 12  # Resultados por página
+    context_object_name = 'product_list'  # Nombre que usan las plantillas
 
-    # Filtrar los productos según el término de búsqueda
+    # La búsqueda y la paginación se resuelven juntas en `load_page`.
     def get_queryset(self):
-        filters = Q(title__icontains=self.query()) | Q(category__title__icontains=self.query())  # Filtra por título o categoría
-        return Product.objects.filter(filters)  # Retorna el queryset filtrado
+        return Product.objects.none()
+
+    def cache_key(self, cursor, page_size):
+        return cache.search_key(self.query(), cursor, page_size)
+
+    # Busca en el índice FTS5: trae la página ordenada por relevancia y el total de resultados en una consulta
+    def load_page(self, cursor, page_size):
+        page = search.search(self.query(), page_size, cursor)
+
+        # Sin resultados: intenta de nuevo corrigiendo las palabras mal escritas
+        corrected_query = None
+        if not page.count:
+            corrected_query = catalog.correct(self.query())
+            if corrected_query:
+                page = search.search(corrected_query, page_size, cursor)
+
+        return page, {'corrected_query': corrected_query}
 
     # Extraer el término de búsqueda desde los parámetros GET
     def query(self):
-        return self.request.GET.get('q')  # Retorna el valor de 'q' en la URL
+        return self.request.GET.get('q', '')  # Retorna el valor de 'q' en la URL
 
     # Añadir datos adicionales al contexto de la vista
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)  # Obtener el contexto básico
         context['query'] = self.query()  # Añadir el término de búsqueda al contexto
-        context['count'] = context['product_list'].count()  # Contar los productos encontrados
-        print(context)  # Imprimir contexto para depuración
+        context['count'] = context['page_obj'].count  # Total de productos encontrados (ya calculado)
         return context
+
+# Vista para autocompletar el buscador: responde desde el índice en memoria, sin consultar la base de datos
+def autocomplete(request):
+    results = [
+        {'title': title, 'url': reverse('products:product', args=[slug])}
+        for title, slug in catalog.complete(request.GET.get('q', ''))
+    ]
+    return JsonResponse({'results': results})
+
+# Sirve (en desarrollo) los archivos direccionados por contenido: su nombre cambia si cambia el contenido,
+# así que el navegador los puede guardar indefinidamente. En producción estas cabeceras las pone el servidor web.
+def media_blob(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
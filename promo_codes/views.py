@@ -4,19 +4,17 @@ from django.http import JsonResponse
 
 from .models import PromoCode
 
-from carts.utils import get_or_create_cart
-from orders.utils import get_or_created_order
 # Create your views here.
 def validate(request):
-    cart = get_or_create_cart(request)
-    order = get_or_created_order(cart,request)
+    # Orden abierta de la petición, resuelta por `CartMiddleware` (falsa si no hay ninguna).
+    order = request.order
 
     code = request.GET.get('code')
     promo_code = PromoCode.objects.get_valid(code)
     print('el promo_code es:',promo_code)
     print('el code es : ', code)
 
-    if promo_code is None:
+    if promo_code is None or not order:
         return JsonResponse({
             'status': False
 
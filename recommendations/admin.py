@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import Recommendation
+# Register your models here.
+
+class RecommendationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'rank', 'recommended', 'score')
+
+admin.site.register(Recommendation, RecommendationAdmin)
@@ -0,0 +1,126 @@
+import numpy as np  # Matriz de co-ocurrencias dispersa (pares y conteos en arreglos)
+
+from django.conf import settings  # Cantidad de vecinos por producto
+from django.db import transaction  # Cada corrida se aplica completa o no se aplica
+from django.utils import timezone  # Fecha de modificación de los productos
+
+from products.models import Product
+from orders.common import OrderStatus
+from orders.models import Order, OrderLine
+
+from .models import CoPurchase, ProcessedOrder, Recommendation
+
+# Cálculo por lotes de las recomendaciones "comprados juntos".
+# Las lineas de las órdenes completadas nuevas se convierten en pares (producto, otro producto de la
+# misma orden) con operaciones vectorizadas de NumPy, se cuentan, se suman a la matriz guardada en
+# `CoPurchase` y se recalculan los K vecinos solo de los productos que aparecieron en esas órdenes.
+
+CHUNK_SIZE = 1000  # Ids por consulta (límite de variables de SQLite)
+
+
+def chunks(ids, size=CHUNK_SIZE):
+    ids = [int(id) for id in ids]
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+# Todos los pares (a, b), a != b, de productos de la misma orden, sin recorrer las órdenes en Python.
+# Recibe un arreglo de órdenes y uno de productos (pares orden-producto sin repetir).
+def order_pairs(orders, products):
+    order = np.lexsort((products, orders))
+    orders, products = orders[order], products[order]
+
+    # Inicio y tamaño del grupo de cada orden, repetidos para cada uno de sus productos.
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+    group_start = np.repeat(starts, sizes)
+    group_size = np.repeat(sizes, sizes)
+
+    # Cada producto se combina con todos los de su grupo (incluido él mismo, que se descarta).
+    left = np.repeat(np.arange(len(orders)), group_size)
+    block_start = np.repeat(np.cumsum(group_size) - group_size, group_size)
+    right = np.repeat(group_start, group_size) + np.arange(len(left)) - block_start
+
+    keep = left != right
+    return products[left[keep]], products[right[keep]]
+
+# Cuenta los pares repetidos: retorna (a, b, conteo) sin repetidos.
+def count_pairs(a, b, counts=None):
+    keys, inverse = np.unique(np.stack([a, b], axis=1), axis=0, return_inverse=True)
+    weights = np.ones(len(a), dtype=np.int64) if counts is None else counts
+    return keys[:, 0], keys[:, 1], np.bincount(inverse.ravel(), weights=weights).astype(np.int64)
+
+# Los `k` vecinos con más conteo de cada producto (empates por id). Retorna (a, b, conteo, rango).
+def top_neighbours(a, b, counts, k):
+    order = np.lexsort((b, -counts, a))
+    a, b, counts = a[order], b[order], counts[order]
+
+    starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    rank = np.arange(len(a)) - np.repeat(starts, np.diff(np.r_[starts, len(a)]))
+
+    keep = rank < k
+    return a[keep], b[keep], counts[keep], rank[keep]
+
+
+# Suma las órdenes completadas que faltan a la matriz y recalcula las recomendaciones afectadas.
+# Con `full` vuelve a calcular todo desde cero. Retorna (órdenes procesadas, productos actualizados).
+def refresh(full=False, top_k=None):
+    top_k = top_k or getattr(settings, 'RECOMMENDATIONS_TOP_K', 10)
+
+    with transaction.atomic():
+        if full:
+            CoPurchase.objects.all().delete()
+            Recommendation.objects.all().delete()
+            ProcessedOrder.objects.all().delete()
+
+        orders = Order.objects.filter(status=OrderStatus.COMPLETED).exclude(
+            pk__in=ProcessedOrder.objects.values('order')
+        )
+        order_ids = list(orders.values_list('id', flat=True))
+        lines = np.array([
+            row for ids in chunks(order_ids)
+            for row in OrderLine.objects.filter(order_id__in=ids, product__isnull=False)
+            .values_list('order_id', 'product_id').distinct()
+        ], dtype=np.int64).reshape(-1, 2)
+
+        ProcessedOrder.objects.bulk_create([ProcessedOrder(order_id=id) for id in order_ids], batch_size=CHUNK_SIZE)
+
+        a, b = order_pairs(lines[:, 0], lines[:, 1])
+        if not len(a):
+            return len(order_ids), 0
+
+        a, b, counts = count_pairs(a, b)
+        affected = np.unique(a)
+
+        # Suma los conteos nuevos a los guardados de los productos afectados.
+        stored = np.array([
+            row for ids in chunks(affected)
+            for row in CoPurchase.objects.filter(product_id__in=ids).values_list('product_id', 'other_id', 'count')
+        ], dtype=np.int64).reshape(-1, 3)
+        merged_a, merged_b, merged_counts = count_pairs(
+            np.r_[stored[:, 0], a], np.r_[stored[:, 1], b], np.r_[stored[:, 2], counts]
+        )
+
+        # Solo se escriben los pares que recibieron conteos nuevos (clave a * base + b para compararlos).
+        base = int(max(merged_a.max(), merged_b.max())) + 1
+        changed = np.isin(merged_a * base + merged_b, a * base + b)
+        CoPurchase.objects.bulk_create([
+            CoPurchase(product_id=product, other_id=other, count=count)
+            for product, other, count in zip(merged_a[changed].tolist(), merged_b[changed].tolist(),
+                                             merged_counts[changed].tolist())
+        ], batch_size=CHUNK_SIZE, update_conflicts=True, unique_fields=['product', 'other'], update_fields=['count'])
+
+        # Reemplaza los vecinos de los productos afectados.
+        for ids in chunks(affected):
+            Recommendation.objects.filter(product_id__in=ids).delete()
+
+        neighbours = top_neighbours(merged_a, merged_b, merged_counts, top_k)
+        Recommendation.objects.bulk_create([
+            Recommendation(product_id=product, recommended_id=other, score=count, rank=rank)
+            for product, other, count, rank in zip(*(array.tolist() for array in neighbours))
+        ], batch_size=CHUNK_SIZE)
+
+        # Las páginas de detalle guardadas en caché muestran las recomendaciones: se invalidan.
+        for ids in chunks(affected):
+            Product.objects.filter(id__in=ids).update(updated_at=timezone.now())
+
+        return len(order_ids), len(affected)
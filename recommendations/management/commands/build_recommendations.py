@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recommendations.cooccurrence import refresh
+
+
+class Command(BaseCommand):
+    help = ('Suma las órdenes completadas desde la última corrida a la matriz de productos comprados juntos '
+            'y actualiza las recomendaciones de los productos afectados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Vuelve a calcular todo desde cero.')
+        parser.add_argument('--top-k', type=int, default=getattr(settings, 'RECOMMENDATIONS_TOP_K', 10),
+                            help='Recomendaciones guardadas por producto.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        orders, products = refresh(options['full'], options['top_k'])
+
+        self.stdout.write('Órdenes procesadas: {} - Productos actualizados: {} ({:.2f} s)'.format(
+            orders, products, time.perf_counter() - start
+        ))
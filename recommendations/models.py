@@ -0,0 +1,67 @@
+from django.db import models
+from django.db.models import Sum
+
+from products.models import Product, ProductCard
+from orders.models import Order
+
+# "Comprados juntos frecuentemente": la matriz producto x producto de co-ocurrencias en las órdenes
+# completadas se calcula por lotes (comando `build_recommendations`, ver `recommendations.cooccurrence`).
+# `CoPurchase` guarda la matriz dispersa (solo los pares que aparecieron) para sumarle las órdenes
+# nuevas en cada corrida, y `Recommendation` los K vecinos de cada producto, que es lo que leen las
+# páginas con una sola consulta por el índice (product, rank).
+
+# Par de productos comprados en la misma orden y cuántas órdenes los tienen. Se guarda en ambos sentidos.
+class CoPurchase(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='unique_copurchase'),
+        ]
+
+    def __str__(self):
+        return '{} + {}: {}'.format(self.product_id, self.other_id, self.count)
+
+
+class RecommendationManager(models.Manager):
+
+    # Tarjetas recomendadas para un producto, en orden.
+    def for_product(self, product, limit=4):
+        return [
+            recommendation.recommended
+            for recommendation in self.filter(product=product).select_related('recommended').order_by('rank')[:limit]
+        ]
+
+    # Tarjetas recomendadas para un conjunto de productos (un carrito): suma los puntajes de los vecinos
+    # de cada producto y descarta los que ya están en el conjunto.
+    def for_products(self, product_ids, limit=4):
+        product_ids = list(product_ids)
+        return list(
+            ProductCard.objects.filter(recommended_by__product_id__in=product_ids).exclude(pk__in=product_ids)
+            .annotate(score=Sum('recommended_by__score')).order_by('-score', 'pk')[:limit]
+        )
+
+
+class Recommendation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(ProductCard, on_delete=models.CASCADE, related_name='recommended_by')
+    score = models.PositiveIntegerField()  # Órdenes en las que se compraron juntos
+    rank = models.PositiveSmallIntegerField()  # 0 para el vecino más frecuente
+
+    objects = RecommendationManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return '{} -> {}'.format(self.product_id, self.recommended_id)
+
+
+# Orden completada que ya se sumó a la matriz; la siguiente corrida solo procesa las que no están aquí.
+class ProcessedOrder(models.Model):
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,21 @@
+from django import template
+
+from recommendations.models import Recommendation
+
+register = template.Library()
+
+# Productos comprados junto con el producto: {% bought_together product %}
+@register.inclusion_tag('recommendations/snippets/list.html')
+def bought_together(product, limit=4):
+    return {
+        'title': 'Frecuentemente comprados juntos',
+        'product_list': Recommendation.objects.for_product(product, limit),
+    }
+
+# Productos que suelen comprarse con los del carrito: {% cart_recommendations cart %}
+@register.inclusion_tag('recommendations/snippets/list.html')
+def cart_recommendations(cart, limit=4):
+    return {
+        'title': 'También te puede interesar',
+        'product_list': Recommendation.objects.for_products([cp.product_id for cp in cart.products_related()], limit),
+    }
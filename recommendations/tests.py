@@ -0,0 +1,104 @@
+from decimal import Decimal
+from io import StringIO
+
+import numpy as np
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from users.models import User
+from products.models import Product
+from orders.common import OrderStatus
+from orders.models import Order, OrderLine
+
+from .cooccurrence import count_pairs, order_pairs, refresh, top_neighbours
+from .models import CoPurchase, ProcessedOrder, Recommendation
+
+
+class CoOccurrenceTestCase(TestCase):
+
+    def test_order_pairs(self):
+        a, b = order_pairs(np.array([1, 1, 1, 2, 2, 3]), np.array([10, 20, 30, 10, 20, 40]))
+        a, b, counts = count_pairs(a, b)
+
+        pairs = {(x, y): count for x, y, count in zip(a.tolist(), b.tolist(), counts.tolist())}
+        self.assertEqual(pairs, {
+            (10, 20): 2, (20, 10): 2, (10, 30): 1, (30, 10): 1, (20, 30): 1, (30, 20): 1,
+        })
+
+    def test_top_neighbours(self):
+        a, b, counts, rank = top_neighbours(np.array([1, 1, 1, 2]), np.array([4, 3, 2, 1]),
+                                            np.array([1, 5, 1, 2]), 2)
+
+        self.assertEqual(list(zip(a.tolist(), b.tolist(), rank.tolist())), [(1, 3, 0), (1, 2, 1), (2, 1, 0)])
+
+
+class RecommendationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.bollo, self.queso, self.arepa, self.yuca = [
+            Product.objects.create(title=title, description='descripcion', price=Decimal('2.00'),
+                                   image='products/producto.jpg')
+            for title in ('bollo', 'queso', 'arepa', 'yuca')
+        ]
+
+    def complete_order(self, *products):
+        order = Order.objects.create(user=self.user, status=OrderStatus.COMPLETED)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, product=product, title=product.title, unit_price=product.price,
+                      quantity=1, line_total=product.price)
+            for product in products
+        ])
+        return order
+
+    def recommended(self, product):
+        return [card.title for card in Recommendation.objects.for_product(product)]
+
+    def test_incremental_refresh(self):
+        self.complete_order(self.bollo, self.queso)
+        self.complete_order(self.bollo, self.queso, self.arepa)
+        Order.objects.create(user=self.user)
+
+        self.assertEqual(refresh(), (2, 3))
+        self.assertEqual(self.recommended(self.bollo), ['queso', 'arepa'])
+        self.assertEqual(refresh(), (0, 0))
+
+        self.complete_order(self.bollo, self.arepa)
+        self.complete_order(self.bollo, self.arepa)
+        self.assertEqual(refresh(), (2, 2))
+
+        self.assertEqual(self.recommended(self.bollo), ['arepa', 'queso'])
+        self.assertEqual(self.recommended(self.queso), ['bollo', 'arepa'])
+        self.assertEqual(CoPurchase.objects.get(product=self.bollo, other=self.arepa).count, 3)
+
+        incremental = set(Recommendation.objects.values_list('product_id', 'recommended_id', 'score', 'rank'))
+        call_command('build_recommendations', full=True, stdout=StringIO())
+        self.assertEqual(set(Recommendation.objects.values_list('product_id', 'recommended_id', 'score', 'rank')),
+                         incremental)
+        self.assertEqual(ProcessedOrder.objects.count(), 4)
+
+    def test_recommendations_are_one_query(self):
+        self.complete_order(self.bollo, self.queso, self.arepa)
+        refresh()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Recommendation.objects.for_product(self.bollo)), 2)
+
+        with self.assertNumQueries(1):
+            cards = Recommendation.objects.for_products([self.bollo.id, self.queso.id])
+        self.assertEqual([card.title for card in cards], ['arepa'])
+
+    def test_pages_show_recommendations(self):
+        self.complete_order(self.bollo, self.queso)
+        refresh()
+
+        response = self.client.get(reverse('products:product', args=[self.bollo.slug]))
+        self.assertContains(response, 'Frecuentemente comprados juntos')
+        self.assertContains(response, reverse('products:product', args=[self.queso.slug]))
+
+        self.client.post(reverse('carts:add'), {'product_id': self.queso.id})
+        response = self.client.get(reverse('carts:cart'))
+        self.assertContains(response, 'También te puede interesar')
+        self.assertContains(response, reverse('products:product', args=[self.bollo.slug]))
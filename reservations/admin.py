@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from .models import StockReservation
+# Register your models here.
+
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'cart', 'quantity', 'expires_at')
+
+admin.site.register(StockReservation, StockReservationAdmin)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reservations.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al stock las unidades de las reservas vencidas (carritos abandonados).'
+
+    def handle(self, *args, **options):
+        released = StockReservation.objects.release_expired()
+        self.stdout.write('Unidades devueltas al stock: {}'.format(released))
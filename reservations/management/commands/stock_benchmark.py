@@ -0,0 +1,93 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from carts.models import Cart
+from products.models import Product
+from reservations.models import OutOfStock, StockReservation, take_stock
+
+
+# Forma anterior (para comparar): lee el stock y después escribe el nuevo valor.
+def read_then_write(cart, product_id):
+    stock = Product.objects.filter(pk=product_id).values_list('stock', flat=True).get()
+    if stock < 1:
+        return False
+
+    Product.objects.filter(pk=product_id).update(stock=stock - 1)
+    return True
+
+def conditional_update(cart, product_id):
+    return take_stock(product_id, 1)
+
+def reservation(cart, product_id):
+    try:
+        StockReservation.objects.reserve(cart, Product(pk=product_id), 1)
+    except OutOfStock:
+        return False
+
+    return True
+
+STRATEGIES = {
+    'read-then-write': read_then_write,
+    'conditional': conditional_update,
+    'reservation': reservation,
+}
+
+
+class Command(BaseCommand):
+    help = ('Varios hilos compran el mismo producto a la vez para medir si se vende más stock del que hay '
+            'y cuántos intentos por segundo se procesan. Los datos se crean en la base de datos '
+            '(los hilos usan conexiones distintas) y se borran al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=200, help='Unidades disponibles del producto.')
+        parser.add_argument('--threads', type=int, default=8, help='Compradores simultáneos.')
+        parser.add_argument('--attempts', type=int, default=50, help='Intentos de compra por hilo.')
+        parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<16} {:>8} {:>8} {:>12} {:>12}'.format('estrategia', 'vendidas', 'stock', 'sobreventa', 'intentos/s'))
+
+        for name in options['strategies']:
+            sold, stock, seconds = self.run(STRATEGIES[name], options['stock'], options['threads'], options['attempts'])
+            total_attempts = options['threads'] * options['attempts']
+            self.stdout.write('{:<16} {:>8} {:>8} {:>12} {:>12.0f}'.format(
+                name, sold, stock, max(sold - options['stock'], 0), total_attempts / seconds
+            ))
+
+    def run(self, strategy, stock, threads, attempts):
+        product = Product.objects.create(title='benchmark stock', description='benchmark', stock=stock,
+                                         image='products/benchmark.jpg')
+        carts = [Cart.objects.create() for _ in range(threads)]
+        barrier = threading.Barrier(threads)
+        sold = []
+
+        def buy(cart):
+            count = 0
+            try:
+                barrier.wait()
+                for _ in range(attempts):
+                    if strategy(cart, product.pk):
+                        count += 1
+            finally:
+                sold.append(count)
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(cart,)) for cart in carts]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        seconds = time.perf_counter() - start
+
+        product.refresh_from_db()
+        remaining = product.stock
+
+        StockReservation.objects.filter(product=product).delete()
+        Cart.objects.filter(pk__in=[cart.pk for cart in carts]).delete()
+        product.delete()
+
+        return sum(sold), remaining, seconds
@@ -0,0 +1,139 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.signals import pre_delete
+from django.utils import timezone
+
+from products.models import Product
+from carts.models import Cart, CartProducts
+
+from orders.common import OrderStatus
+
+# Reservas de inventario de los carritos.
+# Al agregar un producto al carrito se descuenta su stock con un UPDATE condicional
+# (`stock >= cantidad`), sin leerlo antes: si dos compradores piden las últimas unidades al mismo
+# tiempo, solo uno de los UPDATE afecta la fila. Lo descontado queda en una reserva del carrito
+# que vence a los STOCK_RESERVATION_MINUTES; al completar la orden la reserva se consume, y al
+# cancelarla, quitar el producto o vencer, las unidades vuelven al stock.
+# Los productos con `stock` nulo no llevan inventario: el UPDATE no les cambia nada.
+
+class OutOfStock(Exception):
+    pass
+
+
+def expiration():
+    return timezone.now() + timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_MINUTES', 30))
+
+# Descuenta `quantity` unidades del stock solo si alcanzan. Retorna True si se descontaron.
+def take_stock(product_id, quantity):
+    return Product.objects.filter(
+        Q(stock__gte=quantity) | Q(stock__isnull=True), pk=product_id
+    ).update(stock=F('stock') - quantity) > 0
+
+def return_stock(product_id, quantity):
+    Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity)
+
+
+class StockReservationManager(models.Manager):
+
+    # Reserva `quantity` unidades más del producto para el carrito. Lanza OutOfStock si no alcanzan.
+    def reserve(self, cart, product, quantity=1):
+        if quantity < 1:
+            raise ValueError('La cantidad debe ser mayor a cero')
+
+        with transaction.atomic():
+            if not take_stock(product.pk, quantity):
+                raise OutOfStock(product)
+
+            expires_at = expiration()
+            if not self.filter(cart=cart, product=product).update(quantity=F('quantity') + quantity,
+                                                                  expires_at=expires_at):
+                try:
+                    with transaction.atomic():
+                        self.create(cart=cart, product=product, quantity=quantity, expires_at=expires_at)
+                except IntegrityError:
+                    # Otra petición creó la reserva al mismo tiempo: se suma sobre ella.
+                    self.filter(cart=cart, product=product).update(quantity=F('quantity') + quantity)
+
+    # Reserva varias lineas (product_id, cantidad); si alguna no alcanza no se reserva ninguna.
+    def reserve_many(self, cart, items):
+        with transaction.atomic():
+            for product_id, quantity in items:
+                self.reserve(cart, Product(pk=int(product_id)), int(quantity))
+
+    # Antes de cobrar: completa las reservas de las lineas del carrito que vencieron o no alcanzan
+    # y extiende su vencimiento. Lanza OutOfStock (sin reservar nada) si algún producto se agotó.
+    # Las lecturas van antes de la transacción: en SQLite, una transacción que lee y después
+    # escribe no espera el bloqueo de escritura, falla con "database is locked".
+    def reserve_cart(self, cart):
+        reserved = dict(self.filter(cart=cart).values_list('product_id', 'quantity'))
+        missing = [
+            (line.product, line.quantity - reserved.get(line.product_id, 0))
+            for line in CartProducts.objects.filter(cart=cart).select_related('product')
+            if line.quantity > reserved.get(line.product_id, 0)
+        ]
+
+        with transaction.atomic():
+            for product, quantity in missing:
+                self.reserve(cart, product, quantity)
+
+            self.filter(cart=cart).update(expires_at=expiration())
+
+    # Devuelve al stock lo reservado por el carrito (solo de un producto si se indica).
+    # Cada reserva se borra antes de devolver sus unidades, así que no se devuelve dos veces.
+    def release(self, cart, product=None):
+        reservations = self.filter(cart=cart)
+        if product is not None:
+            reservations = reservations.filter(product=product)
+
+        return self.release_reservations(reservations)
+
+    # Las unidades de la orden completada ya salieron del stock: solo se borran las reservas.
+    def consume(self, cart):
+        return self.filter(cart=cart).delete()[0]
+
+    # Libera las reservas vencidas, salvo las de carritos cuya orden ya se pagó.
+    def release_expired(self):
+        paid = Cart.objects.filter(order__status__in=[OrderStatus.PAYED, OrderStatus.COMPLETED])
+        return self.release_reservations(self.filter(expires_at__lt=timezone.now()).exclude(cart__in=paid))
+
+    def release_reservations(self, reservations):
+        released = 0
+        for reservation in reservations:
+            with transaction.atomic():
+                if self.filter(pk=reservation.pk).delete()[0]:
+                    return_stock(reservation.product_id, reservation.quantity)
+                    released += reservation.quantity
+
+        return released
+
+
+class StockReservation(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockReservationManager()
+
+    class Meta:
+        # Una reserva por producto y carrito; las cantidades se acumulan en la misma fila.
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product_reservation'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return '{} x {}'.format(self.quantity, self.product_id)
+
+
+# Al borrar un carrito se devuelve lo que tenía reservado (el borrado en cascada no lo haría).
+def release_cart(sender, instance, *args, **kwargs):
+    StockReservation.objects.release(instance)
+
+pre_delete.connect(release_cart, sender=Cart)
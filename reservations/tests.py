@@ -0,0 +1,145 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from products.models import Product
+from carts.models import Cart, CartProducts
+from orders.models import Order
+
+from .models import OutOfStock, StockReservation
+
+
+class StockReservationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.cart = Cart.objects.create(user=self.user)
+        self.cart.refresh_from_db()
+        self.product = Product.objects.create(title='bollo', description='bollo de maiz', stock=5,
+                                              price=Decimal('2.00'), image='products/bollo.jpg')
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).stock
+
+    def test_reserve_and_release(self):
+        StockReservation.objects.reserve(self.cart, self.product, 2)
+        StockReservation.objects.reserve(self.cart, self.product, 3)
+
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(StockReservation.objects.get().quantity, 5)
+
+        with self.assertRaises(OutOfStock):
+            StockReservation.objects.reserve(self.cart, self.product, 1)
+
+        self.assertEqual(StockReservation.objects.release(self.cart), 5)
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_untracked_products_are_not_limited(self):
+        product = Product.objects.create(title='arepa', description='arepa de huevo',
+                                         price=Decimal('1.00'), image='products/arepa.jpg')
+
+        StockReservation.objects.reserve(self.cart, product, 100)
+
+        self.assertIsNone(Product.objects.get(pk=product.pk).stock)
+
+    def test_release_expired(self):
+        StockReservation.objects.reserve(self.cart, self.product, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(StockReservation.objects.release_expired(), 2)
+        self.assertEqual(self.stock(), 5)
+
+    def test_cancel_releases_and_complete_consumes(self):
+        StockReservation.objects.reserve(self.cart, self.product, 2)
+        order = Order.objects.create(cart=self.cart, user=self.user)
+
+        order.cancel()
+        self.assertEqual(self.stock(), 5)
+
+        cart = Cart.objects.create(user=self.user)
+        cart.refresh_from_db()
+        CartProducts.objects.create_or_update_quantity(cart, self.product, 3)
+        order = Order.objects.create(cart=cart, user=self.user)
+        StockReservation.objects.reserve_cart(cart)
+        self.assertEqual(self.stock(), 2)
+
+        order.pay()
+        order.complete()
+        self.assertEqual(self.stock(), 2)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_add_view_rejects_out_of_stock(self):
+        url = reverse('carts:add')
+
+        self.client.post(url, {'product_id': self.product.pk, 'quantity': 4})
+        response = self.client.post(url, {'product_id': self.product.pk, 'quantity': 2})
+
+        self.assertRedirects(response, reverse('products:product', args=[self.product.slug]),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(CartProducts.objects.get().quantity, 4)
+
+        self.client.post(reverse('carts:remove'), {'product_id': self.product.pk})
+        self.assertEqual(self.stock(), 5)
+
+    def test_add_view_rejects_invalid_quantity(self):
+        for quantity in (0, -2, 'dos'):
+            response = self.client.post(reverse('carts:add'), {'product_id': self.product.pk, 'quantity': quantity})
+
+            self.assertRedirects(response, reverse('products:product', args=[self.product.slug]),
+                                 fetch_redirect_response=False)
+
+        self.assertEqual(self.stock(), 5)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(CartProducts.objects.exists())
+
+
+@override_settings(PRODUCT_IMAGES_ASYNC=False)
+class StockContentionTestCase(TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 10
+    STOCK = 25
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+        self.product = Product.objects.create(title='bollo', description='bollo de maiz', stock=self.STOCK,
+                                              price=Decimal('2.00'), image='products/bollo.jpg')
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        carts = [Cart.objects.create() for _ in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        sold, errors = [], []
+
+        def buy(cart):
+            try:
+                barrier.wait()
+                for _ in range(self.ATTEMPTS):
+                    try:
+                        StockReservation.objects.reserve(cart, self.product, 1)
+                        sold.append(1)
+                    except OutOfStock:
+                        pass
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), self.STOCK)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
+        self.assertEqual(sum(StockReservation.objects.values_list('quantity', flat=True)), self.STOCK)
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import ProductSales, CategorySales
+# Register your models here.
+
+class ProductSalesAdmin(admin.ModelAdmin):
+    list_display = ('product', 'units', 'orders')
+    ordering = ('-units',)
+
+class CategorySalesAdmin(admin.ModelAdmin):
+    list_display = ('category', 'units', 'orders')
+    ordering = ('-units',)
+
+admin.site.register(ProductSales, ProductSalesAdmin)
+admin.site.register(CategorySales, CategorySalesAdmin)
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.cache import get_cache
+from products.models import ProductCard
+from categories.models import Category
+
+# Más vendidos a partir de los contadores de `sales.models`: histórico (`days=None`) o de los
+# últimos 7/30 días (suma de los contadores diarios). Los resultados se guardan en el caché del
+# catálogo por SALES_LEADERBOARD_TIMEOUT segundos, así que una venta tarda eso en aparecer.
+
+WINDOWS = (7, 30)
+
+
+def timeout():
+    return getattr(settings, 'SALES_LEADERBOARD_TIMEOUT', 300)
+
+# Primer día que entra en una ventana de `days` días (incluye hoy).
+def window_start(days):
+    return timezone.localdate() - timedelta(days=days - 1)
+
+# Tarjetas de los productos más vendidos, con las unidades en `units`. Opcionalmente de una categoría.
+def top_products(days=None, limit=8, category=None):
+    key = 'sales:products:{}:{}:{}'.format(days, limit, getattr(category, 'pk', category))
+    return get_cache().get_or_set(key, lambda: load_top_products(days, limit, category), timeout())
+
+def load_top_products(days, limit, category):
+    cards = ProductCard.objects.all()
+    if category is not None:
+        cards = cards.filter(product__category=category)
+
+    if days is None:
+        cards = cards.filter(product__sales__units__gt=0).annotate(units=Sum('product__sales__units'))
+    else:
+        cards = cards.filter(product__daily_sales__day__gte=window_start(days)).annotate(
+            units=Sum('product__daily_sales__units')
+        )
+
+    return list(cards.order_by('-units', 'pk')[:limit])
+
+# Categorías más vendidas, con las unidades en `units`.
+def top_categories(days=None, limit=5):
+    key = 'sales:categories:{}:{}'.format(days, limit)
+    return get_cache().get_or_set(key, lambda: load_top_categories(days, limit), timeout())
+
+def load_top_categories(days, limit):
+    if days is None:
+        categories = Category.objects.filter(sales__units__gt=0).annotate(units=Sum('sales__units'))
+    else:
+        categories = Category.objects.filter(daily_sales__day__gte=window_start(days)).annotate(
+            units=Sum('daily_sales__units')
+        )
+
+    return list(categories.order_by('-units', 'pk')[:limit])
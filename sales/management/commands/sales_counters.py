@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.common import OrderStatus
+from orders.models import OrderLine
+from sales import leaderboard
+from sales.models import CategorySales, DailyCategorySales, DailyProductSales, ProductSales, prune, record_sale
+
+
+class Command(BaseCommand):
+    help = 'Muestra los más vendidos; borra los contadores diarios viejos o recalcula todo desde las órdenes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help='Borra los contadores diarios que quedaron fuera de SALES_WINDOW_DAYS.')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recalcula los contadores a partir de las órdenes completadas (día de creación de la orden).')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with transaction.atomic():
+                self.rebuild()
+
+        if options['prune']:
+            self.stdout.write('Contadores diarios borrados: {}'.format(prune()))
+
+        for days in (*leaderboard.WINDOWS, None):
+            products = leaderboard.load_top_products(days, 5, None)
+            self.stdout.write('{}: {}'.format(
+                'Últimos {} días'.format(days) if days else 'Histórico',
+                ', '.join('{} ({})'.format(card.title, card.units) for card in products) or '-'
+            ))
+
+    def rebuild(self):
+        for model in (ProductSales, CategorySales, DailyProductSales, DailyCategorySales):
+            model.objects.all().delete()
+
+        lines = {}
+        for order_id, created_at, product_id, quantity in OrderLine.objects.filter(
+            order__status=OrderStatus.COMPLETED
+        ).values_list('order_id', 'order__created_at', 'product_id', 'quantity').iterator():
+            lines.setdefault((order_id, timezone.localdate(created_at)), []).append((product_id, quantity))
+
+        for (order_id, day), order_lines in lines.items():
+            record_sale(order_lines, day)
+
+        self.stdout.write('Órdenes contadas: {}'.format(len(lines)))
@@ -0,0 +1,104 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product
+from categories.models import Category
+
+# Contadores de ventas por producto y por categoría, para los más vendidos sin recorrer las órdenes.
+# Se incrementan (UPDATE ... SET units = units + n) cuando una orden se completa. Además del total
+# histórico hay un contador por día; las ventanas de 7 y 30 días suman los días de la ventana y los
+# días más viejos que SALES_WINDOW_DAYS se borran con el comando `sales_counters --prune`.
+
+class SalesCounterManager(models.Manager):
+
+    # Suma al contador identificado por `keys`, creándolo si no existe.
+    def increment(self, units, orders=1, **keys):
+        values = {'units': F('units') + units, 'orders': F('orders') + orders}
+
+        if not self.filter(**keys).update(**values):
+            try:
+                with transaction.atomic():
+                    self.create(units=units, orders=orders, **keys)
+            except IntegrityError:
+                # Otra orden creó el contador al mismo tiempo: se suma sobre él.
+                self.filter(**keys).update(**values)
+
+
+class SalesCounter(models.Model):
+    units = models.PositiveIntegerField(default=0)  # Unidades vendidas
+    orders = models.PositiveIntegerField(default=0)  # Órdenes en las que se vendió
+
+    objects = SalesCounterManager()
+
+    class Meta:
+        abstract = True
+
+
+class ProductSales(SalesCounter):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+
+    class Meta:
+        indexes = [models.Index(fields=['-units'], name='product_sales_units_idx')]
+
+    def __str__(self):
+        return '{}: {}'.format(self.product_id, self.units)
+
+
+class CategorySales(SalesCounter):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='sales')
+
+    def __str__(self):
+        return '{}: {}'.format(self.category_id, self.units)
+
+
+class DailyProductSales(SalesCounter):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product', 'day'], name='unique_daily_product_sales')]
+        indexes = [models.Index(fields=['day'], name='daily_product_sales_day_idx')]
+
+
+class DailyCategorySales(SalesCounter):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['category', 'day'], name='unique_daily_category_sales')]
+        indexes = [models.Index(fields=['day'], name='daily_category_sales_day_idx')]
+
+
+# Suma las lineas de una orden completada a los contadores del día `day` (hoy por defecto).
+def record_sale(lines, day=None):
+    day = day or timezone.localdate()
+
+    units = Counter()
+    for product_id, quantity in lines:
+        if product_id is not None:
+            units[product_id] += quantity
+
+    categories = Counter()
+    for category_id, product_id in Category.products.through.objects.filter(
+        product_id__in=units
+    ).values_list('category_id', 'product_id'):
+        categories[category_id] += units[product_id]
+
+    for product_id, quantity in units.items():
+        ProductSales.objects.increment(quantity, product_id=product_id)
+        DailyProductSales.objects.increment(quantity, product_id=product_id, day=day)
+
+    for category_id, quantity in categories.items():
+        CategorySales.objects.increment(quantity, category_id=category_id)
+        DailyCategorySales.objects.increment(quantity, category_id=category_id, day=day)
+
+# Borra los contadores diarios que ya no entran en ninguna ventana. Retorna la cantidad borrada.
+def prune(days=None):
+    oldest = timezone.localdate() - timedelta(days=days or getattr(settings, 'SALES_WINDOW_DAYS', 30))
+    return (DailyProductSales.objects.filter(day__lte=oldest).delete()[0] +
+            DailyCategorySales.objects.filter(day__lte=oldest).delete()[0])
@@ -0,0 +1,95 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import User
+from products import cache
+from products.models import Product
+from categories.models import Category
+from carts.models import Cart, CartProducts
+from orders.models import Order
+
+from . import leaderboard
+from .models import CategorySales, DailyProductSales, ProductSales, prune
+
+
+class SalesCountersTestCase(TestCase):
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user('cliente', 'cliente@example.com', 'password')
+        self.panes = Category.objects.create(title='panes', description='panes')
+        self.bollo, self.arepa, self.yuca = [
+            Product.objects.create(title=title, description='descripcion', price=Decimal('2.00'),
+                                   image='products/producto.jpg')
+            for title in ('bollo', 'arepa', 'yuca')
+        ]
+        self.panes.products.add(self.bollo, self.arepa)
+
+    def complete_order(self, *items):
+        cart = Cart.objects.create(user=self.user)
+        cart.refresh_from_db()
+        for product, quantity in items:
+            CartProducts.objects.create_or_update_quantity(cart, product, quantity)
+
+        order = Order.objects.create(cart=cart, user=self.user)
+        order.pay()
+        order.complete()
+        return order
+
+    def units(self, product):
+        return ProductSales.objects.get(product=product).units
+
+    def test_complete_increments_counters_once(self):
+        order = self.complete_order((self.bollo, 2), (self.yuca, 1))
+        self.complete_order((self.bollo, 1), (self.arepa, 4))
+        order.complete()
+
+        self.assertEqual(self.units(self.bollo), 3)
+        self.assertEqual(ProductSales.objects.get(product=self.bollo).orders, 2)
+        self.assertEqual(CategorySales.objects.get(category=self.panes).units, 7)
+        self.assertEqual(DailyProductSales.objects.get(product=self.arepa, day=timezone.localdate()).units, 4)
+
+    def test_windows_and_prune(self):
+        self.complete_order((self.bollo, 1))
+        DailyProductSales.objects.create(product=self.arepa, day=timezone.localdate() - timedelta(days=10), units=5)
+        DailyProductSales.objects.create(product=self.yuca, day=timezone.localdate() - timedelta(days=30), units=9)
+
+        self.assertEqual([card.title for card in leaderboard.top_products(days=7)], ['bollo'])
+        self.assertEqual([card.title for card in leaderboard.top_products(days=30)], ['arepa', 'bollo'])
+        self.assertEqual([(category.title, category.units) for category in leaderboard.top_categories(days=7)],
+                         [('panes', 1)])
+
+        self.assertEqual(prune(), 1)
+        self.assertFalse(DailyProductSales.objects.filter(product=self.yuca).exists())
+
+    def test_leaderboard_is_cached(self):
+        self.complete_order((self.bollo, 1))
+        self.assertEqual(len(leaderboard.top_products(days=7)), 1)
+
+        self.complete_order((self.arepa, 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(len(leaderboard.top_products(days=7)), 1)
+
+    def test_index_shows_best_sellers(self):
+        self.complete_order((self.arepa, 3))
+
+        response = self.client.get(reverse('index'))
+
+        self.assertContains(response, 'Más vendidos de la semana')
+        self.assertEqual([card.title for card in response.context['best_sellers']], ['arepa'])
+
+    def test_rebuild(self):
+        self.complete_order((self.bollo, 2))
+        self.complete_order((self.bollo, 1), (self.arepa, 1))
+        ProductSales.objects.update(units=0)
+
+        call_command('sales_counters', rebuild=True, stdout=StringIO())
+
+        self.assertEqual(self.units(self.bollo), 3)
+        self.assertEqual(CategorySales.objects.get(category=self.panes).units, 4)
@@ -20,8 +20,6 @@ from django.views.generic import ListView
 from django.views.generic.edit import UpdateView
 from django.views.generic.edit import DeleteView
 
-from carts.utils import get_or_create_cart
-from orders.utils import get_or_created_order
 # Create your views here.
 
 class ShippingAddressListView(ListView):
@@ -78,10 +76,9 @@ def create(request):
 
         if request.GET.get('next'):
             if request.GET['next'] == reverse('orders:address'):
-                cart = get_or_create_cart(request)
-                order = get_or_created_order(cart, request)
-
-                order.update_shipping_address(shipping_address)
+                # Orden abierta de la petición (`CartMiddleware`).
+                if request.order:
+                    request.order.update_shipping_address(shipping_address)
                 return HttpResponseRedirect(request.GET['next'])
 
 
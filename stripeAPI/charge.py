@@ -1,6 +1,6 @@
 from . import stripe
 
-def create_charge(order):
+def create_charge(order, idempotency_key=None):
     if order.billing_profile and order.user and order.user.customer_id:
         charge = stripe.Charge.create(
             amount=int(order.total) * 100,
@@ -10,7 +10,14 @@ def create_charge(order):
             source=order.billing_profile.card_id,
             metadata={
                 'order_id':order.id
-            }
+            },
+            idempotency_key=idempotency_key
         )
 
         return charge
+
+def refund_charge(charge_id, idempotency_key=None):
+    return stripe.Refund.create(
+        charge=charge_id,
+        idempotency_key=idempotency_key
+    )